@@ -1,1477 +1,4360 @@
-import os
-import json
-import base64
-import streamlit as st
-import requests
-from urllib.parse import urljoin, urlparse
-from urllib import robotparser
-from bs4 import BeautifulSoup
-import re
-import pandas as pd
-import tldextract
-import time
-from io import BytesIO
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from PIL import Image, UnidentifiedImageError
-from typing import Optional  # <-- for a safe return type in Python 3.9+
-
-# NEW: PowerPoint audit deps
-import hashlib
-import zipfile
-from pptx import Presentation
-from pptx.enum.shapes import MSO_SHAPE_TYPE
-
-# (Optional, but nice)
-st.set_page_config(page_title="Website & PPTX Image Licensing Audit", layout="wide")
-
-guide_md = """
-### What this app does
-- **Website crawl**: inventories page images and CSS backgrounds on a target site.
-- **PPTX scan**: extracts embedded images and media links from uploaded .pptx files and builds reverse-image helpers.
-
-> **Note:** Sidebar toggles apply to the **website crawl only**. The PPTX scan uses its **own** controls.
-
-### PPTX scan — quick steps
-1) Open **📑 PowerPoint Image Licensing Audit (beta)**
-2) **Upload** one or more `.pptx` files
-3) (Optional) Set thresholds/brand terms; enable **Deduplicate by image content (SHA-1)**
-4) Click **Scan PPTX**
-
-You’ll get **Preview**, **Download**, **Google**, **TinEye**, and **Notes**.
-
-- **Google / TinEye**
-  - If a picture has a **direct public image URL** hyperlink (.jpg/.png/etc), links are **prefilled**.
-  - If there’s **no public URL**, links open the **upload pages** → click **Download** and upload the image there.
-      -You may also be able to open the google images or TinEye site and drag the thumbnail over so try that first
-
-- **Exports**
-  - **CSV (PPTX)**: full table
-  - **Excel (PPTX)**: same, without Google/TinEye columns
-  - **HTML Report**: previews, **Download**, and **Open** links
-  - **ALL artifacts (ZIP)**: CSV, Excel, HTML, plus `images/` (embedded images)
-
-### PPTX flags
-- **Very large file size ≥ N MB** → note added
-- **Very large dimensions ≥ N px** (width *or* height) → note added
-The app never edits PPTX; it only reads and exports.
-"""
-
-# ==========================================
-# Website Image Licensing Audit — MVP (app)
-# ==========================================
-# NOTE: README content must live in README.md, not inside this file.
-
-# --------------------------
-# App Config & Passcode Gate
-# --------------------------
-# === Branding header ===
-
-def _find_logo() -> Optional[str]:
-    for p in ("assets/logo.png", "logo.png"):
-        if os.path.exists(p):
-            return p
-    return None
-
-_logo_path = _find_logo()
-
-header_left, header_right = st.columns([3, 8])  # wider left column
-with header_left:
-    if _logo_path:
-        # Increase width here to control header logo size
-        st.image(_logo_path, width=220)
-    else:
-        st.caption("(logo not found: assets/logo.png or logo.png)")
-with header_right:
-    st.markdown("## Website and PPTX Image Licensing Audit - MVP")
-
-PASSCODE = st.secrets.get("APP_PASSCODE") if hasattr(st, "secrets") else None
-PASSCODE = PASSCODE or os.getenv("APP_PASSCODE")
-
-if PASSCODE:
-    if not st.session_state.get("_authed", False):
-        with st.form("passcode_gate"):
-            user_code = st.text_input("Enter passcode", type="password")
-            submitted = st.form_submit_button("Unlock")
-        if submitted:
-            if (user_code or "").strip() == str(PASSCODE).strip():
-                st.session_state["_authed"] = True
-                # Instant refresh so the app shows up without a second click
-                st.rerun()  # use st.experimental_rerun() on older Streamlit
-            else:
-                st.error("Invalid passcode.")
-        if not st.session_state.get("_authed", False):
-            st.stop()
-
-# ✅ Optional: show sidebar logo only after auth (if you still want it)
-if _logo_path and (not PASSCODE or st.session_state.get("_authed", False)):
-    st.sidebar.image(_logo_path, width=180)
-    
-with st.sidebar.expander("❓ Help / User Guide", expanded=False):
-    st.markdown(guide_md)
-    
-# --------------------------
-# Quick Resume Banner
-# --------------------------
-if st.session_state.get("crawl_state"):
-    _cs = st.session_state.crawl_state
-    _su = (_cs or {}).get("start_url")
-    _pp = int((_cs or {}).get("pages_processed", 0))
-    _im = int((_cs or {}).get("images_found", 0))
-    _dom = urlparse(_su).netloc if _su else ""
-    # If your Streamlit version doesn't support border=True, remove it.
-    with st.container(border=True):
-        st.write(f"**Resumable state detected** for `{_dom}` — total pages: {_pp}, total images: {_im}.")
-        st.caption("When resuming, slider limits apply to **additional** pages/images/bytes for this run.")
-        c1, c2 = st.columns([1, 1])
-        with c1:
-            if st.button("▶️ Resume where I left off"):
-                st.session_state["_resume_request"] = True
-        with c2:
-            if st.button("🗑️ Discard saved state"):
-                st.session_state["crawl_state"] = None
-                st.rerun()
-
-# --------------------------
-# Constants
-# --------------------------
-DEFAULT_HEADERS = {
-    "User-Agent": "ImageLicenseAuditor/1.0 (+https://example.org; contact=webmaster@example.org)"
-}
-
-STOCK_DOMAINS = {
-    "shutterstock.com", "gettyimages.com", "istockphoto.com", "adobestock.com", "stock.adobe.com",
-    "depositphotos.com", "dreamstime.com", "alamy.com", "123rf.com", "bigstockphoto.com",
-    "canstockphoto.com", "pond5.com", "pixabay.com", "unsplash.com", "pexels.com"
-}
-
-IMG_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg"}
-URL_IN_CSS = re.compile(r"url\(([^)]+)\)")
-STOCK_ID_RE = re.compile(
-    r"(shutterstock|adobestock|istock|istockphoto|gettyimages|depositphotos|dreamstime|alamy|123rf|bigstock|canstockphoto|pond5)[-_]?\d{4,}",
-    re.I,
-)
-
-if "crawl_state" not in st.session_state:
-    st.session_state.crawl_state = None  # holds resumable state dict
-
-# --------------------------
-# Sidebar Controls
-# --------------------------
-# --- URL normalizer (must be defined before it's used in the sidebar) ---
-def normalize_url(u: str) -> str:
-    u = (u or "").strip()
-    if not u:
-        return ""
-    if not urlparse(u).scheme:
-        u = "https://" + u
-    if u.startswith("http:///") or u.startswith("https:///"):
-        u = u.replace(":///", "://", 1)
-    return u
-
-with st.sidebar:
-    st.header("Settings")
-    start_url = st.text_input(
-        "Start URL",
-        value=(st.session_state.crawl_state.get("start_url") if st.session_state.get("crawl_state") else ""),
-        placeholder="https://example.com",
-    )
-
-    # Normalize immediately so everything below uses the cleaned URL
-    start_url = normalize_url(start_url)
-
-    # (Optional UI nudge; you also hard-stop later before crawling)
-    if start_url and (not urlparse(start_url).scheme or not urlparse(start_url).netloc):
-        st.sidebar.error("Please enter a valid URL, e.g., https://www.example.com")
-
-    # Determine if we are resuming this same (normalized) URL
-    resuming_context = bool(
-        st.session_state.get("crawl_state") and st.session_state.crawl_state.get("start_url") == start_url
-    )
-
-    st.markdown("**Scope & Depth**")
-    include_subdomains = st.checkbox("Include subdomains", value=False)
-    depth_max = st.slider("Max crawl depth", 1, 5, 3)
-
-    st.markdown("**Limits**")
-    max_pages_default = 100
-    max_images_default = 1000
-    per_page_img_cap_default = 50
-    per_image_size_mb_default = 5
-    total_bytes_cap_mb_default = 200
-
-    pages_label = "Additional pages this run" if resuming_context else "Max pages"
-    images_label = "Additional images this run" if resuming_context else "Max images (total)"
-    bytes_label = "Additional download cap (MB) this run" if resuming_context else "Total download cap (MB)"
-
-    max_pages = st.slider(pages_label, 10, 300, max_pages_default, step=10)
-    max_images = st.slider(images_label, 100, 2000, max_images_default, step=100)
-    per_page_img_cap = st.slider("Per-page image cap", 10, 100, per_page_img_cap_default, step=5)
-    per_image_size_mb = st.slider("Per-image size cap (MB)", 1, 20, per_image_size_mb_default)
-    total_bytes_cap_mb = st.slider(bytes_label, 50, 400, total_bytes_cap_mb_default, step=25)
-
-    st.caption("On resume, page/image/byte limits apply to the **additional** work done in this run.")
-
-    st.markdown("**Fetch Policy**")
-    concurrency = st.slider("Concurrency (workers)", 1, 10, 5)
-    base_delay_ms = st.slider("Base delay between requests (ms)", 0, 1000, 300, step=50)
-
-    st.markdown("**Robots**")
-    respect_robots = st.checkbox(
-        "Respect robots.txt",
-        value=True,
-        help="Uncheck only if you own the site or have written permission."
-    )
-    
-    ua_mode = st.selectbox(
-        "Crawler identity (User-Agent)",
-        ["Auditor (default)", "Browser-like"],
-        index=0,
-        help="Some sites block unknown crawlers. A browser-like UA may pass generic rules for normal browsers."
-    )
-    
-    user_agent = (
-        DEFAULT_HEADERS["User-Agent"]
-        if ua_mode == "Auditor (default)"
-        else "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123 Safari/537.36"
-    )
-
-    st.markdown("**Features**")
-    parse_css_backgrounds = st.checkbox("Capture CSS background images", value=False)
-    try_exif = st.checkbox("Attempt EXIF/IPTC (≤ size cap)", value=True)
-    show_thumbs = st.checkbox("Show thumbnails (may be slow)", value=False)
-
-    st.markdown("**Results Filters**")
-    st.checkbox("Show likely stock/library only", value=False, key="filter_only_stock")
-    st.checkbox("Show rows with risk flags", value=False, key="filter_only_risky")
-    st.text_input("Search URL/Alt/Domain contains…", value="", key="filter_search")
-
-    st.markdown("**Power User**")
-    power = st.checkbox("Enable power-user mode (lifts caps, use cautiously)", value=False)
-    if power:
-        st.info("Power user mode enabled. Be respectful of target sites and your Streamlit resource limits.")
-
-    st.markdown("**Resume / Checkpoint**")
-    resume_upload = st.file_uploader("Resume from checkpoint (.json)", type=["json"], help="Load a previously saved crawl state.")
-    load_clicked = st.button("Load checkpoint")
-    cont_clicked = st.button("Continue from saved state") if st.session_state.get("crawl_state") else False
-    reset_clicked = st.button("Reset saved state") if st.session_state.get("crawl_state") else False
-
-    st.markdown("**Risk Heuristics**")
-    flag_large = st.checkbox("Flag very large images", value=True)
-    large_px = st.number_input("Large if width or height ≥ (px)", 1000, 10000, 3840, step=100)
-    large_mb = st.number_input("Large if file size ≥ (MB)", 1, 50, 5, step=1)
-    flag_suspicious = st.checkbox("Flag suspicious filenames (stock IDs)", value=True)
-    flag_offdomain = st.checkbox("Flag hotlinked off-domain assets", value=True)
-    brand_terms_raw = st.text_input("Brand/trademark terms (comma-separated)", value="")
-    flag_brand = st.checkbox("Flag if URL/alt matches brand terms", value=True)
-
-    go = st.button("Run Audit", type="primary")
-    stop = st.button("Stop")
-
-# Handle checkpoint load/reset
-if resume_upload is not None and load_clicked:
-    try:
-        cp = json.load(resume_upload)
-        state = cp.get("state", {})
-        if not state or "queue" not in state:
-            st.sidebar.error("Invalid checkpoint file.")
-        else:
-            st.session_state.crawl_state = state
-            st.sidebar.success("Checkpoint loaded. Click 'Continue from saved state' or 'Run Audit' to resume.")
-    except Exception as e:
-        st.sidebar.error(f"Failed to load checkpoint: {e}")
-
-if reset_clicked:
-    st.session_state.crawl_state = None
-    st.sidebar.info("Saved state cleared.")
-
-# Stop flag
-if "_stop" not in st.session_state:
-    st.session_state._stop = False
-if stop:
-    st.session_state._stop = True
-
-# Allow 'Continue' from saved state
-if cont_clicked:
-    go = True
-if st.session_state.get("_resume_request"):
-    go = True
-    st.session_state["_resume_request"] = False
-
-# --------------------------
-# Helpers
-# --------------------------
-
-def same_scope(url: str, root: str, include_subs: bool) -> bool:
-    try:
-        t_root = tldextract.extract(root)
-        t_url = tldextract.extract(url)
-        same_reg = (t_root.domain == t_url.domain and t_root.suffix == t_url.suffix)
-        if not same_reg:
-            return False
-        if include_subs:
-            return True
-        return (t_root.subdomain == t_url.subdomain)
-    except Exception:
-        return False
-
-def get_robots_session(base_url: str, user_agent: str):
-    parsed = urlparse(base_url)
-    robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
-    rp = robotparser.RobotFileParser()
-    try:
-        rp.set_url(robots_url)
-        rp.read()
-    except Exception:
-        pass
-    s = requests.Session()
-    headers = DEFAULT_HEADERS.copy()
-    if user_agent:
-        headers["User-Agent"] = user_agent
-    s.headers.update(headers)
-    return rp, s
-
-
-def polite_get(session: requests.Session, url: str, delay_ms: int, timeout: int = 15):
-    time.sleep(delay_ms / 1000.0)
-    try:
-        return session.get(url, timeout=timeout)
-    except Exception:
-        return None
-
-def extract_img_links_from_html(base_url: str, html: str, per_page_cap: int):
-    soup = BeautifulSoup(html, 'html.parser')
-    found = []
-    # IMG tags
-    for img in soup.find_all('img'):
-        src = img.get('src') or img.get('data-src')
-        if not src:
-            continue
-        u = urljoin(base_url, src)
-        alt = img.get('alt') or ''
-        found.append((u, 'IMG Tag', alt))
-        if len(found) >= per_page_cap:
-            break
-    # Inline style backgrounds
-    for el in soup.find_all(style=True):
-        style = el.get('style')
-        for m in URL_IN_CSS.findall(style or ''):
-            u = m.strip('\"\'')
-            u = urljoin(base_url, u)
-            found.append((u, 'CSS Background', ''))
-            if len(found) >= per_page_cap:
-                break
-        if len(found) >= per_page_cap:
-            break
-    # Linked CSS files
-    css_links = []
-    for link in soup.find_all('link', rel=lambda x: x and 'stylesheet' in x):
-        href = link.get('href')
-        if href:
-            css_links.append(urljoin(base_url, href))
-    return found, css_links
-
-def extract_urls_from_css(css_text: str, base_url: str):
-    urls = []
-    for m in URL_IN_CSS.findall(css_text or ''):
-        u = m.strip('\"\'')
-        u = urljoin(base_url, u)
-        urls.append(u)
-    return urls
-
-def file_ext(url: str) -> str:
-    path = urlparse(url).path.lower()
-    for ext in IMG_EXTS:
-        if path.endswith(ext):
-            return ext
-    return ''
-
-def domain_of(url: str) -> str:
-    try:
-        return tldextract.extract(url).registered_domain
-    except Exception:
-        return ''
-
-def guessed_source(url: str) -> str:
-    dom = domain_of(url)
-    if dom in STOCK_DOMAINS:
-        return f"Stock / Library ({dom})"
-    return "Unknown / Site-hosted"
-
-def reverse_links(url: str):
-    g = f"https://www.google.com/searchbyimage?image_url={requests.utils.quote(url, safe='')}"
-    t = f"https://tineye.com/search?url={requests.utils.quote(url, safe='')}"
-    return g, t
-
-def head_size(session: requests.Session, url: str, timeout: int = 15):
-    try:
-        r = session.head(url, allow_redirects=True, timeout=timeout)
-        size = r.headers.get('Content-Length')
-        ct = r.headers.get('Content-Type', '')
-        return int(size) if size and size.isdigit() else None, ct
-    except Exception:
-        return None, ''
-
-def fetch_bytes(session: requests.Session, url: str, max_bytes: int):
-    try:
-        r = session.get(url, stream=True, timeout=20)
-        r.raise_for_status()
-        buf = BytesIO()
-        total = 0
-        for chunk in r.iter_content(8192):
-            if chunk:
-                buf.write(chunk)
-                total += len(chunk)
-                if total > max_bytes:
-                    break
-        buf.seek(0)
-        return buf, total
-    except Exception:
-        return None, 0
-
-def try_make_thumb(img_bytes: BytesIO, max_px: int = 128) -> Optional[BytesIO]:
-    try:
-        with Image.open(img_bytes) as im:
-            im = im.convert("RGB") if im.mode not in ("RGB", "RGBA") else im
-            im.thumbnail((max_px, max_px))
-            out = BytesIO()
-            im.save(out, format='PNG')
-            out.seek(0)
-            return out
-    except (UnidentifiedImageError, OSError):
-        return None
-
-def make_checkpoint_dict(state: dict, settings: dict) -> dict:
-    serializable_state = {
-        "start_url": state.get("start_url"),
-        "visited_pages": sorted(list(state.get("visited_pages", []))),
-        "queue": list(state.get("queue", [])),
-        "depth": state.get("depth", {}),
-        "pages_processed": int(state.get("pages_processed", 0)),
-        "images_found": int(state.get("images_found", 0)),
-        "total_bytes_downloaded": int(state.get("total_bytes_downloaded", 0)),
-        "rows": state.get("rows", []),
-        "css_queue": list(state.get("css_queue", [])),
-    }
-    return {"settings": settings, "state": serializable_state}
-
-# --------------------------
-# Main Audit Logic (with resume/delta limits)
-# --------------------------
-# (UNCHANGED below this point except for any incidental whitespace fixes)
-if 'go' not in globals():
-    go = False
-
-if go:
-    st.session_state._stop = False
-
-    if not start_url:
-        st.error("Please enter a start URL.")
-        st.stop()
-    parsed = urlparse(start_url)
-    if not parsed.scheme or not parsed.netloc:
-        st.error("Start URL is invalid. Try including https:// (e.g., https://www.njafp.org).")
-        st.stop()
-
-    # Initialize or resume state
-    if st.session_state.crawl_state and st.session_state.crawl_state.get("start_url") == start_url:
-        state = st.session_state.crawl_state
-        visited_pages = set(state.get("visited_pages", []))
-        q = list(state.get("queue", []))
-        depth = dict(state.get("depth", {}))
-        pages_processed = int(state.get("pages_processed", 0))
-        images_found = int(state.get("images_found", 0))
-        total_bytes_downloaded = int(state.get("total_bytes_downloaded", 0))
-        rows = list(state.get("rows", []))
-        css_queue = list(state.get("css_queue", []))
-        baseline_pages = pages_processed
-        baseline_images = images_found
-        baseline_bytes = total_bytes_downloaded
-    else:
-        visited_pages = set()
-        q = [start_url]
-        depth = {start_url: 0}
-        pages_processed = 0
-        images_found = 0
-        total_bytes_downloaded = 0
-        rows = []
-        css_queue = []
-        baseline_pages = 0
-        baseline_images = 0
-        baseline_bytes = 0
-
-    rp, session = get_robots_session(start_url, user_agent)
-
-    # Hotlink baseline + brand terms
-    root_regdomain = tldextract.extract(start_url).registered_domain
-    brand_terms = [t.strip().lower() for t in (brand_terms_raw or "").split(",") if t.strip()]
-
-    if respect_robots and rp and not rp.can_fetch(user_agent, start_url):
-        st.warning(
-            "robots.txt disallows crawling the start URL for this user-agent. "
-            "Try the browser-like identity or uncheck 'Respect robots.txt' if you own the site."
-        )
-        st.stop()
-
-    progress = st.progress(0)
-    status = st.empty()
-
-    def added_pages() -> int:
-        return max(0, pages_processed - baseline_pages)
-    def added_images() -> int:
-        return max(0, images_found - baseline_images)
-    def added_bytes() -> int:
-        return max(0, total_bytes_downloaded - baseline_bytes)
-
-    while q and not st.session_state._stop:
-        if added_pages() >= max_pages:
-            status.info("Hit additional page limit for this run. You can raise the limit and resume again.")
-            break
-
-        url = q.pop(0)
-        if url in visited_pages:
-            continue
-        visited_pages.add(url)
-        d = depth.get(url, 0)
-
-        if d > depth_max:
-            continue
-        if respect_robots and rp and not rp.can_fetch(user_agent, url):
-            continue
-
-        resp = polite_get(session, url, base_delay_ms)
-        if not resp or not (200 <= resp.status_code < 300):
-            continue
-
-        content_type = resp.headers.get('Content-Type', '')
-        if 'text/html' not in content_type:
-            continue
-
-        html = resp.text
-        page_imgs, css_links = extract_img_links_from_html(url, html, per_page_img_cap)
-
-        if parse_css_backgrounds:
-            for css in css_links:
-                if same_scope(css, start_url, include_subdomains):
-                    css_queue.append((url, css))
-
-        soup = BeautifulSoup(html, 'html.parser')
-        for a in soup.find_all('a', href=True):
-            href = urljoin(url, a['href']).split('#')[0]
-            if not same_scope(href, start_url, include_subdomains):
-                continue
-            if href not in visited_pages and href not in depth:
-                depth[href] = d + 1
-                if d + 1 <= depth_max:
-                    q.append(href)
-
-        to_process = list({u for (u, _, _) in page_imgs})
-        results = []
-        with ThreadPoolExecutor(max_workers=concurrency) as ex:
-            futs = {ex.submit(head_size, session, u): u for u in to_process}
-            for fut in as_completed(futs):
-                u = futs[fut]
-                size, ct = fut.result()
-                results.append((u, size, ct))
-
-        for (u, stype, alt) in page_imgs:
-            if added_images() >= max_images or st.session_state._stop:
-                break
-
-            ext = file_ext(u)
-            dom = domain_of(u)
-            source_guess = guessed_source(u)
-            g_link, t_link = reverse_links(u)
-
-            match = next((r for r in results if r[0] == u), None)
-            est_bytes = match[1] if match else None
-            content_type_img = match[2] if match else ''
-
-            size_ok = True
-            note = ""
-            if est_bytes is not None and est_bytes > per_image_size_mb * 1024 * 1024:
-                size_ok = False
-                note = "Skipped (exceeds per-image size cap)"
-
-            exif_author = ""
-            thumb_data = None
-            width = None
-            height = None
-
-            # Auto-enable fetch whenever EXIF or thumbnails are requested
-            effective_try_exif = (try_exif or show_thumbs)
-            ctype = (content_type_img or "").lower()
-
-            need_fetch = effective_try_exif and size_ok and (ctype.startswith("image/") or ext in IMG_EXTS)
-
-            if need_fetch:
-                if added_bytes() < total_bytes_cap_mb * 1024 * 1024:
-                    buf, n = fetch_bytes(session, u, per_image_size_mb * 1024 * 1024)
-                    total_bytes_downloaded += n
-                    if buf:
-                        # Only parse EXIF if explicitly requested (saves CPU)
-                        if try_exif:
-                            try:
-                                with Image.open(buf) as im:
-                                    width, height = im.size
-                                    exif = im.getexif()
-                                    if exif:
-                                        artist = exif.get(315)
-                                        if artist:
-                                            exif_author = str(artist)
-                            except (UnidentifiedImageError, OSError):
-                                pass
-
-                        # Thumbnails (reset buffer)
-                        if show_thumbs:
-                            try:
-                                buf.seek(0)
-                                thumb = try_make_thumb(buf)
-                                if thumb:
-                                    thumb_data = f"data:image/png;base64,{base64.b64encode(thumb.read()).decode('ascii')}"
-                            except Exception:
-                                pass
-
-                else:
-                    note = (note + "; " if note else "") + "Skipped (hit additional download cap this run)"
-
-
-            # ---- Risk flags ----
-            risk = []
-            if dom in STOCK_DOMAINS:
-                risk.append("Stock source — ensure license")
-            if not alt:
-                risk.append("No alt text (check provenance)")
-            if flag_large and (est_bytes is not None) and est_bytes >= int(large_mb) * 1024 * 1024:
-                risk.append(f"Very large file (≥ {int(large_mb)} MB)")
-            if flag_large and width and height and (width >= int(large_px) or height >= int(large_px)):
-                risk.append(f"Very large dimensions ({width}×{height} px)")
-            if flag_suspicious:
-                try:
-                    pth = urlparse(u).path.lower()
-                except Exception:
-                    pth = ""
-                if pth and STOCK_ID_RE.search(pth):
-                    risk.append("Suspicious stock ID in filename")
-            if flag_offdomain and dom and root_regdomain and dom != root_regdomain:
-                risk.append("Off-domain asset (hotlink)")
-            if flag_brand and brand_terms:
-                hay = (u + " " + (alt or "")).lower()
-                for term in brand_terms:
-                    if term and term in hay:
-                        risk.append(f"Brand term match: {term}")
-                        break
-
-            rows.append({
-                "Page": url,
-                "Image URL": u,
-                "Source Type": stype,
-                "Alt Text": alt,
-                "Domain": dom,
-                "Guessed Source": source_guess,
-                "Content-Type": content_type_img,
-                "Estimated Bytes": est_bytes,
-                "EXIF Artist": exif_author,
-                "Width": width,
-                "Height": height,
-                "Google Images": g_link,
-                "TinEye": t_link,
-                "Thumbnail": thumb_data,
-                "Notes": note,
-                "Risk Flags": ", ".join(risk)
-            })
-            images_found += 1
-
-        pages_processed += 1
-        progress.progress(min(1.0, added_pages() / max(1, max_pages)))
-        status.write(
-            f"Total pages {pages_processed} (+{added_pages()} this run), "
-            f"images {images_found} (+{added_images()} this run)."
-        )
-
-        if added_images() >= max_images:
-            status.info("Hit additional image limit for this run. You can raise the limit and resume again.")
-            break
-
-        # --------------------------
-        # CSS backgrounds (robots-aware)
-        # --------------------------
-        if parse_css_backgrounds and css_queue and not st.session_state._stop:
-            # Filter CSS files by robots.txt when enabled
-            if respect_robots and rp:
-                allowed_css = []
-                for (page_url, css_url) in css_queue:
-                    try:
-                        if rp.can_fetch(user_agent, css_url):
-                            allowed_css.append((page_url, css_url))
-                    except Exception:
-                        # If robotparser errors, skip this CSS when respecting robots
-                        continue
-            else:
-                allowed_css = list(css_queue)
-
-            with ThreadPoolExecutor(max_workers=min(concurrency, 4)) as ex:
-                futs = {
-                    ex.submit(polite_get, session, css_url, base_delay_ms): (page_url, css_url)
-                    for (page_url, css_url) in allowed_css
-                }
-                css_queue = []
-                for fut in as_completed(futs):
-                    page_url, css_url = futs[fut]
-                    resp_css = fut.result()
-                    if not resp_css or resp_css.status_code != 200:
-                        continue
-                    css_text = resp_css.text
-                    for u in extract_urls_from_css(css_text, css_url):
-                        if added_images() >= max_images:
-                            break
-
-                        # (Optional) also respect robots for the image asset itself
-                        if respect_robots and rp and not rp.can_fetch(user_agent, u):
-                            continue
-
-                        ext = file_ext(u)
-                        size, ct = head_size(session, u)
-
-                        size_ok = True
-                        note = ""
-                        if size is not None and size > per_image_size_mb * 1024 * 1024:
-                            size_ok = False
-                            note = "Skipped (exceeds per-image size cap)"
-
-                        exif_author = ""
-                        thumb_data = None
-                        width = None
-                        height = None
-
-                        effective_try_exif = (try_exif or show_thumbs)
-                        ctype = (ct or "").lower()  # ← normalize!
-
-                        need_fetch = effective_try_exif and size_ok and (ctype.startswith("image/") or ext in IMG_EXTS)
-
-                        if need_fetch:
-                            if added_bytes() < total_bytes_cap_mb * 1024 * 1024:
-                                buf, n = fetch_bytes(session, u, per_image_size_mb * 1024 * 1024)
-                                total_bytes_downloaded += n
-                                if buf:
-                                    # Parse EXIF only if requested
-                                    if try_exif:
-                                        try:
-                                            with Image.open(buf) as im:
-                                                width, height = im.size
-                                                exif = im.getexif()
-                                                if exif:
-                                                    artist = exif.get(315)
-                                                    if artist:
-                                                        exif_author = str(artist)
-                                        except (UnidentifiedImageError, OSError):
-                                            pass
-
-                                    # Thumbnail (reset buffer first)
-                                    if show_thumbs:
-                                        try:
-                                            buf.seek(0)
-                                            thumb = try_make_thumb(buf)
-                                            if thumb:
-                                                thumb_data = f"data:image/png;base64,{base64.b64encode(thumb.read()).decode('ascii')}"
-                                        except Exception:
-                                            pass
-                            else:
-                                note = (note + "; " if note else "") + "Skipped (hit additional download cap this run)"
-
-                        g_link, t_link = reverse_links(u)
-                        dom = domain_of(u)
-
-
-                        risk = []
-                        if dom in STOCK_DOMAINS:
-                            risk.append("Stock source — ensure license")
-                        if flag_large and (size is not None) and size >= int(large_mb) * 1024 * 1024:
-                            risk.append(f"Very large file (≥ {int(large_mb)} MB)")
-                        if flag_large and width and height and (width >= int(large_px) or height >= int(large_px)):
-                            risk.append(f"Very large dimensions ({width}×{height} px)")
-                        if flag_suspicious:
-                            try:
-                                pth = urlparse(u).path.lower()
-                            except Exception:
-                                pth = ""
-                            if pth and STOCK_ID_RE.search(pth):
-                                risk.append("Suspicious stock ID in filename")
-                        if flag_offdomain and dom and root_regdomain and dom != root_regdomain:
-                            risk.append("Off-domain asset (hotlink)")
-                        if flag_brand and brand_terms:
-                            hay = u.lower()
-                            for term in brand_terms:
-                                if term and term in hay:
-                                    risk.append(f"Brand term match: {term}")
-                                    break
-
-                        rows.append({
-                            "Page": page_url,
-                            "Image URL": u,
-                            "Source Type": "CSS Background",
-                            "Alt Text": "",
-                            "Domain": dom,
-                            "Guessed Source": guessed_source(u),
-                            "Content-Type": ct,
-                            "Estimated Bytes": size,
-                            "EXIF Artist": exif_author,
-                            "Width": width,
-                            "Height": height,
-                            "Google Images": g_link,
-                            "TinEye": t_link,
-                            "Thumbnail": thumb_data,
-                            "Notes": note,
-                            "Risk Flags": ", ".join(risk)
-                        })
-                        images_found += 1
-                        if added_images() >= max_images:
-                            break
-
-
-        # Persist state after each page
-        st.session_state.crawl_state = {
-            "start_url": start_url,
-            "visited_pages": list(visited_pages),
-            "queue": list(q),
-            "depth": depth,
-            "pages_processed": pages_processed,
-            "images_found": images_found,
-            "total_bytes_downloaded": total_bytes_downloaded,
-            "rows": rows,
-            "css_queue": css_queue,
-        }
-
-    # --------------------------
-    # Results & Export + Checkpoint
-    # --------------------------
-    if rows:
-        df = pd.DataFrame(rows)
-        finished = (not q) and (not css_queue)
-        if finished:
-            st.success(f"Audit complete: total pages {pages_processed}, total images {images_found}.")
-        else:
-            st.info(f"Partial results: total pages {pages_processed}, total images {images_found}. You can resume later.")
-
-        # Apply filters from sidebar
-        only_stock = st.session_state.get("filter_only_stock", False)
-        only_risky = st.session_state.get("filter_only_risky", False)
-        search = st.session_state.get("filter_search", "")
-
-        view = df.copy()
-        view["Guessed Source"] = view["Guessed Source"].fillna("")
-        view["Risk Flags"] = view["Risk Flags"].fillna("")
-        if only_stock:
-            view = view[view["Guessed Source"].str.contains("Stock / Library", na=False)]
-        if only_risky:
-            view = view[view["Risk Flags"].str.len() > 0]
-        if search:
-            mask = (
-                view["Image URL"].astype(str).str.contains(search, case=False, na=False) |
-                view["Page"].astype(str).str.contains(search, case=False, na=False) |
-                view["Alt Text"].astype(str).str.contains(search, case=False, na=False) |
-                view["Domain"].astype(str).str.contains(search, case=False, na=False)
-            )
-            view = view[mask]
-
-        render_df = view.copy()
-        if not show_thumbs:
-            render_df = render_df.drop(columns=["Thumbnail"], errors="ignore")
-
-        col_cfg = {
-            "Image URL": st.column_config.LinkColumn("Image URL"),
-            "Google Images": st.column_config.LinkColumn("Google Images"),
-            "TinEye": st.column_config.LinkColumn("TinEye"),
-        }
-        if show_thumbs and "Thumbnail" in render_df.columns:
-            col_cfg["Thumbnail"] = st.column_config.ImageColumn("Thumbnail")
-
-        st.data_editor(
-            render_df,
-            use_container_width=True,
-            hide_index=True,
-            disabled=True,
-            column_config=col_cfg,
-        )
-
-        def to_excel_bytes(df_: pd.DataFrame) -> bytes:
-            export = df_.drop(columns=["Thumbnail"], errors="ignore").copy()
-            out = BytesIO()
-            with pd.ExcelWriter(out, engine="xlsxwriter") as writer:
-                export.to_excel(writer, sheet_name="Audit", index=False)
-                ws = writer.sheets["Audit"]
-                url_cols = [c for c in ["Page", "Image URL", "Google Images", "TinEye"] if c in export.columns]
-                for r in range(len(export)):
-                    for c in url_cols:
-                        val = export.iloc[r][c]
-                        if isinstance(val, str) and val.startswith(("http://", "https://")):
-                            ws.write_url(r + 1, export.columns.get_loc(c), val, string=c)
-            out.seek(0)
-            return out.read()
-
-        csv_bytes = render_df.drop(columns=["Thumbnail"], errors="ignore").to_csv(index=False).encode("utf-8")
-        xlsx_bytes = to_excel_bytes(view)
-
-        st.download_button("Download CSV", data=csv_bytes, file_name="image_licensing_audit.csv", mime="text/csv")
-        st.download_button("Download Excel", data=xlsx_bytes, file_name="image_licensing_audit.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-
-        settings = {
-            "include_subdomains": include_subdomains,
-            "depth_max": depth_max,
-            "max_pages": max_pages,
-            "max_images": max_images,
-            "per_page_img_cap": per_page_img_cap,
-            "per_image_size_mb": per_image_size_mb,
-            "total_bytes_cap_mb": total_bytes_cap_mb,
-            "concurrency": concurrency,
-            "base_delay_ms": base_delay_ms,
-            "parse_css_backgrounds": parse_css_backgrounds,
-            "try_exif": try_exif,
-            "show_thumbs": show_thumbs,
-            "flag_large": flag_large,
-            "large_px": int(large_px),
-            "large_mb": int(large_mb),
-            "flag_suspicious": flag_suspicious,
-            "flag_offdomain": flag_offdomain,
-            "flag_brand": flag_brand,
-            "brand_terms_raw": brand_terms_raw,
-        }
-        cp_dict = make_checkpoint_dict(st.session_state.crawl_state, settings)
-        cp_bytes = json.dumps(cp_dict).encode("utf-8")
-        st.download_button("Download checkpoint to resume later", data=cp_bytes, file_name="audit_checkpoint.json", mime="application/json")
-
-        st.caption("Notes: You can resume a partial crawl using the sidebar 'Resume from checkpoint' loader, the 'Continue from saved state' button, or the main 'Resume' panel. Limits apply to additional work this run.")
-    else:
-        st.warning("No images found or crawl blocked. Try adjusting limits, enabling subdomains, or verifying the start URL.")
-
-# ==========================================
-# PowerPoint Image Licensing Audit (Beta)
-# ==========================================
-with st.expander("📑 PowerPoint Image Licensing Audit (beta)", expanded=False):
-    with st.form("pptx_form"):
-        pptx_files = st.file_uploader("Upload one or more PowerPoint files (.pptx)", type=["pptx"], accept_multiple_files=True)
-        st.markdown("**Risk Heuristics**")
-        pptx_large_px = st.number_input("Very large if width or height ≥ (px)", min_value=1000, max_value=10000, value=3840, step=100, key="pptx_large_px")
-        pptx_large_mb = st.number_input("Very large if file size ≥ (MB)", min_value=1, max_value=50, value=5, step=1, key="pptx_large_mb")
-        pptx_brand_terms_raw = st.text_input("Brand/trademark terms (comma-separated)", value="", key="pptx_brand_terms_raw")
-        pptx_dedupe = st.checkbox("Deduplicate by image content (SHA-1)", value=True, key="pptx_dedupe")
-        run_pptx = st.form_submit_button("Scan PPTX")
-
-    URL_RE = re.compile(r'https?://[^\s<>()"]+')
-    MEDIA_IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg'}
-    MEDIA_VIDEO_EXTS = {'.mp4', '.mov', '.avi', '.mkv', '.webm', '.m4v'}
-    MEDIA_VIDEO_DOMAINS = {'youtube.com', 'youtu.be', 'vimeo.com', 'player.vimeo.com'}
-    
-    def _looks_like_direct_image(u: str) -> bool:
-        """True if URL is http(s) and path ends with a common image extension."""
-        try:
-            p = urlparse(u)
-            if p.scheme not in ("http", "https"):
-                return False
-            return any((p.path or "").lower().endswith(ext) for ext in MEDIA_IMAGE_EXTS)
-        except Exception:
-            return False
-
-    def _prefill_reverse_links(u: str):
-        """Build Google/TinEye query URLs for a public image URL (keeps links short)."""
-        enc = requests.utils.quote(u, safe="")
-        g = f"https://www.google.com/searchbyimage?image_url={enc}"
-        t = f"https://tineye.com/search?url={enc}"
-        return g, t
-
-    # Alias so either name works everywhere:
-    _is_direct_image_url = _looks_like_direct_image
-
-  
-    def _is_direct_image_url(u: str) -> bool:
-        try:
-            p = urlparse(u)
-            if p.scheme not in ("http", "https"):
-                return False
-            return (p.path or "").lower().endswith(
-                (".jpg",".jpeg",".png",".gif",".webp",".svg")
-            )
-        except Exception:
-            return False
-
-    def _classify_media_url(u: str) -> str:
-        try:
-            p = urlparse(u)
-            path = (p.path or '').lower()
-            host = (p.netloc or '').lower()
-        except Exception:
-            path, host = "", ""
-        if any(path.endswith(ext) for ext in MEDIA_IMAGE_EXTS):
-            return "image"
-        if any(path.endswith(ext) for ext in MEDIA_VIDEO_EXTS):
-            return "video"
-        if any(d in host for d in MEDIA_VIDEO_DOMAINS):
-            return "video"
-        return ""
-
-    def _extract_text_media_from_slide(slide, slide_idx: int, filename: str):
-        """Collect media-like URLs (images/videos) from text boxes, mark kind and keep clickable link."""
-        rows = []
-        for shape in slide.shapes:
-            if not getattr(shape, "has_text_frame", False):
-                continue
-            try:
-                txt = shape.text or ""
-            except Exception:
-                txt = ""
-            for m in URL_RE.findall(txt):
-                url = m.strip()
-                kind = _classify_media_url(url)
-                if not kind:
-                    continue
-
-                g_link = ""
-                t_link = ""
-                # For direct image URLs, we can prefill both engines
-                if kind == "image" and _looks_like_direct_image(url):
-                    g_link, t_link = _prefill_reverse_links(url)
-
-                rows.append({
-                    "File": filename,
-                    "Slide": slide_idx,
-                    "Shape": getattr(shape, "name", ""),
-                    "Alt Text": "",
-                    "Hyperlink": "",                 # reserved for on-picture link; empty for text items
-                    "External Media Link": url,      # clickable URL from text box
-                    "External Media Kind": kind,     # image | video
-                    "Format": "text",
-                    "Content-Type": "",
-                    "Bytes": None,
-                    "Width": None,
-                    "Height": None,
-                    "EXIF Artist": "",
-                    "SHA1": "",
-                    "Google Images": g_link,         # prefilled when possible
-                    "TinEye": t_link,                # prefilled when possible
-                    "Risk Flags": "",
-                })
-        return rows
-
-
-    def _scan_pptx_bytes(buf_bytes, filename, brand_terms, large_px, large_mb):
-        """
-        Returns:
-          rows: table rows for DataFrame
-          image_records: list of dicts with {'zip_name','blob','sha1','file','slide','shape','fmt'}
-        """
-        rows = []
-        image_records = []
-        try:
-            prs = Presentation(BytesIO(buf_bytes))
-        except Exception:
-            st.warning(f"Skipping '{filename}': not a valid PPTX file or could not be parsed.")
-            return rows, image_records
-
-        for slide_idx, slide in enumerate(prs.slides, start=1):
-            shape_idx = 0
-            for shape in slide.shapes:
-                shape_idx += 1
-                # Detect embedded picture shapes
-                is_picture = False
-                try:
-                    is_picture = (shape.shape_type == MSO_SHAPE_TYPE.PICTURE)
-                except Exception:
-                    pass
-                if not is_picture and not getattr(shape, "has_image", False):
-                    continue
-
-                # Extract embedded image
-                try:
-                    img = shape.image
-                except Exception:
-                    continue
-                blob = img.blob
-                sha1 = hashlib.sha1(blob).hexdigest()
-                fmt = getattr(img, "ext", None)
-                ctype = getattr(img, "content_type", "")
-
-                width = height = None
-                exif_artist = ""
-                try:
-                    with Image.open(BytesIO(blob)) as im:
-                        width, height = im.size
-                        exif = im.getexif()
-                        if exif:
-                            artist = exif.get(315)
-                            if artist:
-                                exif_artist = str(artist)
-                except Exception:
-                    pass
-
-                alt = getattr(shape, "alternative_text", "") or ""
-
-                # Hyperlink on the picture itself?
-                href = ""
-                try:
-                    href = getattr(shape.click_action.hyperlink, "address", "") or ""
-                except Exception:
-                    href = ""
-
-                # In-app reverse-image links for this picture (keep links short)
-                if _is_direct_image_url(href):
-                    google_link, tineye_link = _prefill_reverse_links(href)
-                else:
-                    # Fall back to upload landing pages
-                    google_link = "https://lens.google.com/upload"
-                    tineye_link  = "https://tineye.com/"
-
-
-                # Risk flags
-                risk = []
-                size_mb = len(blob) / (1024*1024)
-                if size_mb >= int(large_mb):
-                    risk.append(f"Very large file (≥ {int(large_mb)} MB)")
-                if (width and height) and (width >= int(large_px) or height >= int(large_px)):
-                    risk.append(f"Very large dimensions ({width}×{height} px)")
-                if href and any(s in href.lower() for s in [
-                    "shutterstock", "gettyimages", "istockphoto", "adobestock", "stock.adobe",
-                    "depositphotos", "dreamstime", "alamy", "123rf", "bigstockphoto", "canstockphoto", "pond5"
-                ]):
-                    risk.append("Hyperlink to stock/library")
-                if brand_terms:
-                    hay = (alt + " " + href).lower()
-                    for term in brand_terms:
-                        if term and term in hay:
-                            risk.append(f"Brand term match: {term}")
-                            break
-
-                # For ZIP export + HTML mapping
-                safe_file = re.sub(r"[^a-zA-Z0-9._-]", "_", filename.rsplit("/", 1)[-1])
-                base = safe_file[:-5] if safe_file.lower().endswith(".pptx") else safe_file
-                ext = f".{fmt}" if fmt and not str(fmt).startswith(".") else (fmt or ".img")
-                zip_name = f"{base}_slide{slide_idx}_shape{shape_idx}_{sha1[:10]}{ext}"
-                image_records.append({
-                    "zip_name": zip_name,
-                    "blob": blob,
-                    "sha1": sha1,
-                    "file": filename,
-                    "slide": slide_idx,
-                    "shape": getattr(shape, "name", ""),
-                    "fmt": fmt or "img",
-                })
-
-                rows.append({
-                    "File": filename,
-                    "Slide": slide_idx,
-                    "Shape": getattr(shape, "name", ""),
-                    "Alt Text": alt,
-                    "Hyperlink": href,                 # link attached to the picture (if any)
-                    "External Media Link": "",          # N/A for embedded image rows
-                    "External Media Kind": "",
-                    "Format": fmt,
-                    "Content-Type": ctype,
-                    "Bytes": len(blob),
-                    "Width": width,
-                    "Height": height,
-                    "EXIF Artist": exif_artist,
-                    "SHA1": sha1,
-                    "Google Images": google_link,       # short placeholders (not written to XLSX)
-                    "TinEye": tineye_link,              # short placeholders (not written to XLSX)
-                    "Risk Flags": ", ".join(risk),
-                })
-
-            # Also collect media links found in text boxes (kept separate)
-            rows.extend(_extract_text_media_from_slide(slide, slide_idx, filename))
-
-        return rows, image_records
-
-    def _build_html_report(df_: pd.DataFrame, image_records: list) -> bytes:
-        """
-        Creates an HTML report with reverse-image links.
-        - If a real remote image URL exists, prefill Google/TinEye with it.
-        - Otherwise, link to the upload pages and provide a Download button.
-        """
-        import urllib.parse
-
-        IMG_EXTS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg')
-
-        def _is_direct_image_url(u: str) -> bool:
-            try:
-                p = urlparse(u)
-                if p.scheme not in ("http", "https"):
-                    return False
-                return any((p.path or "").lower().endswith(ext) for ext in IMG_EXTS)
-            except Exception:
-                return False
-
-        # Map SHA1 -> blob for embedded images (for preview/download only)
-        sha_map = {rec["sha1"]: rec for rec in image_records}
-
-        html = []
-        html.append("<!doctype html><meta charset='utf-8'><title>PPTX Reverse Image Report</title>")
-        html.append("""
-    <style>
-    body{font-family:system-ui,Segoe UI,Arial}
-    table{border-collapse:collapse;margin-top:12px;width:100%}
-    th,td{border:1px solid #ccc;padding:6px 8px;font-size:14px;vertical-align:top}
-    .preview img{max-height:80px;max-width:160px}
-    .small{color:#666;font-size:12px}
-    </style>
-    """)
-        html.append("<h2>PPTX Reverse Image Report</h2>")
-        html.append("<p class='small'>Tip: If Google/TinEye opens without results, use the <b>Download</b> link below and upload/drag the image into their page.</p>")
-        html.append("<table><thead><tr>"
-                    "<th>File</th><th>Slide</th><th>Shape</th>"
-                    "<th>Preview</th><th>Download</th>"
-                    "<th>Google</th><th>TinEye</th><th>Notes</th></tr></thead><tbody>")
-
-        for _, r in df_.iterrows():
-            file_ = str(r.get("File") or "")
-            slide = str(r.get("Slide") or "")
-            shape = str(r.get("Shape") or "")
-            notes = str(r.get("Risk Flags") or "")
-
-            # Prefer a real remote image URL, if we have one
-            remote_url = ""
-            ext_link = str(r.get("External Media Link") or "")
-            if _is_direct_image_url(ext_link):
-                remote_url = ext_link
-            else:
-                href = str(r.get("Hyperlink") or "")
-                if _is_direct_image_url(href):
-                    remote_url = href
-
-            # Build preview/download (for embedded images with SHA1)
-            preview_html = ""
-            download_html = ""
-            sha = str(r.get("SHA1") or "")
-            if sha and sha in sha_map:
-                rec = sha_map[sha]
-                fmt = (rec.get("fmt") or "png").lstrip(".")
-                b64 = base64.b64encode(rec["blob"]).decode("ascii")
-                data_url = f"data:image/{fmt};base64,{b64}"
-                preview_html = f"<div class='preview'><img src='{data_url}' alt='img'></div>"
-                # Use "download" attribute so the image saves with a sensible name
-                download_html = f"<a href='{data_url}' download='{rec['zip_name']}'>Download</a>"
-            else:
-                # Non-embedded (text-found) links: show nothing to keep report light
-                preview_html = ""
-                download_html = ""
-
-            # Reverse-image links
-            if remote_url:
-                enc = urllib.parse.quote(remote_url, safe='')
-                g = f"https://www.google.com/searchbyimage?image_url={enc}"
-                t = f"https://tineye.com/search?url={enc}"
-            else:
-                # No public URL → open upload pages; user can use "Download" then upload/drag
-                g = "https://lens.google.com/upload"
-                t = "https://tineye.com/"
-
-            g_link = f"<a href='{g}' target='_blank'>Open</a>"
-            t_link = f"<a href='{t}' target='_blank'>Open</a>"
-
-            html.append(
-                f"<tr>"
-                f"<td>{file_}</td>"
-                f"<td>{slide}</td>"
-                f"<td>{shape}</td>"
-                f"<td>{preview_html}</td>"
-                f"<td>{download_html}</td>"
-                f"<td>{g_link}</td>"
-                f"<td>{t_link}</td>"
-                f"<td>{notes}</td>"
-                f"</tr>"
-            )
-
-        html.append("</tbody></table>")
-
-        # Optional section: external media links (non-embedded) for reference
-        has_ext = False
-        for _, r in df_.iterrows():
-            if str(r.get("External Media Link") or ""):
-                has_ext = True
-                break
-
-        if has_ext:
-            html.append("<h3>External Media Links Found in Text</h3>")
-            html.append("<table><thead><tr><th>File</th><th>Slide</th><th>Shape</th><th>Kind</th><th>URL</th></tr></thead><tbody>")
-            for _, r in df_.iterrows():
-                url = str(r.get("External Media Link") or "")
-                if not url:
-                    continue
-                file_ = str(r.get("File") or "")
-                slide = str(r.get("Slide") or "")
-                shape = str(r.get("Shape") or "")
-                kind = str(r.get("External Media Kind") or "")
-                html.append(f"<tr><td>{file_}</td><td>{slide}</td><td>{shape}</td><td>{kind}</td>"
-                            f"<td><a href='{url}' target='_blank'>{url}</a></td></tr>")
-            html.append("</tbody></table>")
-
-        return "\n".join(html).encode("utf-8")
-
-
-    if run_pptx and pptx_files:
-        brand_terms = [t.strip().lower() for t in (pptx_brand_terms_raw or "").split(",") if t.strip()]
-        all_rows = []
-        image_records = []
-        for f in pptx_files:
-            try:
-                bytes_ = f.getvalue()
-            except Exception:
-                bytes_ = f.read()
-            rows, recs = _scan_pptx_bytes(bytes_, f.name, brand_terms, int(pptx_large_px), int(pptx_large_mb))
-            all_rows.extend(rows)
-            image_records.extend(recs)
-
-        if not all_rows:
-            st.warning("No images or media URLs found in the uploaded PPTX files.")
-        else:
-            dfp = pd.DataFrame(all_rows)
-
-            # Dedupe embedded images (text-media rows have empty SHA1 and won't be deduped)
-            if pptx_dedupe and "SHA1" in dfp.columns:
-                first_seen = {}
-                duplicate_of = []
-                keep_mask = []
-                for sha in dfp["SHA1"]:
-                    if sha and sha in first_seen:
-                        duplicate_of.append(first_seen[sha])
-                        keep_mask.append(False)
-                    else:
-                        if sha:
-                            first_seen[sha] = sha
-                        duplicate_of.append("")
-                        keep_mask.append(True)
-                dfp["Duplicate Of"] = duplicate_of
-                st.checkbox("Show duplicates only (embedded images)", value=False, key="pptx_show_dupes")
-                if not st.session_state.get("pptx_show_dupes"):
-                    dfp = dfp[keep_mask]
-                else:
-                    dfp = dfp[[not k for k in keep_mask]]
-
-            # Clickable columns in-app (short placeholders are fine here)
-            col_cfg = {}
-            for link_col in ["Hyperlink", "External Media Link", "Google Images", "TinEye"]:
-                if link_col in dfp.columns:
-                    col_cfg[link_col] = st.column_config.LinkColumn(link_col)
-
-            # Faster fallback for big tables
-            max_editor_rows = 200  # keep or tweak
-            if len(dfp) > max_editor_rows:
-                st.info(f"Showing first {max_editor_rows} rows (use downloads for the full set).")
-                df_show = dfp.head(max_editor_rows)
-            else:
-                df_show = dfp
-
-            st.data_editor(
-                df_show,
-                use_container_width=True,
-                hide_index=True,
-                disabled=True,
-                column_config=col_cfg,  # preserves clickable links for "Google Images"/"TinEye"
-)
-
-
-            # ---------- Exports ----------
-            # CSV: includes all columns (even Google/TinEye placeholders)
-            csv_bytes = dfp.to_csv(index=False).encode("utf-8")
-
-            # Excel: drop Google/TinEye columns entirely (per your request)
-            def _pptx_to_excel_bytes(df_: pd.DataFrame) -> bytes:
-                out = BytesIO()
-                with pd.ExcelWriter(out, engine="xlsxwriter") as writer:
-                    df_xlsx = df_.drop(columns=["Google Images", "TinEye"], errors="ignore").copy()
-                    df_xlsx.to_excel(writer, sheet_name="PPTX Audit", index=False)
-                    ws = writer.sheets["PPTX Audit"]
-                    # column widths
-                    for idx, col in enumerate(df_xlsx.columns):
-                        try:
-                            approx = int(min(max(12, df_xlsx[col].astype(str).str.len().quantile(0.9)), 60))
-                        except Exception:
-                            approx = 20
-                        ws.set_column(idx, idx, approx)
-                    # write hyperlinks only for real URL columns we kept
-                    for link_col in ["Hyperlink", "External Media Link"]:
-                        if link_col in df_xlsx.columns:
-                            hcol = df_xlsx.columns.get_loc(link_col)
-                            for r, val in enumerate(df_xlsx[link_col].astype(str).tolist()):
-                                if val.startswith(("http://", "https://")):
-                                    ws.write_url(r + 1, hcol, val, string=val)
-                out.seek(0)
-                return out.read()
-
-            xlsx_bytes = _pptx_to_excel_bytes(dfp)
-
-            # HTML report: full, prefilled reverse-image links for embedded images
-            html_bytes = _build_html_report(dfp, image_records)
-
-            # Images ZIP
-            images_zip_bytes = None
-            if image_records:
-                zip_buf = BytesIO()
-                with zipfile.ZipFile(zip_buf, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
-                    for rec in image_records:
-                        zf.writestr(f"images/{rec['zip_name']}", rec["blob"])
-                zip_buf.seek(0)
-                images_zip_bytes = zip_buf.getvalue()
-
-            # "Download All" ZIP (ONLY this gets persisted)
-            all_zip_buf = BytesIO()
-            with zipfile.ZipFile(all_zip_buf, mode="w", compression=zipfile.ZIP_DEFLATED) as z:
-                z.writestr("pptx_image_audit.csv", csv_bytes)
-                z.writestr("pptx_image_audit.xlsx", xlsx_bytes)
-                z.writestr("pptx_image_audit.html", html_bytes)
-                if images_zip_bytes:
-                    # inline images into this bundle
-                    with zipfile.ZipFile(BytesIO(images_zip_bytes)) as imgs:
-                        for info in imgs.infolist():
-                            z.writestr(info.filename, imgs.read(info.filename))
-                z.writestr("README.txt",
-                           "PPTX audit artifacts.\n"
-                           "- pptx_image_audit.csv\n"
-                           "- pptx_image_audit.xlsx (no Google/TinEye columns)\n"
-                           "- pptx_image_audit.html (prefilled reverse-image links)\n"
-                           "- images/ (extracted embedded images)\n")
-            all_zip_bytes = all_zip_buf.getvalue()
-
-            # Persist ONLY the all-in-one ZIP (lean memory)
-            st.session_state["pptx_artifacts"] = {"all_zip": all_zip_bytes}
-
-            # Download buttons (CSV/XLSX/HTML immediate; only ZIP is persisted)
-            st.download_button("Download CSV (PPTX)", data=csv_bytes, file_name="pptx_image_audit.csv", mime="text/csv")
-            st.download_button("Download Excel (PPTX)", data=xlsx_bytes, file_name="pptx_image_audit.xlsx",
-                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-            st.download_button("Download HTML (prefilled reverse-image links)", data=html_bytes,
-                               file_name="pptx_image_audit.html", mime="text/html")
-            st.download_button("Download ALL artifacts (ZIP)", data=all_zip_bytes,
-                               file_name="pptx_audit_bundle.zip", mime="application/zip")
-
-    elif run_pptx and not pptx_files:
-        st.warning("Please upload at least one .pptx file.")
-
-# Show persistent download (only ALL ZIP) without rerunning
-if st.session_state.get("pptx_artifacts"):
-    art = st.session_state["pptx_artifacts"]
-    st.markdown("**Previous scan:**")
-    st.download_button("⬇️ ALL artifacts ZIP (prev)", data=art["all_zip"], file_name="pptx_audit_bundle.zip",
-                       mime="application/zip", key="pptx_prev_all")
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+import os
+import json
+import base64
+import logging
+import streamlit as st
+import requests
+from urllib.parse import urljoin, urlparse, urlunparse, quote, unquote
+from urllib import robotparser
+import re
+import time
+import threading
+import math
+import sqlite3
+import tempfile
+import weakref
+import zlib
+import random
+import secrets
+from array import array
+from collections import Counter, deque
+from email.utils import parsedate_to_datetime
+from io import BytesIO
+from xml.etree.ElementTree import XMLPullParser, ParseError
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from PIL import Image, UnidentifiedImageError, features
+from typing import Optional  # <-- for a safe return type in Python 3.9+
+
+# NEW: PowerPoint audit deps
+import hashlib
+import zipfile
+from page_extract import (
+    DEFAULT_IGNORED_PARAMS, DEFAULT_PORTS, CanonRules, canon_rules, canonicalize_url, extract_in_scope, parse_css,
+    looks_like_file, registered_domain, same_scope, suffix_extractor,
+)
+# pandas (and xlsxwriter through it), python-pptx and the public suffix list are loaded where they are
+# first used: the script reruns on every interaction, and a cold start should not wait for the results
+# table or the PPTX scanner before the first render.
+
+log = logging.getLogger("image_audit")  # background threads (spill sweep) report here, not in the page
+
+# (Optional, but nice)
+st.set_page_config(page_title="Website & PPTX Image Licensing Audit", layout="wide")
+
+guide_md = """
+### What this app does
+- **Website crawl**: inventories page images and CSS backgrounds on a target site.
+- **PPTX scan**: extracts embedded images and media links from uploaded .pptx files and builds reverse-image helpers.
+
+> **Note:** Sidebar toggles apply to the **website crawl only**. The PPTX scan uses its **own** controls.
+
+### PPTX scan — quick steps
+1) Open **📑 PowerPoint Image Licensing Audit (beta)**
+2) **Upload** one or more `.pptx` files
+3) (Optional) Set thresholds/brand terms; enable **Deduplicate by image content (SHA-1)**
+4) Click **Scan PPTX**
+
+You’ll get **Preview**, **Download**, **Google**, **TinEye**, and **Notes**.
+
+- **Google / TinEye**
+  - If a picture has a **direct public image URL** hyperlink (.jpg/.png/etc), links are **prefilled**.
+  - If there’s **no public URL**, links open the **upload pages** → click **Download** and upload the image there.
+      -You may also be able to open the google images or TinEye site and drag the thumbnail over so try that first
+
+- **Exports**
+  - **CSV (PPTX)**: full table
+  - **Excel (PPTX)**: same, without Google/TinEye columns
+  - **HTML Report**: previews, **Download**, and **Open** links
+  - **ALL artifacts (ZIP)**: CSV, Excel, HTML, plus `images/` (embedded images)
+
+### PPTX flags
+- **Very large file size ≥ N MB** → note added
+- **Very large dimensions ≥ N px** (width *or* height) → note added
+The app never edits PPTX; it only reads and exports.
+"""
+
+# ==========================================
+# Website Image Licensing Audit — MVP (app)
+# ==========================================
+# NOTE: README content must live in README.md, not inside this file.
+
+# --------------------------
+# App Config & Passcode Gate
+# --------------------------
+# === Branding header ===
+
+def _find_logo() -> Optional[str]:
+    for p in ("assets/logo.png", "logo.png"):
+        if os.path.exists(p):
+            return p
+    return None
+
+_logo_path = _find_logo()
+
+
+@st.cache_data(show_spinner=False)
+def _logo_png(path: str, width: int, mtime: float) -> bytes:
+    """The logo scaled down to its display width once, rather than by st.image on every rerun."""
+    with Image.open(path) as im:
+        im.thumbnail((width, im.height), Image.LANCZOS, reducing_gap=3.0)
+        out = BytesIO()
+        im.save(out, format="PNG")
+    return out.getvalue()
+
+
+def show_logo(target, width: int):
+    try:
+        target.image(_logo_png(_logo_path, width, os.path.getmtime(_logo_path)), width=width)
+    except (OSError, UnidentifiedImageError):
+        target.image(_logo_path, width=width)
+
+
+header_left, header_right = st.columns([3, 8])  # wider left column
+with header_left:
+    if _logo_path:
+        # Increase width here to control header logo size
+        show_logo(st, 220)
+    else:
+        st.caption("(logo not found: assets/logo.png or logo.png)")
+with header_right:
+    st.markdown("## Website and PPTX Image Licensing Audit - MVP")
+
+PASSCODE = st.secrets.get("APP_PASSCODE") if hasattr(st, "secrets") else None
+PASSCODE = PASSCODE or os.getenv("APP_PASSCODE")
+# Unlocks the per-audit details of Server usage (see show_server_usage); unset, nobody sees them
+ADMIN_PASSCODE = st.secrets.get("ADMIN_PASSCODE") if hasattr(st, "secrets") else None
+ADMIN_PASSCODE = ADMIN_PASSCODE or os.getenv("ADMIN_PASSCODE")
+
+if PASSCODE:
+    if not st.session_state.get("_authed", False):
+        with st.form("passcode_gate"):
+            user_code = st.text_input("Enter passcode", type="password")
+            submitted = st.form_submit_button("Unlock")
+        if submitted:
+            if (user_code or "").strip() == str(PASSCODE).strip():
+                st.session_state["_authed"] = True
+                # Instant refresh so the app shows up without a second click
+                st.rerun()  # use st.experimental_rerun() on older Streamlit
+            else:
+                st.error("Invalid passcode.")
+        if not st.session_state.get("_authed", False):
+            st.stop()
+
+# ✅ Optional: show sidebar logo only after auth (if you still want it)
+if _logo_path and (not PASSCODE or st.session_state.get("_authed", False)):
+    show_logo(st.sidebar, 180)
+    
+with st.sidebar.expander("❓ Help / User Guide", expanded=False):
+    st.markdown(guide_md)
+    
+# An audit started from this session is still running in the background (see CrawlJob); the saved
+# state is handed back when it finishes, so it can't be resumed or reset in the meantime.
+_job_active = bool(st.session_state.get("crawl_job")) and (
+    st.session_state.get("crawl_job") != st.session_state.get("crawl_job_synced")
+)
+
+# --------------------------
+# Quick Resume Banner
+# --------------------------
+if st.session_state.get("crawl_state") and not _job_active:
+    _cs = st.session_state.crawl_state  # a CrawlStateSlot; its summary is enough here (no reload)
+    _su = _cs.summary.get("start_url")
+    _pp = int(_cs.summary.get("pages_processed") or 0)
+    _im = int(_cs.summary.get("images_found") or 0)
+    _dom = urlparse(_su).netloc if _su else ""
+    # If your Streamlit version doesn't support border=True, remove it.
+    with st.container(border=True):
+        st.write(f"**Resumable state detected** for `{_dom}` — total pages: {_pp}, total images: {_im}.")
+        st.caption("When resuming, slider limits apply to **additional** pages/images/bytes for this run.")
+        c1, c2 = st.columns([1, 1])
+        with c1:
+            if st.button("▶️ Resume where I left off"):
+                st.session_state["_resume_request"] = True
+        with c2:
+            if st.button("🗑️ Discard saved state"):
+                _cs.discard()
+                st.session_state["crawl_state"] = None
+                st.rerun()
+
+# --------------------------
+# Constants
+# --------------------------
+DEFAULT_HEADERS = {
+    "User-Agent": "ImageLicenseAuditor/1.0 (+https://example.org; contact=webmaster@example.org)"
+}
+
+STOCK_DOMAINS = {
+    "shutterstock.com", "gettyimages.com", "istockphoto.com", "adobestock.com", "stock.adobe.com",
+    "depositphotos.com", "dreamstime.com", "alamy.com", "123rf.com", "bigstockphoto.com",
+    "canstockphoto.com", "pond5.com", "pixabay.com", "unsplash.com", "pexels.com"
+}
+
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg"}
+STOCK_ID_RE = re.compile(
+    r"(shutterstock|adobestock|istock|istockphoto|gettyimages|depositphotos|dreamstime|alamy|123rf|bigstock|canstockphoto|pond5)[-_]?\d{4,}",
+    re.I,
+)
+
+if "crawl_state" not in st.session_state:
+    st.session_state.crawl_state = None  # resumable state, as a CrawlStateSlot
+
+# Server-wide limits shared by every session's audits (see ResourceGovernor); override per deployment.
+# Defined before the sidebar, which caps the per-host concurrency slider at GOV_MAX_PER_HOST.
+GOV_MAX_CONNECTIONS = int(os.getenv("AUDIT_MAX_CONNECTIONS", "32"))    # outbound requests in flight
+GOV_MAX_PER_HOST = int(os.getenv("AUDIT_MAX_PER_HOST", "6"))           # ... to any one target host
+GOV_MAX_BUFFER_MB = int(os.getenv("AUDIT_MAX_BUFFER_MB", "256"))       # image bytes being read at once
+GOV_MAX_JOBS = int(os.getenv("AUDIT_MAX_JOBS", "3"))                   # audits crawling at once; others queue
+GOV_MAX_RSS_MB = int(os.getenv("AUDIT_MAX_RSS_MB", "2048"))            # no queued audit starts above this
+
+# --------------------------
+# Sidebar Controls
+# --------------------------
+# --- URL normalizer (must be defined before it's used in the sidebar) ---
+def normalize_url(u: str) -> str:
+    u = (u or "").strip()
+    if not u:
+        return ""
+    if not urlparse(u).scheme:
+        u = "https://" + u
+    if u.startswith("http:///") or u.startswith("https:///"):
+        u = u.replace(":///", "://", 1)
+    return u
+
+with st.sidebar:
+    st.header("Settings")
+    start_url = st.text_input(
+        "Start URL",
+        value=(st.session_state.crawl_state.summary.get("start_url") if st.session_state.get("crawl_state") else ""),
+        placeholder="https://example.com",
+    )
+
+    # Normalize immediately so everything below uses the cleaned URL
+    start_url = normalize_url(start_url)
+
+    # (Optional UI nudge; you also hard-stop later before crawling)
+    if start_url and (not urlparse(start_url).scheme or not urlparse(start_url).netloc):
+        st.sidebar.error("Please enter a valid URL, e.g., https://www.example.com")
+
+    # Determine if we are resuming this same (normalized) URL
+    resuming_context = bool(
+        st.session_state.get("crawl_state") and st.session_state.crawl_state.summary.get("start_url") == start_url
+    )
+
+    st.markdown("**Scope & Depth**")
+    include_subdomains = st.checkbox("Include subdomains", value=False)
+    depth_max = st.slider("Max crawl depth", 1, 5, 3)
+    seed_sitemaps = st.checkbox(
+        "Seed from sitemap",
+        value=True,
+        help="Queue every in-scope page listed in the site's sitemaps (from robots.txt and /sitemap.xml) "
+             "at depth 1, so deep pages don't have to be reached through links."
+    )
+    ignored_params = st.text_input(
+        "Ignore URL parameters",
+        value=DEFAULT_IGNORED_PARAMS,
+        help="Query (and ;path) parameters dropped from page links before de-duplication, comma-separated; "
+             "a trailing * matches any suffix (utm_*). Tracking and session-id parameters are listed by default."
+    )
+    strip_trailing_slash = st.checkbox(
+        "Treat /page and /page/ as the same page",
+        value=False,
+        help="Pages are then fetched without the trailing slash. On sites that serve /page/ (most CMSs) "
+             "each of those fetches costs an extra redirect, so leave this off unless the site links both."
+    )
+    canon = canon_rules(ignored_params, strip_trailing_slash)
+    preflight_clicked = st.button("Preflight (estimate site size)")
+
+    st.markdown("**Limits**")
+    max_pages_default = 100
+    max_images_default = 1000
+    per_page_img_cap_default = 50
+    per_image_size_mb_default = 5
+    total_bytes_cap_mb_default = 200
+
+    pages_label = "Additional pages this run" if resuming_context else "Max pages"
+    images_label = "Additional images this run" if resuming_context else "Max images (total)"
+    bytes_label = "Additional download cap (MB) this run" if resuming_context else "Total download cap (MB)"
+
+    max_pages = st.slider(pages_label, 10, 300, max_pages_default, step=10)
+    max_images = st.slider(images_label, 100, 2000, max_images_default, step=100)
+    per_page_img_cap = st.slider("Per-page image cap", 10, 100, per_page_img_cap_default, step=5)
+    per_image_size_mb = st.slider("Per-image size cap (MB)", 1, 20, per_image_size_mb_default)
+    total_bytes_cap_mb = st.slider(bytes_label, 50, 400, total_bytes_cap_mb_default, step=25)
+    max_html_mb = st.slider(
+        "Max HTML page size (MB)", 1, 50, 5,
+        help="Only this much of a page is downloaded and scanned for images and links. Responses that "
+             "aren't HTML are dropped as soon as their headers arrive."
+    )
+
+    st.caption("On resume, page/image/byte limits apply to the **additional** work done in this run.")
+
+    st.markdown("**Fetch Policy**")
+    if GOV_MAX_PER_HOST > 1:
+        concurrency = st.slider(
+            "Max concurrency (workers per host)", 1, GOV_MAX_PER_HOST, min(8, GOV_MAX_PER_HOST),
+            help=f"This server allows at most {GOV_MAX_PER_HOST} connections to one host, shared by every audit."
+        )
+    else:
+        concurrency = 1
+        st.caption("Max concurrency: 1 request per host (this server's limit).")
+    adaptive_concurrency = st.checkbox(
+        "Adaptive concurrency",
+        value=True,
+        help="Start low and ramp up while the server stays fast; back off on 429/503/timeouts and honor Retry-After."
+    )
+    rate_per_host = st.slider(
+        "Max requests per second (per host)", 0.5, 20.0, 5.0, step=0.5,
+        help="Shared by page, image and CSS requests. robots.txt Crawl-delay lowers this when respected."
+    )
+    burst_per_host = st.slider("Burst (requests per host)", 1, 20, 5)
+
+    parallel_parse = st.checkbox(
+        "Parse pages in worker processes",
+        value=False,
+        help=f"Extract images and links on a pool of {os.cpu_count() or 1} processes (one per CPU core) "
+             "instead of the app's own thread. Helps on large, image-heavy sites."
+    )
+
+    single_get = st.checkbox(
+        "One request per image (streamed GET)",
+        value=True,
+        help="Read size and type from a single GET's headers and stop early when the image is over the size cap "
+             "or not an image, instead of a HEAD followed by a GET."
+    )
+
+    use_http_cache = st.checkbox(
+        "Use shared page/CSS cache",
+        value=True,
+        help="Reuses pages and stylesheets fetched by earlier audits; revalidated with ETag/Last-Modified."
+    )
+
+    use_image_cache = st.checkbox(
+        "Use shared image metadata cache",
+        value=True,
+        help="Remembers each image's size, type, dimensions, EXIF Artist and thumbnail across pages and audits, "
+             "so repeat images (logos, headers) cost no download; revalidated with ETag/Last-Modified. "
+             "Applies to the one-request-per-image mode."
+    )
+
+    st.markdown("**Robots**")
+    respect_robots = st.checkbox(
+        "Respect robots.txt",
+        value=True,
+        help="Uncheck only if you own the site or have written permission."
+    )
+    
+    ua_mode = st.selectbox(
+        "Crawler identity (User-Agent)",
+        ["Auditor (default)", "Browser-like"],
+        index=0,
+        help="Some sites block unknown crawlers. A browser-like UA may pass generic rules for normal browsers."
+    )
+    
+    user_agent = (
+        DEFAULT_HEADERS["User-Agent"]
+        if ua_mode == "Auditor (default)"
+        else "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123 Safari/537.36"
+    )
+
+    st.markdown("**Features**")
+    parse_css_backgrounds = st.checkbox("Capture CSS background images", value=False)
+    try_exif = st.checkbox("Attempt EXIF/IPTC (≤ size cap)", value=True)
+    show_thumbs = st.checkbox("Show thumbnails (may be slow)", value=False)
+
+    st.markdown("**Results Filters**")
+    st.checkbox("Show likely stock/library only", value=False, key="filter_only_stock")
+    st.checkbox("Show rows with risk flags", value=False, key="filter_only_risky")
+    st.text_input("Search URL/Alt/Domain contains…", value="", key="filter_search")
+    st.checkbox(
+        "One row per page (per-page view)",
+        value=False,
+        key="per_page_view",
+        help="By default each unique image is one row, with the number of pages it appears on and the first "
+             "page it was seen on. This expands it to one row per page the image appears on."
+    )
+
+    st.markdown("**Power User**")
+    power = st.checkbox("Enable power-user mode (lifts caps, use cautiously)", value=False)
+    compact_visited = False
+    if power:
+        st.info("Power user mode enabled. Be respectful of target sites and your Streamlit resource limits.")
+        compact_visited = st.checkbox(
+            "Compact visited set (Bloom filter)",
+            value=False,
+            help="Fixed ~2.4 MB memory for up to 2M URLs; about 1% of new URLs may be skipped as already seen."
+        )
+
+    st.markdown("**Resume / Checkpoint**")
+    resume_upload = st.file_uploader(
+        "Resume from checkpoint (.jsonl or .json)", type=["jsonl", "json"], help="Load a previously saved crawl state."
+    )
+    load_clicked = st.button("Load checkpoint")
+    _resumable = bool(st.session_state.get("crawl_state")) and not _job_active
+    cont_clicked = st.button("Continue from saved state") if _resumable else False
+    reset_clicked = st.button("Reset saved state") if _resumable else False
+
+    st.markdown("**Incremental Re-audit**")
+    reaudit_upload = st.file_uploader(
+        "Previous audit (.jsonl checkpoint or .csv results)",
+        type=["jsonl", "csv"],
+        help="Pages whose content is unchanged since this audit keep their previous rows (no image probing), "
+             "and the results include a delta report. Checkpoints carry page fingerprints; CSV results only "
+             "give the delta."
+    )
+
+    st.markdown("**Risk Heuristics**")
+    flag_large = st.checkbox("Flag very large images", value=True)
+    large_px = st.number_input("Large if width or height ≥ (px)", 1000, 10000, 3840, step=100)
+    large_mb = st.number_input("Large if file size ≥ (MB)", 1, 50, 5, step=1)
+    flag_suspicious = st.checkbox("Flag suspicious filenames (stock IDs)", value=True)
+    flag_offdomain = st.checkbox("Flag hotlinked off-domain assets", value=True)
+    brand_terms_raw = st.text_input("Brand/trademark terms (comma-separated)", value="")
+    flag_brand = st.checkbox("Flag if URL/alt matches brand terms", value=True)
+
+    go = st.button("Run Audit", type="primary")
+    stop = st.button("Stop")
+
+# Handle checkpoint reset (loading is handled after the journal helpers below)
+if reset_clicked:
+    st.session_state.crawl_state.discard()
+    st.session_state.crawl_state = None
+    st.sidebar.info("Saved state cleared.")
+
+# Allow 'Continue' from saved state
+if cont_clicked:
+    go = True
+if st.session_state.get("_resume_request"):
+    go = True
+    st.session_state["_resume_request"] = False
+
+# --------------------------
+# Helpers
+# --------------------------
+
+def host_key(url: str) -> str:
+    """The host a URL counts against in the per-host limits: lowercase and without the scheme's default
+    port, as canonicalize_url spells page links (image URLs and a typed start URL may differ)."""
+    parsed = urlparse(url)
+    netloc = parsed.netloc.rpartition("@")[2].lower()
+    default = DEFAULT_PORTS.get(parsed.scheme.lower())
+    if default and netloc.endswith(f":{default}"):
+        netloc = netloc[:-len(f":{default}")]
+    return netloc
+
+
+class HostRateLimiter:
+    """Per-host token buckets shared by every request in a crawl (pages, HEADs, images, CSS)."""
+
+    def __init__(self, rate_per_sec: float, burst: int = 1):
+        self.rate = max(0.01, float(rate_per_sec))
+        self.burst = max(1, int(burst))
+        self._limits = {}   # host -> (rate, burst) overrides, e.g. from robots.txt Crawl-delay
+        self._buckets = {}  # host -> [tokens, last_refill]
+        self._lock = threading.Lock()
+
+    def set_crawl_delay(self, host: str, delay_s: float):
+        """Slow a host down to at most one request every `delay_s` seconds."""
+        if delay_s and delay_s > 0:
+            with self._lock:
+                self._limits[host] = (min(self.rate, 1.0 / delay_s), 1)
+
+    def _refill(self, host: str):
+        rate, burst = self._limits.get(host, (self.rate, self.burst))
+        now = time.monotonic()
+        bucket = self._buckets.setdefault(host, [float(burst), now])
+        bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        return bucket, rate
+
+    def try_acquire(self, host: str) -> float:
+        """Take a token if one is available now (returns 0.0); otherwise return seconds until one is."""
+        with self._lock:
+            bucket, rate = self._refill(host)
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0.0
+            return (1.0 - bucket[0]) / rate
+
+    def acquire(self, host: str):
+        """Reserve the next token for host and sleep until it is valid."""
+        with self._lock:
+            bucket, rate = self._refill(host)
+            bucket[0] -= 1.0
+            wait_s = -bucket[0] / rate if bucket[0] < 0 else 0.0
+        if wait_s > 0:
+            time.sleep(wait_s)
+
+
+class HostConcurrencyController:
+    """AIMD limit on in-flight requests per host.
+
+    The limit grows by one per window of successful requests while p95 latency stays close to
+    the best p95 seen for the host, and is halved on 429/503/timeouts. Retry-After pauses the host.
+    """
+
+    WINDOW = 10  # completed requests between limit adjustments
+
+    def __init__(self, max_limit: int, adaptive: bool = True, start_limit: int = 2):
+        self.max_limit = max(1, int(max_limit))
+        self.adaptive = adaptive
+        self.start_limit = min(self.max_limit, max(1, int(start_limit))) if adaptive else self.max_limit
+        self._hosts = {}
+        self._cond = threading.Condition()
+
+    def _host(self, host: str) -> dict:
+        h = self._hosts.get(host)
+        if h is None:
+            h = self._hosts[host] = {
+                "limit": float(self.start_limit),
+                "in_flight": 0,
+                "latencies": deque(maxlen=self.WINDOW * 2),
+                "samples": 0,
+                "best_p95": None,
+                "paused_until": 0.0,
+                "last_cut": 0.0,
+            }
+        return h
+
+    def acquire(self, host: str):
+        """Block until the host is not paused and has a free in-flight slot."""
+        with self._cond:
+            h = self._host(host)
+            while True:
+                pause = h["paused_until"] - time.monotonic()
+                if pause <= 0 and h["in_flight"] < int(h["limit"]):
+                    h["in_flight"] += 1
+                    return
+                self._cond.wait(timeout=pause if pause > 0 else None)
+
+    def release(self, host: str, latency: Optional[float] = None, throttled: bool = False,
+                pause_s: Optional[float] = None):
+        with self._cond:
+            h = self._host(host)
+            h["in_flight"] = max(0, h["in_flight"] - 1)
+            now = time.monotonic()
+            if pause_s:
+                h["paused_until"] = max(h["paused_until"], now + pause_s)
+            if throttled:
+                # One cut per second, so a burst of 429s from requests already in flight counts once
+                if self.adaptive and now - h["last_cut"] >= 1.0:
+                    h["limit"] = max(1.0, h["limit"] / 2)
+                    h["last_cut"] = now
+            elif latency is not None and self.adaptive:
+                h["latencies"].append(latency)
+                h["samples"] += 1
+                if h["samples"] % self.WINDOW == 0:
+                    lat = sorted(h["latencies"])
+                    p95 = lat[int(0.95 * (len(lat) - 1))]
+                    best = p95 if h["best_p95"] is None else min(h["best_p95"], p95)
+                    h["best_p95"] = best
+                    if p95 <= best * 1.5 + 0.05:
+                        h["limit"] = min(float(self.max_limit), h["limit"] + 1)
+                    elif p95 > best * 2 + 0.1:
+                        h["limit"] = max(1.0, h["limit"] * 0.75)
+            self._cond.notify_all()
+
+    def limit_for(self, host: str) -> int:
+        with self._cond:
+            return int(self._host(host)["limit"])
+
+
+def process_rss_bytes() -> int:
+    """Resident memory of this server process (0 if unknown)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError, IndexError):
+        return 0
+
+
+class ResourceGovernor:
+    """Outbound connections and image buffers shared by every audit on this server (see get_governor).
+
+    A request takes a slot before it is sent and gives it back once its body has been read (for a
+    streamed response, when it is closed; see GovernedResponse): at most `max_connections` open in
+    total and `max_per_host` to one target host, whichever session asks.
+    When slots are scarce they go to the waiting audit that holds the fewest, so a large crawl can't
+    starve a small one. Image reads also hold their byte reservation here, under `max_buffer` bytes.
+    """
+
+    def __init__(self, max_connections: int = GOV_MAX_CONNECTIONS, max_per_host: int = GOV_MAX_PER_HOST,
+                 max_buffer: int = GOV_MAX_BUFFER_MB * 1024 * 1024):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.max_buffer = max_buffer
+        self.active = 0
+        self.buffered = 0
+        self.by_host = Counter()
+        self.by_owner = Counter()
+        self.waiters = []        # (owner, host) of requests waiting for a slot
+        self.requests = Counter()
+        self._cond = threading.Condition()
+
+    def _grantable(self, owner: str, host: str) -> bool:
+        if self.active >= self.max_connections or self.by_host[host] >= self.max_per_host:
+            return False
+        # Fair share: only the waiting owner(s) holding the fewest slots may take one
+        fewest = min((self.by_owner[o] for (o, h) in self.waiters if self.by_host[h] < self.max_per_host),
+                     default=0)
+        return self.by_owner[owner] <= fewest
+
+    def acquire(self, owner: str, host: str):
+        with self._cond:
+            waiter = (owner, host)
+            self.waiters.append(waiter)
+            try:
+                while not self._grantable(owner, host):
+                    self._cond.wait()
+            finally:
+                self.waiters.remove(waiter)
+            self.active += 1
+            self.by_host[host] += 1
+            self.by_owner[owner] += 1
+            self.requests[owner] += 1
+
+    def release(self, owner: str, host: str):
+        with self._cond:
+            self.active -= 1
+            self.by_host[host] -= 1
+            self.by_owner[owner] -= 1
+            if not self.by_host[host]:
+                del self.by_host[host]
+            if not self.by_owner[owner]:
+                del self.by_owner[owner]
+            self._cond.notify_all()
+
+    def hold_bytes(self, n: int):
+        """Wait until `n` more bytes fit in the shared image buffer (always admits one holder)."""
+        with self._cond:
+            while self.buffered and self.buffered + n > self.max_buffer:
+                self._cond.wait()
+            self.buffered += n
+
+    def release_bytes(self, n: int):
+        with self._cond:
+            self.buffered -= n
+            self._cond.notify_all()
+
+    def usage(self) -> dict:
+        with self._cond:
+            return {
+                "connections": self.active,
+                "waiting": len(self.waiters),
+                "by_host": dict(self.by_host),
+                "by_owner": dict(self.by_owner),
+                "requests": dict(self.requests),
+                "buffered": self.buffered,
+            }
+
+
+@st.cache_resource
+def get_governor() -> ResourceGovernor:
+    return ResourceGovernor()
+
+
+def parse_retry_after(value: Optional[str], default: float, cap: float = 60.0) -> float:
+    """Retry-After as seconds (delta-seconds or HTTP-date), capped so one host can't stall the run."""
+    if not value:
+        return default
+    value = value.strip()
+    try:
+        if value.isdigit():
+            return min(cap, float(value))
+        when = parsedate_to_datetime(value)
+        return min(cap, max(0.0, when.timestamp() - time.time()))
+    except Exception:
+        return default
+
+
+class GovernedResponse(requests.Response):
+    """A streamed response that holds its ResourceGovernor slot until it is closed, since its body is
+    still using the connection. One dropped without close() gives the slot back when collected."""
+
+    _release = None  # a weakref.finalize, so close() and collection release the slot only once
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self._release is not None:
+                self._release()
+
+
+class PoliteSession(requests.Session):
+    """requests.Session that takes a per-host rate-limit token and concurrency slot before each request.
+
+    429/503 responses and timeouts are retried (honoring Retry-After) up to `max_retries` times.
+    Pass `throttle=False` when the caller has already taken the token (see the page engine).
+    With a `governor`, each request also takes one of the server-wide connection slots, as `owner`.
+    """
+
+    def __init__(self, rate_limiter: Optional[HostRateLimiter] = None,
+                 controller: Optional[HostConcurrencyController] = None, max_retries: int = 2,
+                 governor: Optional[ResourceGovernor] = None):
+        super().__init__()
+        self.rate_limiter = rate_limiter
+        self.controller = controller
+        self.max_retries = max_retries
+        self.governor = governor
+        self.owner = secrets.token_hex(4)  # the audit this session works for (see CrawlJob)
+        self.http_cache = None         # shared HttpCache for page/CSS fetches (see polite_get)
+        self.thumbs = None             # shared ThumbStore when thumbnails are on (see full_image_details)
+        self.cache_stats = Counter()   # per-run cache hit/miss counts
+        self._stats_lock = threading.Lock()
+
+    def note_cache(self, event: str):
+        with self._stats_lock:
+            self.cache_stats[event] += 1
+
+    def request(self, method, url, *args, throttle: bool = True, **kwargs):
+        host = host_key(url)
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter and (throttle or attempt):
+                self.rate_limiter.acquire(host)
+            if self.controller:
+                self.controller.acquire(host)
+            backoff = float(2 ** attempt)
+            if self.governor:
+                self.governor.acquire(self.owner, host)
+            started = time.monotonic()
+            try:
+                resp = super().request(method, url, *args, **kwargs)
+            except (requests.Timeout, requests.ConnectionError):
+                if self.governor:
+                    self.governor.release(self.owner, host)
+                if self.controller:
+                    self.controller.release(host, throttled=True, pause_s=backoff)
+                if attempt >= self.max_retries:
+                    raise
+                continue
+
+            if self.governor:
+                if kwargs.get("stream"):
+                    resp.__class__ = GovernedResponse
+                    resp._release = weakref.finalize(resp, self.governor.release, self.owner, host)
+                else:
+                    self.governor.release(self.owner, host)
+            throttled = resp.status_code in (429, 503)
+            pause_s = parse_retry_after(resp.headers.get("Retry-After"), backoff) if throttled else None
+            if self.controller:
+                self.controller.release(host, time.monotonic() - started, throttled, pause_s)
+            if not throttled or attempt >= self.max_retries:
+                return resp
+            resp.close()
+            if not self.controller:
+                time.sleep(pause_s)
+
+
+ROBOTS_TTL_S = 24 * 3600        # how long a fetched robots.txt is trusted
+ROBOTS_ERROR_TTL_S = 10 * 60    # robots.txt that failed (5xx / unreachable) is retried sooner
+ROBOTS_TIMEOUT_S = 10
+ROBOTS_MAX_BYTES = 500 * 1024   # larger files are truncated, as major crawlers do
+
+
+class RobotsStore:
+    """robots.txt responses by origin, kept on disk and shared by every session (see get_robots_store)."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "robots.sqlite"), check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS robots (origin TEXT PRIMARY KEY, status INTEGER, body TEXT, expires REAL)"
+            )
+
+    def lookup(self, origin: str) -> Optional[tuple]:
+        """(status, body, expires) while still fresh, else None."""
+        with self._lock:
+            row = self._db.execute("SELECT status, body, expires FROM robots WHERE origin = ?", (origin,)).fetchone()
+        return row if row and row[2] > time.time() else None
+
+    def store(self, origin: str, status: int, body: str, expires: float):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO robots (origin, status, body, expires) VALUES (?, ?, ?, ?)",
+                             (origin, status, body, expires))
+
+
+@st.cache_resource
+def get_suffix_extractor():
+    # The public suffix list bundled with tldextract (never fetched over the network), loaded once per server
+    return suffix_extractor()
+
+
+@st.cache_resource
+def get_robots_store() -> RobotsStore:
+    return RobotsStore(HTTP_CACHE_DIR)
+
+
+def _robots_path(url: str) -> str:
+    """The path robotparser matches rules against (same normalization as RobotFileParser.can_fetch)."""
+    parsed = urlparse(unquote(url))
+    return quote(urlunparse(("", "", parsed.path, parsed.params, parsed.query, parsed.fragment))) or "/"
+
+
+class RobotsPolicy:
+    """robots.txt rules for every host a crawl touches, used in place of a single RobotFileParser.
+
+    Each host's robots.txt is read on first use, through the crawl session (its User-Agent, timeout
+    and rate limit), or from the shared RobotsStore while younger than ROBOTS_TTL_S. Decisions are
+    memoized per host and path prefix: rules only match as prefixes, so a path cut to the host's
+    longest rule gets the same answer. With `apply_delays`, a host's Crawl-delay / Request-rate is
+    passed to the session's rate limiter, which paces the page scheduler and every other request.
+    A robots.txt is fetched outside the lock: other hosts are answered meanwhile, and callers asking
+    for the same host wait on the one fetch in flight.
+    """
+
+    MAX_DECISIONS = 100_000  # per host; the memo is simply cleared past this
+
+    def __init__(self, session: "PoliteSession", user_agent: str, store: Optional[RobotsStore] = None,
+                 apply_delays: bool = True):
+        self.session = session
+        self.user_agent = user_agent or "*"
+        self.store = store
+        self.apply_delays = apply_delays
+        self._hosts = {}    # origin -> {"rp", "prefix_len", "decisions", "expires"}
+        self._loading = {}  # origin -> Future of the host entry being fetched
+        self._lock = threading.Lock()
+
+    def _fetch(self, origin: str):
+        try:
+            resp = self.session.get(f"{origin}/robots.txt", timeout=ROBOTS_TIMEOUT_S)
+            status, body = resp.status_code, resp.content[:ROBOTS_MAX_BYTES].decode("utf-8", errors="replace")
+        except Exception:
+            status, body = 0, ""
+        ttl = ROBOTS_TTL_S if 200 <= status < 500 else ROBOTS_ERROR_TTL_S
+        return status, body, time.time() + ttl
+
+    def _host(self, url: str) -> dict:
+        netloc = host_key(url)
+        origin = f"{urlparse(url).scheme.lower()}://{netloc}"
+        with self._lock:
+            h = self._hosts.get(origin)
+            if h and h["expires"] > time.time():
+                return h
+            loading = self._loading.get(origin)
+            if loading is None:
+                loading = self._loading[origin] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return loading.result()
+        try:
+            h = self._load(origin, netloc)
+            with self._lock:
+                self._hosts[origin] = h
+            loading.set_result(h)
+            return h
+        except BaseException as e:
+            loading.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(origin, None)
+
+    def _load(self, origin: str, netloc: str) -> dict:
+        cached = self.store.lookup(origin) if self.store else None
+        status, body, expires = cached or self._fetch(origin)
+        if self.store and not cached:
+            self.store.store(origin, status, body, expires)
+
+        rp = robotparser.RobotFileParser(f"{origin}/robots.txt")
+        if status in (401, 403):
+            rp.disallow_all = True
+        elif 400 <= status < 500:
+            rp.allow_all = True
+        elif 200 <= status < 300:
+            rp.parse(body.splitlines())
+        else:
+            rp.disallow_all = True  # server error or unreachable: assume complete disallow for now
+        rp.modified()
+        entries = rp.entries + ([rp.default_entry] if rp.default_entry else [])
+        prefix_len = max((len(line.path) for e in entries for line in e.rulelines), default=0)
+
+        if self.apply_delays and self.session.rate_limiter:
+            delay = rp.crawl_delay(self.user_agent)
+            rate = rp.request_rate(self.user_agent)
+            if rate and rate.requests:
+                delay = max(float(delay or 0), rate.seconds / rate.requests)
+            if delay:
+                self.session.rate_limiter.set_crawl_delay(netloc, float(delay))
+        return {"rp": rp, "prefix_len": prefix_len, "decisions": {}, "expires": expires}
+
+    def prefetch(self, url: str):
+        """Read the host's robots.txt now, so its Crawl-delay applies from the first request."""
+        self._host(url)
+
+    def can_fetch(self, user_agent: str, url: str) -> bool:
+        h = self._host(url)
+        key = (user_agent, _robots_path(url)[:h["prefix_len"]])
+        allowed = h["decisions"].get(key)
+        if allowed is None:
+            allowed = h["rp"].can_fetch(user_agent, url)
+            if len(h["decisions"]) >= self.MAX_DECISIONS:
+                h["decisions"].clear()
+            h["decisions"][key] = allowed
+        return allowed
+
+    def crawl_delay(self, url: str) -> Optional[float]:
+        """The Crawl-delay robots.txt asks of this crawl's user agent on the URL's host."""
+        return self._host(url)["rp"].crawl_delay(self.user_agent)
+
+    def site_maps(self, url: str) -> list:
+        """Sitemap URLs listed in the robots.txt of the URL's host, relative ones resolved against robots.txt."""
+        rp = self._host(url)["rp"]
+        return list(dict.fromkeys(urljoin(rp.url, u.strip()) for u in rp.site_maps() or []))
+
+
+def get_robots_session(base_url: str, user_agent: str, rate_per_sec: float, burst: int, respect_robots: bool = True,
+                       max_concurrency: int = 5, adaptive: bool = True):
+    limiter = HostRateLimiter(rate_per_sec, burst)
+    s = PoliteSession(limiter, HostConcurrencyController(max_concurrency, adaptive), governor=get_governor())
+    headers = DEFAULT_HEADERS.copy()
+    if user_agent:
+        headers["User-Agent"] = user_agent
+    s.headers.update(headers)
+    get_suffix_extractor()  # scope checks start with the first sitemap / page, so load the suffix list now
+    # Honor Crawl-delay / Request-rate of each host as its robots.txt is read
+    rp = RobotsPolicy(s, user_agent, get_robots_store(), apply_delays=respect_robots)
+    if respect_robots:
+        rp.prefetch(base_url)
+    return rp, s
+
+
+class HttpCache:
+    """Disk-backed HTTP cache for pages and stylesheets, shared by all sessions (see get_http_cache).
+
+    Responses are stored only when they carry a validator (ETag / Last-Modified) or a max-age.
+    Fresh entries are served without a request; stale ones are revalidated with
+    If-None-Match / If-Modified-Since and a 304 is answered from the cache. Total body size is
+    capped and the least-recently-used entries are evicted first.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "http_cache.sqlite"), check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT,"
+                " content_type TEXT, encoding TEXT, body BLOB, size INTEGER, fresh_until REAL, last_used REAL,"
+                " final_url TEXT)"
+            )
+            # Cache files written before redirects were recorded lack the final_url column
+            if "final_url" not in {c[1] for c in self._db.execute("PRAGMA table_info(entries)")}:
+                self._db.execute("ALTER TABLE entries ADD COLUMN final_url TEXT")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used)")
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def lookup(self, url: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, content_type, encoding, body, fresh_until, final_url"
+                " FROM entries WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if not row:
+            return None
+        keys = ("etag", "last_modified", "content_type", "encoding", "body", "fresh_until", "final_url")
+        return dict(zip(keys, row))
+
+    def touch(self, url: str, fresh_until: Optional[float] = None):
+        with self._lock, self._db:
+            if fresh_until is None:
+                self._db.execute("UPDATE entries SET last_used = ? WHERE url = ?", (time.time(), url))
+            else:
+                self._db.execute(
+                    "UPDATE entries SET last_used = ?, fresh_until = ? WHERE url = ?", (time.time(), fresh_until, url)
+                )
+
+    def store(self, url: str, resp: requests.Response) -> bool:
+        cc = (resp.headers.get("Cache-Control") or "").lower()
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        fresh_until = _fresh_until(cc)
+        if "no-store" in cc or not (etag or last_modified or fresh_until):
+            return False
+        body = resp.content
+        if len(body) > self.max_bytes // 10:
+            return False
+        with self._lock, self._db:
+            old = self._db.execute("SELECT size FROM entries WHERE url = ?", (url,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (url, etag, last_modified, content_type, encoding, body, size,"
+                " fresh_until, last_used, final_url) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, resp.headers.get("Content-Type", ""), resp.encoding,
+                 body, len(body), fresh_until or 0.0, time.time(), resp.url or url),
+            )
+            self._total += len(body) - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+        return True
+
+    def _evict(self):
+        # Drop least-recently-used entries until we are back under 90% of the cap
+        target = int(self.max_bytes * 0.9)
+        for url, size in self._db.execute("SELECT url, size FROM entries ORDER BY last_used").fetchall():
+            if self._total <= target:
+                break
+            self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            self._total -= size
+
+    @staticmethod
+    def as_response(entry: dict, url: str) -> requests.Response:
+        # r.url is where the body was actually served from, so relative links resolve as on a live fetch
+        r = requests.Response()
+        r.status_code = 200
+        r.url = entry.get("final_url") or url
+        r._content = entry["body"]
+        r.headers["Content-Type"] = entry["content_type"] or ""
+        if entry["etag"]:
+            r.headers["ETag"] = entry["etag"]
+        if entry["last_modified"]:
+            r.headers["Last-Modified"] = entry["last_modified"]
+        r.encoding = entry["encoding"]
+        return r
+
+
+def _fresh_until(cache_control: str) -> Optional[float]:
+    m = re.search(r"max-age=(\d+)", cache_control or "")
+    if not m or "no-cache" in cache_control:
+        return None
+    return time.time() + int(m.group(1))
+
+
+HTTP_CACHE_DIR = os.path.join(tempfile.gettempdir(), "image_audit_http_cache")
+HTTP_CACHE_MAX_MB = 500
+
+
+@st.cache_resource
+def get_http_cache() -> HttpCache:
+    return HttpCache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_MB * 1024 * 1024)
+
+
+def read_capped(session: PoliteSession, resp: requests.Response, accept: tuple, max_bytes: int) -> bool:
+    """Read a streamed response into `resp.content`. A 200 whose Content-Type contains none of `accept`
+    is closed after its headers (empty body), and at most `max_bytes` of the body are kept.
+    Returns True only if the whole body was read."""
+    ctype = resp.headers.get("Content-Type", "")
+    if accept and resp.status_code == 200 and not any(a in ctype for a in accept):
+        resp.close()
+        resp._content = b""
+        session.note_cache("skipped_type")
+        return False
+    body = bytearray()
+    complete = True
+    try:
+        for chunk in resp.iter_content(STREAM_CHUNK):
+            body += chunk
+            if max_bytes and len(body) > max_bytes:
+                del body[max_bytes:]
+                complete = False
+                session.note_cache("truncated")
+                break
+    except requests.RequestException:
+        complete = False
+    finally:
+        resp.close()
+    resp._content = bytes(body)
+    return complete
+
+
+def polite_get(session: PoliteSession, url: str, timeout: int = 15, throttle: bool = True,
+               accept: tuple = (), max_bytes: int = 0):
+    """GET through the shared HTTP cache. With `accept` or `max_bytes` the body is streamed (see read_capped),
+    so responses of the wrong type or size stop downloading early; a cut-short body is not cached."""
+    cache = session.http_cache
+    entry = cache.lookup(url) if cache else None
+    if entry and entry["fresh_until"] and entry["fresh_until"] > time.time():
+        cache.touch(url)
+        session.note_cache("fresh")
+        return HttpCache.as_response(entry, url)
+
+    headers = {}
+    if entry:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+    stream = bool(accept or max_bytes)
+    try:
+        resp = session.get(url, timeout=timeout, throttle=throttle, headers=headers or None, stream=stream)
+    except Exception:
+        return None
+    complete = read_capped(session, resp, accept, max_bytes) if stream else True
+
+    if cache:
+        if resp.status_code == 304 and entry:
+            cache.touch(url, _fresh_until((resp.headers.get("Cache-Control") or "").lower()))
+            session.note_cache("revalidated")
+            return HttpCache.as_response(entry, url)
+        session.note_cache("miss")
+        if resp.status_code == 200 and complete and cache.store(url, resp):
+            session.note_cache("stored")
+    return resp
+
+SITEMAP_MAX_URLS = 100_000
+SITEMAP_MAX_FILES = 50
+
+
+def discover_sitemaps(rp, start_url: str) -> list:
+    """Sitemap URLs from robots.txt `Sitemap:` lines, plus the conventional /sitemap.xml."""
+    parsed = urlparse(start_url)
+    found = list((rp.site_maps(start_url) if rp else None) or [])
+    default = f"{parsed.scheme.lower()}://{host_key(start_url)}/sitemap.xml"
+    if default not in found:
+        found.append(default)
+    return found
+
+
+def iter_sitemap_urls(session, sitemap_urls: list, max_urls: int = SITEMAP_MAX_URLS,
+                      max_files: int = SITEMAP_MAX_FILES):
+    """Yield page URLs listed in sitemaps, following sitemap indexes.
+
+    Each file is fed to a pull parser chunk by chunk as it downloads (gzip is detected by its magic bytes),
+    and finished <url> elements are dropped as we go, so large sitemaps are never held in memory.
+    """
+    pending = deque(sitemap_urls)
+    fetched = set()
+    yielded = 0
+    while pending and len(fetched) < max_files:
+        sm_url = pending.popleft()
+        if sm_url in fetched:
+            continue
+        fetched.add(sm_url)
+        try:
+            resp = session.get(sm_url, timeout=30, stream=True)
+        except Exception:
+            continue
+        with resp:
+            if resp.status_code != 200:
+                continue
+            parser = XMLPullParser(events=("start", "end"))
+            gunzip = None
+            root, is_index = None, False
+            try:
+                for chunk in resp.iter_content(64 * 1024):
+                    if gunzip is None:
+                        gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS) if chunk[:2] == b"\x1f\x8b" else False
+                    parser.feed(gunzip.decompress(chunk) if gunzip else chunk)
+                    for event, el in parser.read_events():
+                        tag = el.tag.rsplit("}", 1)[-1]
+                        if event == "start":
+                            if root is None:
+                                root, is_index = el, tag == "sitemapindex"
+                            continue
+                        if tag == "loc" and el.text:
+                            loc = urljoin(sm_url, el.text.strip())
+                            if is_index:
+                                pending.append(loc)
+                            else:
+                                yield loc.split('#')[0]
+                                yielded += 1
+                                if yielded >= max_urls:
+                                    return
+                        elif tag in ("url", "sitemap"):
+                            root.clear()
+            except (ParseError, zlib.error, requests.RequestException):
+                continue
+
+
+def preflight_site(session, rp, start_url: str, include_subs: bool, per_page_cap: int, sample_size: int = 5,
+                   rules: Optional[CanonRules] = None, max_html_bytes: int = 0, respect_robots: bool = True,
+                   user_agent: str = "") -> dict:
+    """Estimate site size: distinct in-scope sitemap pages, plus images per page from a small random sample.
+
+    With `respect_robots`, pages robots.txt disallows are neither counted nor fetched, as in the crawl.
+    """
+    def allowed(u: str) -> bool:
+        return not (respect_robots and rp and not rp.can_fetch(user_agent, u))
+
+    pages = 0
+    sample = []
+    listed = set()
+    for u in iter_sitemap_urls(session, discover_sitemaps(rp, start_url)):
+        u = canonicalize_url(u, rules or canon_rules())
+        if u in listed or looks_like_file(u) or not same_scope(u, start_url, include_subs) or not allowed(u):
+            continue
+        listed.add(u)
+        pages += 1
+        # Reservoir sample, so the pages we fetch are spread over the whole sitemap
+        if len(sample) < sample_size:
+            sample.append(u)
+        elif random.randrange(pages) < sample_size:
+            sample[random.randrange(sample_size)] = u
+
+    linked_from_start = 0
+    image_counts = []
+    for u in [start_url] + [u for u in sample if u != start_url]:
+        if not allowed(u):
+            continue
+        resp = polite_get(session, u, accept=("text/html",), max_bytes=max_html_bytes)
+        if not resp or resp.status_code != 200 or 'text/html' not in resp.headers.get('Content-Type', ''):
+            continue
+        extracted = extract_in_scope(resp.url or u, resp.text, None, per_page_cap, start_url, include_subs,
+                                     rules or canon_rules())
+        image_counts.append(len({iu for (iu, _, _) in extracted.images}))
+        if u == start_url:
+            linked_from_start = sum(1 for a in extracted.anchors if allowed(a))
+    avg_images = sum(image_counts) / len(image_counts) if image_counts else 0.0
+    est_pages = max(pages, linked_from_start, 1)
+    return {
+        "start_url": start_url,
+        "sitemap_pages": pages,
+        "sitemap_capped": pages >= SITEMAP_MAX_URLS,
+        "linked_from_start": linked_from_start,
+        "sampled": len(image_counts),
+        "avg_images": avg_images,
+        "est_pages": est_pages,
+        "est_images": int(round(est_pages * avg_images)),
+    }
+
+
+@st.cache_resource
+def get_parse_pool() -> ProcessPoolExecutor:
+    # "spawn" keeps workers clear of the server's threads; they only import page_extract
+    return ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn"))
+
+
+def ready_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """The shared parse pool, replaced if a worker died; None if it can't be started."""
+    for _ in range(2):
+        pool = get_parse_pool()
+        try:
+            pool.submit(int).result(timeout=60)
+            return pool
+        except BrokenProcessPool:
+            get_parse_pool.clear()
+        except Exception:
+            return None
+    return None
+
+
+def fetch_and_extract(session: PoliteSession, url: str, parse_pool: Optional[ProcessPoolExecutor],
+                      per_page_cap: int, root: str, include_subs: bool, rules: CanonRules, max_html_bytes: int):
+    """Fetch a page (no rate-limit wait; the caller took the token) and extract its links, in a
+    worker process when a parse pool is given, otherwise on this page-pool thread, so the script
+    thread never parses. Links resolve against the final (post-redirect) URL.
+    The body is streamed: non-HTML responses are dropped after their headers, and only the first
+    `max_html_bytes` of a page are read. Returns (response, PageLinks or None)."""
+    resp = polite_get(session, url, throttle=False, accept=("text/html",), max_bytes=max_html_bytes)
+    if not resp or not (200 <= resp.status_code < 300) or 'text/html' not in resp.headers.get('Content-Type', ''):
+        return resp, None
+    base = resp.url or url
+    try:
+        if parse_pool is None:
+            return resp, extract_in_scope(base, resp.text, None, per_page_cap, root, include_subs, rules)
+        fut = parse_pool.submit(extract_in_scope, base, resp.content, resp.encoding, per_page_cap, root, include_subs,
+                                rules)
+        return resp, fut.result()
+    except Exception:
+        return resp, None  # parsed on the script thread instead
+
+
+def file_ext(url: str) -> str:
+    path = urlparse(url).path.lower()
+    for ext in IMG_EXTS:
+        if path.endswith(ext):
+            return ext
+    return ''
+
+def domain_of(url: str) -> str:
+    return registered_domain(url)
+
+def guessed_source(url: str) -> str:
+    dom = domain_of(url)
+    if dom in STOCK_DOMAINS:
+        return f"Stock / Library ({dom})"
+    return "Unknown / Site-hosted"
+
+def reverse_links(url: str):
+    g = f"https://www.google.com/searchbyimage?image_url={requests.utils.quote(url, safe='')}"
+    t = f"https://tineye.com/search?url={requests.utils.quote(url, safe='')}"
+    return g, t
+
+def head_size(session: requests.Session, url: str, timeout: int = 15):
+    try:
+        r = session.head(url, allow_redirects=True, timeout=timeout)
+        size = r.headers.get('Content-Length')
+        ct = r.headers.get('Content-Type', '')
+        return int(size) if size and size.isdigit() else None, ct
+    except Exception:
+        return None, ''
+
+# Streamed reads stop at the first chunk past their limit, so may overshoot it by up to one chunk
+STREAM_CHUNK = 8192
+# Most EXIF/thumbnail bytes reserved by image workers at once (bounds the image bytes held in memory)
+IMAGE_BYTES_IN_FLIGHT = 128 * 1024 * 1024
+
+
+class ByteBudget:
+    """Download cap for the EXIF/thumbnail reads of one run, shared by the image workers.
+
+    A worker reserves the most an image may cost before reading it and settles with what it actually
+    read, so concurrent reads can't take the run past `limit`. A reservation waits while other reads
+    hold the rest of the budget (or `in_flight_limit` bytes) and is only cut short once they settle.
+    With a `shared` governor, granted bytes also count against the server-wide image buffer.
+    """
+
+    def __init__(self, limit: int, in_flight_limit: int = IMAGE_BYTES_IN_FLIGHT,
+                 shared: Optional[ResourceGovernor] = None):
+        self.limit = limit
+        self.in_flight_limit = in_flight_limit
+        self.shared = shared
+        self.used = 0
+        self.reserved = 0
+        self._cond = threading.Condition()
+
+    def reserve(self, n: int) -> int:
+        """Reserve up to `n` bytes; returns the amount granted (0 once the budget is spent)."""
+        with self._cond:
+            while self.reserved and (self.reserved + n > self.in_flight_limit
+                                     or self.used + self.reserved + n > self.limit):
+                self._cond.wait()
+            granted = max(0, min(n, self.limit - self.used - self.reserved))
+            self.reserved += granted
+        if self.shared and granted:
+            self.shared.hold_bytes(granted)
+        return granted
+
+    def reserve_read(self, max_bytes: int):
+        """Reserve for one image read of at most `max_bytes`: (bytes granted, read limit; <= 0 for none)."""
+        granted = self.reserve(max_bytes + STREAM_CHUNK)
+        return granted, min(max_bytes, granted - STREAM_CHUNK)
+
+    def settle(self, granted: int, used: int) -> None:
+        if self.shared and granted:
+            self.shared.release_bytes(granted)
+        with self._cond:
+            self.reserved -= granted
+            self.used += used
+            self._cond.notify_all()
+
+
+def fetch_bytes(session: requests.Session, url: str, max_bytes: int):
+    try:
+        r = session.get(url, stream=True, timeout=20)
+        buf = BytesIO()
+        total = 0
+        with r:
+            r.raise_for_status()
+            for chunk in r.iter_content(STREAM_CHUNK):
+                if chunk:
+                    buf.write(chunk)
+                    total += len(chunk)
+                    if total > max_bytes:
+                        break
+        buf.seek(0)
+        return buf, total
+    except Exception:
+        return None, 0
+
+def try_make_thumb(img_bytes: BytesIO, max_px: int = 128, fmt: str = "PNG") -> Optional[BytesIO]:
+    try:
+        with Image.open(img_bytes) as im:
+            im = im.convert("RGB") if im.mode not in ("RGB", "RGBA") or fmt == "JPEG" else im
+            im.thumbnail((max_px, max_px))
+            out = BytesIO()
+            im.save(out, format=fmt, **({"quality": 80} if fmt in ("WEBP", "JPEG") else {}))
+            out.seek(0)
+            return out
+    except (UnidentifiedImageError, OSError):
+        return None
+
+
+THUMB_DIR = os.path.join(tempfile.gettempdir(), "image_audit_thumbs")
+THUMB_MAX_MB = 200
+THUMB_PX = 128
+
+
+class ThumbStore:
+    """Thumbnails on disk, content-addressed by the image's SHA-1 and shared by every session (see get_thumb_store).
+
+    A thumbnail's key is its file name, and rows, checkpoints and the image metadata cache hold only
+    the key. The same image on many pages, sites or audits is therefore decoded and stored once. Files are WebP
+    (JPEG where Pillow lacks WebP). Past `max_bytes` the oldest files are dropped; rows pointing at
+    them simply show no preview.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.format, self.ext = ("WEBP", "webp") if features.check("webp") else ("JPEG", "jpg")
+        self._lock = threading.Lock()
+        self._written = 0  # bytes added since the last quota check
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, os.path.basename(key))
+
+    def has(self, key: str) -> bool:
+        return not key.startswith("data:") and os.path.exists(self._path(key))
+
+    def put(self, data: bytes) -> Optional[str]:
+        """Key of the thumbnail for these image bytes, making it unless it is already stored."""
+        key = f"{hashlib.sha1(data).hexdigest()}.{self.ext}"
+        path = self._path(key)
+        try:
+            os.utime(path)  # reused: _prune drops the oldest by mtime, so mark it recently used
+            return key
+        except OSError:
+            pass  # not stored yet, or pruned meanwhile
+        thumb = try_make_thumb(BytesIO(data), THUMB_PX, self.format)
+        if thumb is None:
+            return None
+        body = thumb.getvalue()
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as fh:
+                fh.write(body)
+            os.replace(tmp, path)
+        except OSError:
+            self._remove(tmp)
+            return None
+        with self._lock:
+            self._written += len(body)
+            if self._written > self.max_bytes // 10:
+                self._written = 0
+                self._prune()
+        return key
+
+    def data_uri(self, key: str) -> Optional[str]:
+        """The thumbnail as a data URI for the results grid (None if it has been dropped)."""
+        if not key or key.startswith("data:"):
+            return key or None  # older checkpoints carry the thumbnail itself
+        try:
+            with open(self._path(key), "rb") as fh:
+                body = fh.read()
+        except OSError:
+            return None
+        mime = "image/webp" if key.endswith(".webp") else "image/jpeg"
+        return f"data:{mime};base64,{base64.b64encode(body).decode('ascii')}"
+
+    def _prune(self):
+        # Other threads (or another server process on the same directory) may remove files while we scan
+        entries = []
+        try:
+            for e in os.scandir(self.directory):
+                if e.is_file() and not e.name.endswith(".tmp"):
+                    try:
+                        info = e.stat()
+                    except OSError:
+                        continue
+                    entries.append((info.st_mtime, info.st_size, e.path))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * 0.9:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@st.cache_resource
+def get_thumb_store() -> ThumbStore:
+    return ThumbStore(THUMB_DIR, THUMB_MAX_MB * 1024 * 1024)
+
+# Magic-byte signatures; the URL extension and Content-Type header are only hints
+IMAGE_MAGIC = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+)
+PROBE_FIRST_BYTES = 16 * 1024
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def sniff_image_type(data: bytes) -> str:
+    for magic, ctype in IMAGE_MAGIC:
+        if data.startswith(magic):
+            return ctype
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    head = data[:256].lstrip().lower()
+    if head.startswith(b"<svg") or (head.startswith(b"<?xml") and b"<svg" in data[:1024].lower()):
+        return "image/svg+xml"
+    return ""
+
+
+def parse_image_header(data: bytes) -> Optional[dict]:
+    """Type, size and raw EXIF from the start of a JPEG/PNG/GIF/WebP file.
+
+    Returns None while `data` is too short to hold the header (and EXIF block, if the file has one);
+    raises ValueError when the bytes are not one of these formats or the header is malformed.
+    """
+    ctype = sniff_image_type(data)
+    if not ctype and len(data) < 12:
+        return None  # too short to tell
+    if ctype == "image/jpeg":
+        pos, exif = 2, None
+        while True:
+            while data[pos:pos + 1] == b"\xff" and data[pos + 1:pos + 2] == b"\xff":
+                pos += 1  # fill bytes
+            if len(data) < pos + 4:
+                return None
+            if data[pos] != 0xFF:
+                raise ValueError("bad JPEG marker")
+            marker = data[pos + 1]
+            if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                pos += 2
+                continue
+            if marker in (0xD9, 0xDA):
+                raise ValueError("JPEG without frame header")
+            seg_len = int.from_bytes(data[pos + 2:pos + 4], "big")
+            if marker in JPEG_SOF_MARKERS:
+                if len(data) < pos + 9:
+                    return None
+                return {"type": ctype, "height": int.from_bytes(data[pos + 5:pos + 7], "big"),
+                        "width": int.from_bytes(data[pos + 7:pos + 9], "big"), "exif": exif}
+            if marker == 0xE1 and exif is None:
+                if len(data) < pos + 2 + seg_len:
+                    return None
+                if data[pos + 4:pos + 10] == b"Exif\x00\x00":
+                    exif = data[pos + 4:pos + 2 + seg_len]
+            pos += 2 + seg_len
+    if ctype == "image/png":
+        if len(data) < 24:
+            return None
+        info = {"type": ctype, "width": int.from_bytes(data[16:20], "big"),
+                "height": int.from_bytes(data[20:24], "big"), "exif": None}
+        pos = 8
+        while True:  # an eXIf chunk, if any, precedes the image data
+            if len(data) < pos + 8:
+                return None
+            length, kind = int.from_bytes(data[pos:pos + 4], "big"), data[pos + 4:pos + 8]
+            if kind in (b"IDAT", b"IEND"):
+                return info
+            if kind == b"eXIf":
+                if len(data) < pos + 8 + length:
+                    return None
+                info["exif"] = data[pos + 8:pos + 8 + length]
+                return info
+            pos += 12 + length
+    if ctype == "image/gif":
+        if len(data) < 10:
+            return None
+        return {"type": ctype, "width": int.from_bytes(data[6:8], "little"),
+                "height": int.from_bytes(data[8:10], "little"), "exif": None}
+    if ctype == "image/webp":
+        if len(data) < 30:
+            return None
+        kind = data[12:16]
+        if kind == b"VP8 ":
+            return {"type": ctype, "width": int.from_bytes(data[26:28], "little") & 0x3FFF,
+                    "height": int.from_bytes(data[28:30], "little") & 0x3FFF, "exif": None}
+        if kind == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return {"type": ctype, "width": (bits & 0x3FFF) + 1, "height": ((bits >> 14) & 0x3FFF) + 1, "exif": None}
+        if kind == b"VP8X":
+            info = {"type": ctype, "width": int.from_bytes(data[24:27], "little") + 1,
+                    "height": int.from_bytes(data[27:30], "little") + 1, "exif": None}
+            if not data[20] & 0x08:
+                return info
+            pos = 12  # the EXIF chunk usually follows the image data, so this may need most of the file
+            while True:
+                if len(data) < pos + 8:
+                    return None
+                length, chunk = int.from_bytes(data[pos + 4:pos + 8], "little"), data[pos:pos + 4]
+                if chunk == b"EXIF":
+                    if len(data) < pos + 8 + length:
+                        return None
+                    info["exif"] = data[pos + 8:pos + 8 + length]
+                    return info
+                pos += 8 + length + (length & 1)
+    raise ValueError("not a JPEG/PNG/GIF/WebP header")
+
+
+def exif_artist(raw_exif: Optional[bytes]) -> str:
+    if not raw_exif:
+        return ""
+    try:
+        ex = Image.Exif()
+        ex.load(raw_exif)
+        artist = ex.get(315)
+        return str(artist) if artist else ""
+    except Exception:
+        return ""
+
+
+def probe_image(session: requests.Session, url: str, max_bytes: int, first_bytes: int = PROBE_FIRST_BYTES,
+                data: bytes = b""):
+    """Read an image's header (and EXIF block) with as few bytes as possible.
+
+    Asks for `first_bytes` with a Range request and grows the range (x4) only while the header is
+    incomplete, up to `max_bytes`. A server that ignores Range answers 200; that body is parsed as it
+    streams and the connection is dropped as soon as the header is complete. `data` continues a
+    probe from bytes already read.
+    Returns (header dict or None, bytes downloaded, sniffed type).
+    """
+    downloaded = 0
+    want = min(max(first_bytes, len(data) * 4), max_bytes)
+    while True:
+        try:
+            r = session.get(url, headers={"Range": f"bytes={len(data)}-{want - 1}"}, stream=True, timeout=20)
+        except Exception:
+            return None, downloaded, sniff_image_type(data)
+        try:
+            with r:
+                if r.status_code == 206:
+                    total = (r.headers.get("Content-Range") or "").rpartition("/")[2]
+                    for chunk in r.iter_content(STREAM_CHUNK):
+                        data += chunk
+                        downloaded += len(chunk)
+                        if len(data) >= want:
+                            break
+                    at_end = len(data) < want or (total.isdigit() and len(data) >= int(total))
+                elif r.status_code == 200:
+                    data, at_end = b"", True
+                    for chunk in r.iter_content(STREAM_CHUNK):
+                        data += chunk
+                        downloaded += len(chunk)
+                        try:
+                            if parse_image_header(data) or len(data) >= max_bytes:
+                                break
+                        except ValueError:
+                            break
+                else:
+                    return None, downloaded, sniff_image_type(data)
+        except (requests.RequestException, OSError):
+            # The connection broke mid-body: parse what arrived rather than failing the image
+            try:
+                return parse_image_header(data), downloaded, sniff_image_type(data)
+            except ValueError:
+                return None, downloaded, sniff_image_type(data)
+        try:
+            info = parse_image_header(data)
+        except ValueError:
+            return None, downloaded, sniff_image_type(data)
+        if info or at_end or want >= max_bytes:
+            return info, downloaded, sniff_image_type(data)
+        want = min(want * 4, max_bytes)
+
+
+def full_image_details(buf: BytesIO, try_exif: bool, thumbs: Optional[ThumbStore] = None):
+    """(width, height, EXIF artist, thumbnail key in `thumbs`) from a whole image file."""
+    width = height = thumb_data = None
+    exif_author = ""
+    # Only parse EXIF if explicitly requested (saves CPU)
+    if try_exif:
+        try:
+            with Image.open(buf) as im:
+                width, height = im.size
+                exif = im.getexif()
+                if exif:
+                    artist = exif.get(315)
+                    if artist:
+                        exif_author = str(artist)
+        except (UnidentifiedImageError, OSError):
+            pass
+    if thumbs is not None:
+        try:
+            thumb_data = thumbs.put(buf.getvalue())
+        except Exception:
+            pass
+    return width, height, exif_author, thumb_data
+
+
+def image_details(session: requests.Session, url: str, max_bytes: int, try_exif: bool, show_thumbs: bool):
+    """(width, height, EXIF artist, thumbnail key, sniffed type, bytes downloaded) for one image.
+
+    Thumbnails need the whole file; dimensions and EXIF alone come from a Range probe of its header.
+    """
+    if not show_thumbs:
+        info, n, sniffed = probe_image(session, url, max_bytes)
+        if info:
+            return info["width"], info["height"], exif_artist(info["exif"]), None, sniffed, n
+        return None, None, "", None, sniffed, n
+
+    buf, n = fetch_bytes(session, url, max_bytes)
+    if not buf:
+        return None, None, "", None, "", n
+    return (*full_image_details(buf, try_exif, session.thumbs), sniff_image_type(buf.getvalue()[:1024]), n)
+
+
+SNIFF_BYTES = 16
+
+
+def stream_image(session: requests.Session, url: str, max_bytes: int, read_exif: bool, make_thumb: bool,
+                 validators: Optional[dict] = None) -> dict:
+    """One streamed GET per image, in place of a HEAD followed by a GET.
+
+    Size and type come from the response headers (Content-Range / Content-Length and Content-Type,
+    with magic-byte sniffing when the type isn't image/*). The request is dropped as soon as the
+    image is known to be over `max_bytes` or not an image. Otherwise the body streams into metadata
+    extraction: the whole file for thumbnails, just the header for EXIF/dimensions (a Range request,
+    continued by probe_image if the header is longer), and a few magic bytes when neither is wanted.
+    With `validators` (etag / last_modified) the request is conditional and a 304 comes back as
+    {"not_modified": True}.
+    """
+    meta = {"size": None, "type": "", "width": None, "height": None, "artist": "", "thumb": None,
+            "sha1": None, "etag": None, "last_modified": None, "fresh_until": None, "note": "", "bytes": 0}
+    limit = max_bytes if make_thumb else (PROBE_FIRST_BYTES if read_exif else SNIFF_BYTES)
+    headers = {} if make_thumb else {"Range": f"bytes=0-{limit - 1}"}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    try:
+        r = session.get(url, stream=True, timeout=20, headers=headers or None)
+    except Exception:
+        return meta
+    data = bytearray()
+    with r:
+        if r.status_code == 304 and validators:
+            return {"not_modified": True}
+        if r.status_code not in (200, 206):
+            return meta
+        meta["etag"], meta["last_modified"] = r.headers.get("ETag"), r.headers.get("Last-Modified")
+        meta["fresh_until"] = _fresh_until((r.headers.get("Cache-Control") or "").lower())
+        length = ((r.headers.get("Content-Range") or "").rpartition("/")[2] if r.status_code == 206
+                  else r.headers.get("Content-Length", ""))
+        meta["size"] = int(length) if length.isdigit() else None
+        header_type = r.headers.get("Content-Type", "")
+        meta["type"] = header_type
+        if meta["size"] is not None and meta["size"] > max_bytes:
+            meta["note"] = "Skipped (exceeds per-image size cap)"
+            return meta
+        if r.status_code == 200 and read_exif and not make_thumb:
+            limit = max_bytes  # Range ignored: read on until the header is complete
+        complete = True
+        try:
+            for chunk in r.iter_content(STREAM_CHUNK):
+                data += chunk
+                if len(data) > max_bytes:
+                    meta["bytes"] = len(data)
+                    meta["note"] = "Skipped (exceeds per-image size cap)"
+                    return meta
+                if len(data) >= SNIFF_BYTES and not header_type.lower().startswith("image/") \
+                        and not sniff_image_type(bytes(data[:1024])):
+                    meta["bytes"] = len(data)
+                    meta["note"] = "Skipped (not an image)"
+                    return meta
+                if make_thumb:
+                    continue
+                try:
+                    if len(data) >= limit or (read_exif and parse_image_header(data)):
+                        complete = False
+                        break
+                except ValueError:
+                    complete = False
+                    break
+        except (requests.RequestException, OSError):
+            # The connection broke mid-body: keep what the headers told us and leave the rest unknown
+            meta["bytes"] = len(data)
+            meta["note"] = "Incomplete (connection dropped mid-download)"
+            return meta
+    meta["bytes"] = len(data)
+    sniffed = sniff_image_type(bytes(data[:1024]))
+    if sniffed and not header_type.lower().startswith("image/"):
+        meta["type"] = sniffed
+    if make_thumb:
+        if complete:
+            meta["size"] = meta["size"] or len(data)
+            meta["sha1"] = hashlib.sha1(data).hexdigest()
+        meta["width"], meta["height"], meta["artist"], meta["thumb"] = full_image_details(
+            BytesIO(bytes(data)), read_exif, session.thumbs
+        )
+    elif read_exif:
+        try:
+            info = parse_image_header(data)
+        except ValueError:
+            info = None
+        if info is None and r.status_code == 206 and len(data) < (meta["size"] or max_bytes):
+            info, n, _ = probe_image(session, url, max_bytes, data=bytes(data))
+            meta["bytes"] += n
+        if info:
+            meta["width"], meta["height"], meta["artist"] = info["width"], info["height"], exif_artist(info["exif"])
+    return meta
+
+
+class ImageMetaCache:
+    """Image metadata by URL, shared by every page and session and kept on disk across audits
+    (see get_image_meta_cache).
+
+    Stores what stream_image learned: size, type, dimensions, EXIF Artist, content hash, thumbnail
+    and the ETag / Last-Modified validators. `detail` records how much of the file was read
+    (DETAIL_SIZE: headers only, DETAIL_HEADER: image header, DETAIL_FULL: whole file), so an entry
+    only answers requests that need no more than that. Oldest entries are dropped past `max_entries`.
+    """
+    DETAIL_SIZE, DETAIL_HEADER, DETAIL_FULL = 0, 1, 2
+    FIELDS = ("size", "type", "width", "height", "artist", "sha1", "thumb", "etag", "last_modified",
+              "detail", "fresh_until", "checked_at")
+
+    def __init__(self, directory: str, max_entries: int = 200_000):
+        os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "image_meta.sqlite"), check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS images (url TEXT PRIMARY KEY, size INTEGER, type TEXT, width INTEGER,"
+                " height INTEGER, artist TEXT, sha1 TEXT, thumb TEXT, etag TEXT, last_modified TEXT,"
+                " detail INTEGER, fresh_until REAL, checked_at REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS images_age ON images (checked_at)")
+        self._count = self._db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def lookup(self, url: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(self.FIELDS)} FROM images WHERE url = ?", (url,)).fetchone()
+        return dict(zip(self.FIELDS, row)) if row else None
+
+    def touch(self, url: str):
+        with self._lock, self._db:
+            self._db.execute("UPDATE images SET checked_at = ? WHERE url = ?", (time.time(), url))
+
+    def store(self, url: str, meta: dict, detail: int):
+        values = {f: meta.get(f) for f in self.FIELDS}
+        values.update(detail=detail, fresh_until=meta.get("fresh_until") or 0.0, checked_at=time.time())
+        with self._lock, self._db:
+            cur = self._db.execute(
+                f"INSERT OR REPLACE INTO images (url, {', '.join(self.FIELDS)}) VALUES ({', '.join('?' * (len(self.FIELDS) + 1))})",
+                (url, *(values[f] for f in self.FIELDS)),
+            )
+            self._count += 1 if cur.rowcount == 1 else 0
+            if self._count > self.max_entries:
+                # Trim the oldest tenth in one go rather than one row per insert
+                drop = self._count - int(self.max_entries * 0.9)
+                self._db.execute(
+                    "DELETE FROM images WHERE url IN (SELECT url FROM images ORDER BY checked_at LIMIT ?)", (drop,)
+                )
+                self._count = self._db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+
+IMAGE_META_CACHE_DIR = HTTP_CACHE_DIR
+
+
+@st.cache_resource
+def get_image_meta_cache() -> ImageMetaCache:
+    return ImageMetaCache(IMAGE_META_CACHE_DIR)
+
+
+def image_cache_key(url: str) -> str:
+    parts = urlparse(url.split('#')[0])
+    return parts._replace(scheme=parts.scheme.lower(), netloc=parts.netloc.lower()).geturl()
+
+
+def budgeted_stream_image(session: requests.Session, url: str, max_bytes: int, read_exif: bool, make_thumb: bool,
+                          budget: Optional[ByteBudget] = None, validators: Optional[dict] = None) -> dict:
+    """stream_image with its EXIF/thumbnail read reserved against `budget` first.
+
+    With less than `max_bytes` left the image is read under the smaller limit (most images are far
+    below the per-image cap); once the budget is spent only its size and type are fetched.
+    """
+    if budget is None or not (read_exif or make_thumb):
+        return stream_image(session, url, max_bytes, read_exif, make_thumb, validators)
+    granted, limit = budget.reserve_read(max_bytes)
+    meta = {}
+    try:
+        if limit > 0:
+            meta = stream_image(session, url, limit, read_exif, make_thumb, validators)
+        else:
+            meta = stream_image(session, url, max_bytes, False, False, validators)
+    finally:
+        budget.settle(granted, meta.get("bytes", 0) if limit > 0 else 0)
+    if meta.get("not_modified"):
+        return meta
+    if limit <= 0:
+        capped = not meta["note"]
+    else:
+        capped = (limit < max_bytes and meta["note"] == "Skipped (exceeds per-image size cap)"
+                  and (meta["size"] is None or meta["size"] <= max_bytes))
+    if capped:
+        meta.update(width=None, height=None, artist="", thumb=None,
+                    note="Skipped (hit additional download cap this run)")
+    return meta
+
+
+def cached_stream_image(session: PoliteSession, url: str, max_bytes: int, read_exif: bool, make_thumb: bool,
+                        cache: Optional[ImageMetaCache], fresh_after: float,
+                        budget: Optional[ByteBudget] = None) -> dict:
+    """stream_image backed by the image metadata cache.
+
+    Entries checked since `fresh_after` (the start of this crawl) or still within their max-age are
+    used with no request at all; older ones with a validator are revalidated by a conditional GET
+    (a 304 carries no body). Repeat images therefore cost no network and no decode.
+    """
+    if cache is None:
+        return budgeted_stream_image(session, url, max_bytes, read_exif, make_thumb, budget)
+    need = (ImageMetaCache.DETAIL_FULL if make_thumb
+            else ImageMetaCache.DETAIL_HEADER if read_exif else ImageMetaCache.DETAIL_SIZE)
+    key = image_cache_key(url)
+    entry = cache.lookup(key)
+    meta = None
+    # A thumbnail dropped from the store since (or an older inline one) is made again from a full read
+    if entry and make_thumb and entry["thumb"] and session.thumbs and not session.thumbs.has(entry["thumb"]):
+        entry = None
+    # An entry over the size cap answers any request: the image is skipped either way
+    if entry and (entry["detail"] >= need or (entry["size"] or 0) > max_bytes):
+        if entry["checked_at"] >= fresh_after or entry["fresh_until"] > time.time():
+            session.note_cache("image_hit")
+            meta = entry
+        elif entry["etag"] or entry["last_modified"]:
+            meta = budgeted_stream_image(session, url, max_bytes, read_exif, make_thumb, budget, validators=entry)
+            if meta.get("not_modified"):
+                cache.touch(key)
+                session.note_cache("image_revalidated")
+                meta = entry
+    if meta is entry and entry is not None:
+        meta = {**entry, "note": "", "bytes": 0}
+        if not read_exif and not make_thumb:
+            meta.update(width=None, height=None, artist="")
+        if not make_thumb:
+            meta["thumb"] = None
+        if meta["size"] is not None and meta["size"] > max_bytes:
+            meta.update(width=None, height=None, artist="", thumb=None, note="Skipped (exceeds per-image size cap)")
+        return meta
+
+    if meta is None:
+        meta = budgeted_stream_image(session, url, max_bytes, read_exif, make_thumb, budget)
+    session.note_cache("image_miss")
+    if meta["type"] and not meta["note"]:
+        cache.store(key, meta, need)
+    elif meta["note"] == "Skipped (exceeds per-image size cap)" and meta["size"]:
+        cache.store(key, meta, ImageMetaCache.DETAIL_SIZE)
+    return meta
+
+
+def head_image(session: requests.Session, url: str, max_bytes: int, read_exif: bool, make_thumb: bool,
+               budget: Optional[ByteBudget] = None) -> dict:
+    """The HEAD-then-GET path as a stream_image-style dict: a HEAD for size and type, then
+    image_details (under a `budget` reservation) when EXIF or a thumbnail is wanted."""
+    size, ct = head_size(session, url)
+    meta = {"size": size, "type": ct, "width": None, "height": None, "artist": "", "thumb": None,
+            "note": "", "bytes": 0}
+    if size is not None and size > max_bytes:
+        meta["note"] = "Skipped (exceeds per-image size cap)"
+        return meta
+    ctype = (ct or "").lower()
+    if not (read_exif or make_thumb) or not (ctype.startswith("image/") or file_ext(url) in IMG_EXTS):
+        return meta
+    granted, limit = budget.reserve_read(max_bytes) if budget else (0, max_bytes)
+    try:
+        if limit <= 0 or (size is not None and size > limit):
+            meta["note"] = "Skipped (hit additional download cap this run)"
+            return meta
+        meta["width"], meta["height"], meta["artist"], meta["thumb"], sniffed, meta["bytes"] = image_details(
+            session, url, limit, read_exif, make_thumb
+        )
+        if sniffed and not ctype.startswith("image/"):
+            meta["type"] = sniffed
+        return meta
+    finally:
+        if budget:
+            budget.settle(granted, meta["bytes"])
+
+
+def analyze_image(session: PoliteSession, url: str, max_bytes: int, read_exif: bool, make_thumb: bool,
+                  single_get: bool, cache: Optional[ImageMetaCache], fresh_after: float,
+                  budget: ByteBudget) -> dict:
+    """One image's size, type, dimensions, EXIF Artist and thumbnail; runs on the image worker pool.
+
+    A network error on one image only marks that image; it never reaches the crawl loop's `result()`.
+    """
+    try:
+        if single_get:
+            return cached_stream_image(session, url, max_bytes, read_exif, make_thumb, cache, fresh_after, budget)
+        return head_image(session, url, max_bytes, read_exif, make_thumb, budget)
+    except (requests.RequestException, OSError) as e:
+        return {"size": None, "type": "", "width": None, "height": None, "artist": "", "thumb": None,
+                "note": f"Not analyzed ({type(e).__name__})", "bytes": 0}
+
+
+def url_fingerprint(url: str) -> int:
+    """64-bit fingerprint used instead of full URL strings in the frontier's seen set."""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8", "ignore"), digest_size=8).digest(), "big")
+
+
+class BloomFilter:
+    """Fixed-size seen set for very large crawls (~1% false positives at `capacity` entries)."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01, bits: Optional[bytearray] = None):
+        self.m = max(1024, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.capacity = capacity
+        self.bits = bits if bits is not None else bytearray((self.m + 7) // 8)
+
+    def _positions(self, fp: int):
+        h1, h2 = fp >> 32, (fp & 0xFFFFFFFF) | 1
+        return ((h1 + i * h2) % self.m for i in range(self.k))
+
+    def __contains__(self, fp: int) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(fp))
+
+    def add(self, fp: int):
+        for p in self._positions(fp):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+
+class CrawlFrontier:
+    """Breadth-first crawl frontier with O(1) dequeue, a compact seen set and SQLite spill.
+
+    URLs are queued per depth and always dequeued from the shallowest level. Seen URLs are kept
+    as 64-bit fingerprints, or in a Bloom filter when `bloom_capacity` is set. Once more than
+    `spill_at` URLs are queued in memory, further ones go to a temporary SQLite file and are
+    read back in batches, so RAM stays bounded on very large sites.
+    """
+
+    REFILL_BATCH = 1000
+    WRITE_BATCH = 500
+
+    def __init__(self, spill_at: int = 20000, bloom_capacity: int = 0):
+        self.spill_at = spill_at
+        self._seen = BloomFilter(bloom_capacity) if bloom_capacity else set()
+        self._levels = {}   # depth -> deque of in-memory URLs
+        self._spilled = {}  # depth -> number of URLs waiting on disk
+        self._in_memory = 0
+        self._db = None
+        self._pending = []  # spilled rows not yet written to disk
+        self._lock = threading.Lock()
+
+    # --- seen set ---
+    def seen(self, url: str) -> bool:
+        return url_fingerprint(url) in self._seen
+
+    def add(self, url: str, depth: int) -> bool:
+        """Queue a URL unless it has been seen before. Returns True if it was queued."""
+        fp = url_fingerprint(url)
+        with self._lock:
+            if fp in self._seen:
+                return False
+            self._seen.add(fp)
+            self._push(url, depth)
+        return True
+
+    def mark_seen(self, url: str):
+        with self._lock:
+            self._seen.add(url_fingerprint(url))
+
+    def push_back(self, url: str, depth: int):
+        """Queue a URL at the tail of its level without the seen check (used when replaying a journal)."""
+        with self._lock:
+            self._seen.add(url_fingerprint(url))
+            self._push(url, depth)
+
+    def push_front(self, url: str, depth: int):
+        """Put an already-seen URL back at the head of its level (e.g. a page that was in flight)."""
+        with self._lock:
+            self._levels.setdefault(depth, deque()).appendleft(url)
+            self._in_memory += 1
+
+    # --- queue ---
+    def _push(self, url: str, depth: int):
+        if self._in_memory >= self.spill_at or self._spilled.get(depth):
+            # Keep FIFO order within a level: once a level spills, its tail stays on disk
+            self._pending.append((depth, url))
+            self._spilled[depth] = self._spilled.get(depth, 0) + 1
+            if len(self._pending) >= self.WRITE_BATCH:
+                self._flush()
+        else:
+            self._levels.setdefault(depth, deque()).append(url)
+            self._in_memory += 1
+
+    def _disk(self) -> sqlite3.Connection:
+        if self._db is None:
+            fd, path = tempfile.mkstemp(prefix="audit_frontier_", suffix=".sqlite")
+            os.close(fd)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=OFF")
+            self._db.execute("PRAGMA synchronous=OFF")
+            self._db.execute("CREATE TABLE frontier (id INTEGER PRIMARY KEY, depth INTEGER, url TEXT)")
+            self._db.execute("CREATE INDEX frontier_depth ON frontier (depth, id)")
+            weakref.finalize(self, _drop_sqlite_file, self._db, path)
+        return self._db
+
+    def _flush(self):
+        if self._pending:
+            db = self._disk()
+            with db:
+                db.executemany("INSERT INTO frontier (depth, url) VALUES (?, ?)", self._pending)
+            self._pending = []
+
+    def _refill(self, depth: int):
+        self._flush()
+        rows = self._db.execute(
+            "SELECT id, url FROM frontier WHERE depth = ? ORDER BY id LIMIT ?", (depth, self.REFILL_BATCH)
+        ).fetchall()
+        if rows:
+            with self._db:
+                self._db.execute("DELETE FROM frontier WHERE depth = ? AND id <= ?", (depth, rows[-1][0]))
+        level = self._levels.setdefault(depth, deque())
+        level.extend(u for (_, u) in rows)
+        self._in_memory += len(rows)
+        self._spilled[depth] -= len(rows)
+
+    def _head_level(self) -> Optional[int]:
+        for depth in sorted(set(self._levels) | set(self._spilled)):
+            if self._levels.get(depth):
+                return depth
+            if self._spilled.get(depth):
+                self._refill(depth)
+                return depth
+        return None
+
+    def peek(self):
+        """(url, depth) of the next URL without removing it, or None when empty."""
+        with self._lock:
+            depth = self._head_level()
+            return None if depth is None else (self._levels[depth][0], depth)
+
+    def pop(self):
+        """Remove and return the next (url, depth), shallowest level first; None when empty."""
+        with self._lock:
+            depth = self._head_level()
+            if depth is None:
+                return None
+            self._in_memory -= 1
+            return self._levels[depth].popleft(), depth
+
+    def __len__(self) -> int:
+        return self._in_memory + sum(self._spilled.values())
+
+    # --- (de)serialization for checkpoints ---
+    def queued(self):
+        """Yield (url, depth) for every queued URL in dequeue order (memory first, then disk)."""
+        with self._lock:
+            self._flush()
+            depths = sorted(set(self._levels) | set(self._spilled))
+            for depth in depths:
+                for u in list(self._levels.get(depth, ())):
+                    yield u, depth
+                if self._spilled.get(depth):
+                    for (u,) in self._db.execute("SELECT url FROM frontier WHERE depth = ? ORDER BY id", (depth,)):
+                        yield u, depth
+
+    def to_state(self) -> dict:
+        queue, depth = [], {}
+        for u, d in self.queued():
+            queue.append(u)
+            depth[u] = d
+        if isinstance(self._seen, BloomFilter):
+            seen = {"bloom": base64.b64encode(bytes(self._seen.bits)).decode("ascii"), "capacity": self._seen.capacity}
+        else:
+            seen = [format(fp, "016x") for fp in self._seen]
+        return {"queue": queue, "depth": depth, "seen": seen}
+
+    @classmethod
+    def from_state(cls, state: dict, spill_at: int = 20000, bloom_capacity: int = 0) -> "CrawlFrontier":
+        """Rebuild from a checkpoint; also accepts the older visited_pages/queue/depth format."""
+        seen = state.get("seen")
+        if isinstance(seen, dict) and seen.get("bloom"):
+            bloom_capacity = int(seen.get("capacity") or bloom_capacity or 1)
+        f = cls(spill_at=spill_at, bloom_capacity=bloom_capacity)
+        if isinstance(seen, dict) and seen.get("bloom"):
+            f._seen.bits = bytearray(base64.b64decode(seen["bloom"]))
+        else:
+            for fp in seen or []:
+                f._seen.add(int(fp, 16))
+            # Older checkpoints kept full URL strings
+            for u in list(state.get("visited_pages", [])) + list(state.get("depth", {})):
+                f._seen.add(url_fingerprint(u))
+        depth = state.get("depth", {})
+        for u in state.get("queue", []):
+            f._seen.add(url_fingerprint(u))
+            f._push(u, int(depth.get(u, 0)))
+        return f
+
+
+def _drop_sqlite_file(conn: sqlite3.Connection, path: str):
+    try:
+        conn.close()
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+JOURNAL_DIR = os.path.join(tempfile.gettempdir(), "image_audit_journals")
+JOURNAL_MAX_AGE_S = 14 * 24 * 3600
+
+
+class AssetTable:
+    """Audit results as one record per unique image, with the pages it appears on.
+
+    A record has the usual result columns plus "Pages" (how many pages use the image); "Page" is the
+    first page it was seen on. Page URLs are stored once (`pages`) and each record keeps a compact
+    array of page ids, so memory, checkpoints and exports grow with unique images rather than page
+    views. Repeat sightings merge into the record: source types, risk flags and missing fields
+    (alt text, dimensions, ...) are combined. `per_page_rows` expands back to one row per
+    (page, image) on demand, with each page's own Source Type / Alt Text / Risk Flags: those are
+    kept per page only where they differ from the image's first sighting.
+    """
+
+    OCCURRENCE_FIELDS = ("Page", "Image URL", "Source Type", "Alt Text", "Risk Flags")
+    PER_PAGE_FIELDS = ("Source Type", "Alt Text", "Risk Flags")
+
+    def __init__(self):
+        self.records = []
+        self.pages = []
+        self._page_index = {}   # page url -> id
+        self._page_ids = []     # per record: array of page ids
+        self._by_key = {}       # image_cache_key(url) -> record index
+        self._seen = set()      # (record index << 32) | page id
+        self._first = []        # per record: per-page fields of its first sighting
+        self._occurrences = {}  # (record index << 32) | page id -> per-page fields, where not _first
+        self._pending = []      # rows not yet written to the journal
+
+    def __len__(self):
+        return len(self.records)
+
+    def __bool__(self):
+        return bool(self.records)
+
+    def __contains__(self, image_url: str) -> bool:
+        return image_cache_key(image_url) in self._by_key
+
+    def page_id(self, page_url: str) -> int:
+        pid = self._page_index.get(page_url)
+        if pid is None:
+            pid = self._page_index[page_url] = len(self.pages)
+            self.pages.append(page_url)
+        return pid
+
+    def add(self, row: dict, log: bool = True) -> bool:
+        """Record one sighting of an image on a page; True if the image is new."""
+        key = image_cache_key(row["Image URL"])
+        pid = self.page_id(row.get("Page") or "")
+        i = self._by_key.get(key)
+        if i is None:
+            rec = {"Page": row.get("Page"), "Pages": 1}
+            rec.update((k, v) for k, v in row.items() if k not in ("Page", "Pages"))
+            i = self._by_key[key] = len(self.records)
+            self.records.append(rec)
+            self._page_ids.append(array("I", [pid]))
+            self._seen.add((i << 32) | pid)
+            self._first.append(self._occurrence(row))
+            if log:
+                self._pending.append(row)
+            return True
+
+        rec = self.records[i]
+        slim = {k: row[k] for k in self.OCCURRENCE_FIELDS if k in row}
+        self._note_occurrence(i, pid, self._occurrence(row))
+        for field in ("Source Type", "Risk Flags"):
+            have = [x for x in (rec.get(field) or "").split(", ") if x]
+            extra = [x for x in (row.get(field) or "").split(", ") if x and x not in have]
+            if extra:
+                rec[field] = ", ".join(have + extra)
+        for k, v in row.items():
+            if k not in ("Page", "Pages") and v not in (None, "") and rec.get(k) in (None, ""):
+                rec[k] = slim[k] = v
+        if (i << 32) | pid not in self._seen:
+            self._seen.add((i << 32) | pid)
+            self._page_ids[i].append(pid)
+            rec["Pages"] = len(self._page_ids[i])
+        if log:
+            self._pending.append(slim)
+        return False
+
+    @staticmethod
+    def _combine(a: str, b: str) -> str:
+        return ", ".join(dict.fromkeys(x for x in f"{a}, {b}".split(", ") if x))
+
+    @classmethod
+    def _occurrence(cls, row: dict) -> tuple:
+        return tuple(row.get(k) or "" for k in cls.PER_PAGE_FIELDS)
+
+    def _note_occurrence(self, i: int, pid: int, occ: tuple):
+        slot = (i << 32) | pid
+        if slot in self._seen:
+            # Seen on this page before: combine, as the record does (alt text: first non-empty)
+            have = self.occurrence(i, pid)
+            occ = (self._combine(have[0], occ[0]), have[1] or occ[1], self._combine(have[2], occ[2]))
+        if occ == self._first[i]:
+            self._occurrences.pop(slot, None)
+        else:
+            self._occurrences[slot] = occ
+
+    def occurrence(self, i: int, pid: int) -> tuple:
+        """(Source Type, Alt Text, Risk Flags) of record `i` on page `pid`."""
+        return self._occurrences.get((i << 32) | pid, self._first[i])
+
+    def take_pending(self) -> list:
+        pending, self._pending = self._pending, []
+        return pending
+
+    def load_record(self, rec: dict, page_urls: list, first: Optional[list] = None,
+                    occurrences: Optional[list] = None):
+        """Restore a record from a checkpoint snapshot (see `snapshot_occurrences`)."""
+        i = len(self.records)
+        self._by_key[image_cache_key(rec["Image URL"])] = i
+        ids = array("I", (self.page_id(u) for u in page_urls))
+        self._seen.update((i << 32) | pid for pid in ids)
+        self.records.append(dict(rec, Pages=len(ids)))
+        self._page_ids.append(ids)
+        # Older snapshots only have the merged record
+        self._first.append(tuple(first) if first else self._occurrence(rec))
+        for n, occ in occurrences or []:
+            self._occurrences[(i << 32) | ids[n]] = tuple(occ)
+
+    def snapshot_occurrences(self, i: int):
+        """Record `i`'s first-sighting fields and its differing pages as [index into its pages, fields]."""
+        ids = self._page_ids[i]
+        return list(self._first[i]), [[n, list(self._occurrences[(i << 32) | pid])]
+                                      for n, pid in enumerate(ids) if (i << 32) | pid in self._occurrences]
+
+    def pages_of(self, i: int) -> list:
+        return [self.pages[pid] for pid in self._page_ids[i]]
+
+    def per_page_rows(self):
+        for i, rec in enumerate(self.records):
+            for pid in self._page_ids[i]:
+                yield {**rec, "Page": self.pages[pid], **dict(zip(self.PER_PAGE_FIELDS, self.occurrence(i, pid)))}
+
+    def rows_by_page(self) -> dict:
+        out = {}
+        for row in self.per_page_rows():
+            out.setdefault(row["Page"], []).append(row)
+        return out
+
+    @classmethod
+    def from_rows(cls, rows) -> "AssetTable":
+        """Build a table from per-page rows (older checkpoints / exports) or asset records."""
+        table = cls()
+        for r in rows or []:
+            if r.get("Image URL"):
+                table.add(r, log=False)
+        return table
+
+
+class CrawlJournal:
+    """Append-only JSONL checkpoint of a crawl.
+
+    Each page appends only what changed: newly queued URLs ("add"), the finished page ("done"),
+    image sightings ("row": a full record for a new image, just the page/occurrence fields for a
+    repeat) and the counters ("stats"), so saving costs O(delta). Once the log has grown past the
+    size of the live state it is compacted into a snapshot (seen set, queue, page list, one "asset"
+    record per image, counters). `replay_journal` rebuilds a resumable state from either form.
+    """
+
+    COMPACT_MIN_RECORDS = 50_000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._records = 0        # records appended since the last compaction
+        self._snapshot_size = 0  # records in the last compacted snapshot
+        self._fh = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def create(cls, start_url: str) -> "CrawlJournal":
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        prune_old_journals()
+        fd, path = tempfile.mkstemp(prefix="journal_", suffix=".jsonl", dir=JOURNAL_DIR)
+        os.close(fd)
+        journal = cls(path)
+        journal._write({"t": "start", "start_url": start_url})
+        return journal
+
+    def _write(self, rec: dict):
+        self._fh.write(json.dumps(rec, separators=(",", ":")) + "\n")
+        self._records += 1
+
+    def enqueue(self, url: str, depth: int):
+        self._write({"t": "add", "u": url, "d": depth})
+
+    def done(self, url: str):
+        self._write({"t": "done", "u": url})
+
+    def page(self, url: str, fingerprint: str):
+        """Content fingerprint of a processed page (baseline for incremental re-audits)."""
+        self._write({"t": "page", "u": url, "h": fingerprint})
+
+    def stylesheet(self, url: str, images: list, imports: list):
+        """A parsed stylesheet, so later pages (and resumed crawls) link to it without a refetch."""
+        self._write({"t": "css", "u": url, "i": images, "m": imports})
+
+    def commit(self, assets: AssetTable, counters: dict):
+        """Append image sightings since the last commit plus the current counters, then flush."""
+        for r in assets.take_pending():
+            self._write({"t": "row", "r": r})
+        self._write({"t": "stats", **counters})
+        self._fh.flush()
+
+    def note_settings(self, settings: dict):
+        """Record the sidebar settings for reference (ignored on replay)."""
+        self._write({"t": "settings", "settings": settings})
+        self._fh.flush()
+
+    def needs_compaction(self) -> bool:
+        return self._records > max(self.COMPACT_MIN_RECORDS, self._snapshot_size)
+
+    def compact(self, start_url: str, frontier: "CrawlFrontier", in_flight: list, assets: AssetTable, counters: dict,
+                page_prints: Optional[dict] = None, stylesheets: Optional[dict] = None):
+        """Rewrite the log as a snapshot of the live state (atomic replace)."""
+        fstate = frontier.to_state()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            def put(rec):
+                fh.write(json.dumps(rec, separators=(",", ":")) + "\n")
+            put({"t": "start", "start_url": start_url})
+            put({"t": "seen", "seen": fstate["seen"]})
+            for (u, d) in in_flight:
+                put({"t": "add", "u": u, "d": d})
+            for u in fstate["queue"]:
+                put({"t": "add", "u": u, "d": fstate["depth"][u]})
+            for u, h in (page_prints or {}).items():
+                put({"t": "page", "u": u, "h": h})
+            for u, (images, imports) in (stylesheets or {}).items():
+                put({"t": "css", "u": u, "i": images, "m": imports})
+            put({"t": "pages", "u": assets.pages})
+            for i, rec in enumerate(assets.records):
+                first, occurrences = assets.snapshot_occurrences(i)
+                put({"t": "asset", "r": rec, "p": list(assets._page_ids[i]), "f": first, "o": occurrences})
+            put({"t": "stats", **counters})
+        self._fh.close()
+        os.replace(tmp, self.path)
+        self._fh = open(self.path, "a", encoding="utf-8")
+        assets.take_pending()
+        self._snapshot_size = (4 + len(in_flight) + len(fstate["queue"]) + len(page_prints or {})
+                               + len(stylesheets or {}) + len(assets))
+        self._records = 0
+
+    def read_bytes(self) -> bytes:
+        self._fh.flush()
+        with open(self.path, "rb") as fh:
+            return fh.read()
+
+    def close(self):
+        self._fh.close()
+
+    def discard(self):
+        try:
+            self._fh.close()
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def replay_journal(path: str, bloom_capacity: int = 0) -> dict:
+    """Rebuild a crawl state (frontier, assets, counters, page fingerprints, stylesheets) from a journal file."""
+    state = {"start_url": None, "assets": AssetTable(), "pages_processed": 0, "images_found": 0,
+             "total_bytes_downloaded": 0, "css_queue": [], "page_prints": {}, "stylesheets": {}}
+    snapshot_pages = []
+    frontier = CrawlFrontier(bloom_capacity=bloom_capacity)
+    queued = {}  # url -> depth; insertion order is dequeue order
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line after an interrupted write
+            t = rec.get("t")
+            if t == "add":
+                queued.setdefault(rec["u"], int(rec.get("d", 0)))
+            elif t == "done":
+                queued.pop(rec["u"], None)
+                frontier.mark_seen(rec["u"])
+            elif t == "row":
+                state["assets"].add(rec["r"], log=False)
+            elif t == "pages":
+                snapshot_pages = rec["u"]
+            elif t == "asset":
+                state["assets"].load_record(rec["r"], [snapshot_pages[pid] for pid in rec["p"]],
+                                            rec.get("f"), rec.get("o"))
+            elif t == "page":
+                state["page_prints"][rec["u"]] = rec["h"]
+            elif t == "css":
+                state["stylesheets"][rec["u"]] = (rec.get("i", []), rec.get("m", []))
+            elif t == "stats":
+                for k in ("pages_processed", "images_found", "total_bytes_downloaded", "css_queue"):
+                    if k in rec:
+                        state[k] = rec[k]
+            elif t == "seen":
+                frontier = CrawlFrontier.from_state({"seen": rec["seen"]}, bloom_capacity=bloom_capacity)
+            elif t == "start":
+                state["start_url"] = rec.get("start_url")
+    for u, d in queued.items():
+        frontier.push_back(u, d)
+    state["frontier"] = frontier
+    state["in_flight"] = []
+    return state
+
+
+def prune_old_journals():
+    cutoff = time.time() - JOURNAL_MAX_AGE_S
+    try:
+        for name in os.listdir(JOURNAL_DIR):
+            p = os.path.join(JOURNAL_DIR, name)
+            if os.path.getmtime(p) < cutoff:
+                os.remove(p)
+    except OSError:
+        pass
+
+
+def page_fingerprint(body: bytes) -> str:
+    return hashlib.sha1(body or b"").hexdigest()[:16]
+
+
+def load_reaudit_baseline(upload) -> dict:
+    """Image records (indexed by page) and page fingerprints from a previous checkpoint or CSV export."""
+    if upload.name.lower().endswith(".jsonl"):
+        fd, path = tempfile.mkstemp(suffix=".jsonl")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(upload.getvalue())
+            prev = replay_journal(path)
+        finally:
+            os.remove(path)
+        prev_assets, prints = prev["assets"], prev["page_prints"]
+    else:
+        import pandas as pd
+        df_prev = pd.read_csv(BytesIO(upload.getvalue()))
+        prev_assets = AssetTable.from_rows(df_prev.astype(object).where(df_prev.notna(), None).to_dict("records"))
+        prints = {}
+    page_assets = {}  # page url -> indexes of the records seen on it
+    for i in range(len(prev_assets)):
+        for page in prev_assets.pages_of(i):
+            page_assets.setdefault(page, []).append(i)
+    return {"name": upload.name, "size": upload.size, "assets": prev_assets, "page_assets": page_assets,
+            "prints": prints}
+
+
+def reaudit_result(baseline: dict, state: Optional[dict], finished: bool) -> dict:
+    """What the results page shows of a re-audit, the baseline's name and the delta (see audit_delta),
+    so the baseline itself can be let go when the audit ends."""
+    assets = (state or {}).get("assets")
+    crawled = (state or {}).get("page_prints") or {}
+    delta = audit_delta(baseline["assets"], assets, crawled.keys(), finished) if assets is not None else []
+    return {"name": baseline["name"], "delta": delta}
+
+
+def baseline_rows_for_page(baseline: dict, page_url: str) -> list:
+    assets, indexes = baseline["assets"], baseline["page_assets"].get(page_url, [])
+    pid = assets.page_id(page_url) if indexes else None
+    return [{**assets.records[i], "Page": page_url, **dict(zip(AssetTable.PER_PAGE_FIELDS, assets.occurrence(i, pid)))}
+            for i in indexes]
+
+
+DELTA_FIELDS = ("Content-Type", "Estimated Bytes", "Width", "Height", "EXIF Artist", "Alt Text", "Risk Flags")
+
+
+def audit_delta(old: AssetTable, new: AssetTable, crawled_pages, finished: bool) -> list:
+    """Added / removed / changed images between two audits, keyed by image URL.
+
+    An image missing from this crawl only counts as removed if one of its pages was crawled, or the
+    crawl finished.
+    """
+    def same(a, b):
+        if a in (None, "") and b in (None, ""):
+            return True
+        try:
+            return float(a) == float(b)
+        except (TypeError, ValueError):
+            return str(a) == str(b)
+
+    old_index = {image_cache_key(r["Image URL"]): i for i, r in enumerate(old.records)}
+    new_keys = set()
+    crawled = set(crawled_pages)
+    delta = []
+    for r in new.records:
+        k = image_cache_key(r["Image URL"])
+        new_keys.add(k)
+        i = old_index.get(k)
+        if i is None:
+            delta.append({"Change": "Added", "Changed Fields": "", **r})
+        else:
+            changed = [f for f in DELTA_FIELDS if not same(old.records[i].get(f), r.get(f))]
+            if changed:
+                delta.append({"Change": "Changed", "Changed Fields": ", ".join(changed), **r})
+    for k, i in old_index.items():
+        if k not in new_keys and (finished or any(p in crawled for p in old.pages_of(i))):
+            delta.append({"Change": "Removed", "Changed Fields": "", **old.records[i]})
+    return delta
+
+
+SPILL_DIR = os.path.join(tempfile.gettempdir(), "image_audit_spill")
+SPILL_IDLE_S = int(os.getenv("AUDIT_SPILL_IDLE_S", str(15 * 60)))  # large session state goes to disk after this long unused
+SPILL_RSS_MB = int(os.getenv("AUDIT_SPILL_RSS_MB", "1536"))        # ... or once it has been unused for a minute, above this
+SPILL_MAX_MB = int(os.getenv("AUDIT_SPILL_MAX_MB", "2000"))        # disk quota for spilled state (least recently used is dropped)
+SPILL_SWEEP_S = 60
+
+
+class SpillSlot:
+    """A large per-session value that can move to disk while nobody is using it (see SpillStore).
+
+    Callers keep the slot (in session state or on a CrawlJob) and call `get` whenever they need the value:
+    a spilled value is loaded back on first use. `summary` holds the few fields shown without loading.
+    Once evicted under the disk quota the slot is empty for good (falsy, `get` returns None).
+    """
+
+    def __init__(self, value, summary: Optional[dict] = None):
+        self.summary = summary or {}
+        self.size = 0              # bytes on disk while spilled
+        self.last_used = time.time()
+        self.evicted = False
+        self._value = value
+        self._path = None
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return not self.evicted
+
+    @property
+    def spilled(self) -> bool:
+        return self._value is None and self._path is not None
+
+    def get(self):
+        with self._lock:
+            return self._get()
+
+    def take(self):
+        """Hand the value to a new owner and leave the slot empty for good.
+
+        The sweep skips empty slots, so it can't spill a value the new owner is still using
+        (for a crawl state, compact and close the journal under a running crawl).
+        """
+        with self._lock:
+            value = self._get()
+            self._value, self._path, self.evicted = None, None, True
+            return value
+
+    def _get(self):
+        self.last_used = time.time()
+        if self._value is None and self._path and not self.evicted:
+            try:
+                self._value = self._load(self._path)
+            except (OSError, ValueError):
+                self.evicted = True  # its file was pruned meanwhile
+        return self._value
+
+    def spill(self):
+        """Write the value to disk and let go of it (no-op if it can't be spilled)."""
+        with self._lock:
+            if self._value is None:
+                return
+            path = self._dump(self._value)
+            if path:
+                self._path, self._value = path, None
+                self.size = os.path.getsize(path)
+
+    def evict(self):
+        """Drop the spilled copy under the disk quota."""
+        with self._lock:
+            if self.spilled:
+                self._remove(self._path)
+                self.evicted = True
+
+    def _dump(self, value) -> Optional[str]:
+        raise NotImplementedError
+
+    def _load(self, path: str):
+        raise NotImplementedError
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class BytesSlot(SpillSlot):
+    """A download bundle; spills to a file in SPILL_DIR, which goes away with the slot."""
+
+    def _dump(self, value: bytes) -> str:
+        if self._path is None:
+            os.makedirs(SPILL_DIR, exist_ok=True)
+            fd, self._path = tempfile.mkstemp(prefix="bundle_", suffix=".bin", dir=SPILL_DIR)
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(value)
+            weakref.finalize(self, self._remove, self._path)
+        return self._path  # the file is kept after a reload, so spilling again costs nothing
+
+    def _load(self, path: str) -> bytes:
+        with open(path, "rb") as fh:
+            return fh.read()
+
+
+class CrawlStateSlot(SpillSlot):
+    """A resumable crawl state. It spills through its own journal: compacted, closed, and replayed on
+    reload. States without a journal (older JSON checkpoints) stay in memory."""
+
+    def __init__(self, state: dict):
+        super().__init__(state, self._summarize(state))
+
+    @staticmethod
+    def _summarize(state: dict) -> dict:
+        return {k: state.get(k) for k in ("start_url", "pages_processed", "images_found")}
+
+    def _dump(self, state: dict) -> Optional[str]:
+        journal = state.get("journal")
+        if journal is None:
+            return None
+        self.summary = self._summarize(state)
+        counters = {k: state.get(k, 0) for k in ("pages_processed", "images_found", "total_bytes_downloaded")}
+        counters["css_queue"] = state.get("css_queue", [])
+        journal.compact(state["start_url"], state["frontier"], state.get("in_flight", []), state["assets"],
+                        counters, state.get("page_prints"), state.get("stylesheets"))
+        journal.close()
+        return journal.path
+
+    def _load(self, path: str) -> dict:
+        state = replay_journal(path)
+        state["journal"] = CrawlJournal(path)
+        return state
+
+    def discard(self):
+        """Forget the state and delete its journal (the Reset / Discard buttons)."""
+        with self._lock:
+            journal = (self._value or {}).get("journal")
+            if journal is not None:
+                journal.discard()
+            elif self._path:
+                self._remove(self._path)
+            self._value, self.evicted = None, True
+
+
+class SpillStore:
+    """Moves large session values (SpillSlot) to disk so memory follows active users, not open tabs.
+
+    Shared by every session (see get_spill_store). A background sweep spills slots unused for
+    `idle_s`, or for a minute while the process is above `max_rss_mb`, and then drops the least
+    recently used spilled slots once they take more than `max_bytes` on disk.
+    """
+
+    MIN_IDLE_S = 60
+
+    def __init__(self, idle_s: int = SPILL_IDLE_S, max_rss_mb: int = SPILL_RSS_MB,
+                 max_bytes: int = SPILL_MAX_MB * 1024 * 1024):
+        self.idle_s = idle_s
+        self.max_rss_mb = max_rss_mb
+        self.max_bytes = max_bytes
+        self._slots = weakref.WeakSet()  # a slot its session (or job) dropped is simply forgotten
+        self._lock = threading.Lock()
+        threading.Thread(target=self._sweep_forever, name="spill-sweep", daemon=True).start()
+
+    def track(self, slot: SpillSlot) -> SpillSlot:
+        with self._lock:
+            self._slots.add(slot)
+        return slot
+
+    def sweep(self):
+        with self._lock:
+            slots = sorted(self._slots, key=lambda s: s.last_used)
+        now = time.time()
+        pressure = process_rss_bytes() > self.max_rss_mb * 1024 * 1024
+        for slot in slots:
+            idle = now - slot.last_used
+            if not slot.spilled and slot and (idle >= self.idle_s or (pressure and idle >= self.MIN_IDLE_S)):
+                try:
+                    slot.spill()
+                except (OSError, ValueError):
+                    pass  # disk full or the value changed under us; it stays in memory
+                except Exception:
+                    log.exception("Spilling a %s failed; it stays in memory", type(slot).__name__)
+        on_disk = [s for s in slots if s.spilled and s]
+        total = sum(s.size for s in on_disk)
+        for slot in on_disk:
+            if total <= self.max_bytes:
+                break
+            total -= slot.size
+            slot.evict()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(SPILL_SWEEP_S)
+            try:
+                self.sweep()
+            except Exception:
+                log.exception("Spill sweep failed")  # the next one runs anyway
+
+
+@st.cache_resource
+def get_spill_store() -> SpillStore:
+    return SpillStore()
+
+
+JOB_POLL_S = 1.0            # how often the page redraws a running audit's progress
+JOB_KEEP_S = 6 * 3600       # finished audits stay reattachable (and their results viewable) this long
+
+
+class CrawlJob:
+    """A website audit running on its own thread, owned by the JobRegistry rather than a script run.
+
+    Reruns, a browser refresh (the job id is kept in the page URL) or a closed tab don't stop it.
+    The crawl never touches st.*: it publishes a progress snapshot (`report` / `progress`) that the
+    page polls, messages for the results area (`note`), and its resumable state (`state`) after each
+    batch. `cancel` is cooperative: the crawl stops at the next batch, puts unfinished pages back
+    in the queue and keeps everything merged so far.
+    """
+
+    def __init__(self, start_url: str, settings: dict, options: dict, prev_state: Optional[dict],
+                 reaudit: Optional[dict], rp, session: PoliteSession, image_cache, parse_pool):
+        self.id = secrets.token_urlsafe(9)
+        self.start_url = start_url
+        self.settings = settings                # recorded in the checkpoint
+        self.opts = {**settings, **options}
+        self.prev_state = prev_state            # state to resume from (same start URL) or to discard
+        self.reaudit = reaudit                  # the parsed baseline; just its delta once the job ends
+        self.rp, self.session = rp, session
+        session.owner = self.id                 # its requests share the server's connections fairly
+        self.image_cache, self.parse_pool = image_cache, parse_pool
+        self.state = None                       # resumable state, replaced after each batch; a slot once it ends
+        self.notes = []                         # (kind, text) for the results area
+        self.finished = False
+        self.unchanged_pages = 0
+        self.error = None
+        self.started_at = time.time()
+        self.admitted_at = None                 # set when the registry lets it crawl (see JobRegistry)
+        self.ended_at = None
+        self._registry = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._progress = {"fraction": 0.0, "text": "Starting…"}
+        self._thread = threading.Thread(target=self._run, name=f"crawl-{self.id}", daemon=True)
+
+    @property
+    def running(self) -> bool:
+        return self.ended_at is None
+
+    def start(self):
+        self.admitted_at = time.time()
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+        if self._registry and self.admitted_at is None:
+            self._registry.admit()  # drops it from the queue
+
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def report(self, **fields):
+        with self._lock:
+            self._progress.update(fields)
+
+    def progress(self) -> dict:
+        with self._lock:
+            return dict(self._progress)
+
+    def note(self, kind: str, text: str):
+        with self._lock:
+            self.notes.append((kind, text))
+
+    def _run(self):
+        try:
+            run_crawl(self)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.end()
+            if self._registry:
+                self._registry.admit()
+
+    def end(self, state: Optional[dict] = None):
+        """Mark the job ended; its final state becomes a SpillSlot that can leave memory while unused.
+
+        A job that fails before its first checkpoint keeps the state it was resuming from.
+        """
+        state = state or self.state or self.prev_state
+        if self.reaudit and "assets" in self.reaudit:
+            self.reaudit = reaudit_result(self.reaudit, state, self.finished)  # drops the baseline
+        spill = self._registry.spill if self._registry else None
+        self.state = spill.track(CrawlStateSlot(state)) if state and spill else state
+        self.prev_state = None  # now held by `state`; it must not pin the objects a second time
+        self.ended_at = time.time()
+
+
+class JobRegistry:
+    """Crawl jobs by id, shared by every session of this server (see get_job_registry).
+
+    At most `max_running` audits crawl at once, and a queued one only starts while the server's
+    memory is under `max_rss_mb` (or nothing else is running). The rest wait in arrival order; a
+    session runs one audit at a time, so the queue is first come, first served between users.
+    Finished jobs are dropped JOB_KEEP_S after they end.
+    """
+
+    def __init__(self, max_running: int = GOV_MAX_JOBS, max_rss_mb: int = GOV_MAX_RSS_MB,
+                 spill: Optional[SpillStore] = None):
+        self.max_running = max_running
+        self.max_rss_mb = max_rss_mb
+        self.spill = spill                      # where finished jobs' states go (see CrawlJob.end)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._queue = deque()
+
+    def start(self, job: CrawlJob):
+        """Start `job` now if there is room, or queue it."""
+        job._registry = self
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            self._queue.append(job)
+        self.admit()
+
+    def admit(self):
+        """Start queued jobs while there is room; called when a job is added, ends or is cancelled."""
+        with self._lock:
+            admitted = []
+            for job in [j for j in self._queue if j.cancelled()]:
+                # Stopped before it started: nothing crawled, the previous state stays resumable
+                self._queue.remove(job)
+                job.end(job.prev_state)
+            running = sum(1 for j in self._jobs.values() if j.admitted_at and j.running)
+            while self._queue and running < self.max_running and (
+                    not running or process_rss_bytes() < self.max_rss_mb * 1024 * 1024):
+                admitted.append(self._queue.popleft())
+                running += 1
+            for ahead, job in enumerate(self._queue):
+                job.report(text=f"Waiting for a free slot on the server ({ahead} audit(s) ahead)…")
+        for job in admitted:
+            job.start()
+
+    def get(self, job_id: Optional[str]) -> Optional[CrawlJob]:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id) if job_id else None
+
+    def jobs(self) -> list:
+        """Every known job, oldest first (for the server usage view)."""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.started_at)
+
+    def _prune(self):
+        cutoff = time.time() - JOB_KEEP_S
+        for job_id in [i for i, j in self._jobs.items() if j.ended_at and j.ended_at < cutoff]:
+            del self._jobs[job_id]
+
+
+@st.cache_resource
+def get_job_registry() -> JobRegistry:
+    return JobRegistry(spill=get_spill_store())
+
+
+@st.fragment(run_every=JOB_POLL_S)
+def crawl_progress(job: CrawlJob):
+    """A running audit's progress, redrawn every JOB_POLL_S without rerunning the rest of the page."""
+    if not job.running:
+        st.rerun()  # the whole page, to show the results
+    snap = job.progress()
+    st.progress(snap["fraction"])
+    st.write("Stopping after the current batch…" if job.cancelled() else snap["text"])
+    if st.button("Stop audit", key="stop_crawl_job", disabled=job.cancelled()):
+        job.cancel()
+
+
+def job_status(job: CrawlJob) -> str:
+    if job.admitted_at is None:
+        return "Stopped" if job.cancelled() else "Queued"
+    if job.running:
+        return "Stopping" if job.cancelled() else "Running"
+    if job.error:
+        return "Error"
+    return "Finished" if job.finished else "Stopped"
+
+
+def show_server_usage(target, registry: JobRegistry, governor: ResourceGovernor):
+    """Connections, buffers, memory and audits of the whole server (every session), for whoever runs it.
+
+    Everyone sees the totals; which sites are being audited, and how far, is shown only after the
+    ADMIN_PASSCODE has been entered in this session.
+    """
+    usage = governor.usage()
+    jobs = registry.jobs()
+    with target.expander("🖥️ Server usage", expanded=False):
+        rss = process_rss_bytes()
+        statuses = Counter(job_status(job) for job in jobs)
+        st.caption(
+            f"Connections: {usage['connections']} / {governor.max_connections} in use, {usage['waiting']} waiting · "
+            f"Image buffers: {usage['buffered'] / 1024 / 1024:.1f} / {governor.max_buffer / 1024 / 1024:.0f} MB · "
+            f"Memory: {rss / 1024 / 1024:,.0f} / {registry.max_rss_mb:,} MB · "
+            f"Audits: {statuses['Running'] + statuses['Stopping']} running, {statuses['Queued']} queued"
+        )
+        if not ADMIN_PASSCODE:
+            return
+        if not st.session_state.get("_admin", False):
+            code = st.text_input("Admin passcode", type="password", key="admin_passcode")
+            if code and code.strip() == str(ADMIN_PASSCODE).strip():
+                st.session_state["_admin"] = True
+            elif code:
+                st.error("Invalid admin passcode.")
+            if not st.session_state.get("_admin", False):
+                return
+        if usage["by_host"]:
+            st.caption("Busiest hosts: " + ", ".join(
+                f"{h} ({n}/{governor.max_per_host})"
+                for h, n in sorted(usage["by_host"].items(), key=lambda kv: -kv[1])[:5]
+            ))
+        now = time.time()
+        rows = []
+        for job in jobs:
+            state = getattr(job.state, "summary", job.state) or {}  # a finished job's slot isn't loaded
+            rows.append({
+                "Job": job.id[:6],
+                "Site": urlparse(job.start_url).netloc,
+                "Status": job_status(job),
+                "Pages": state.get("pages_processed", 0),
+                "Images": state.get("images_found", 0),
+                "Connections": usage["by_owner"].get(job.id, 0),
+                "Requests": usage["requests"].get(job.id, 0),
+                "Minutes": round(((job.ended_at or now) - (job.admitted_at or now)) / 60, 1),
+            })
+        if rows:
+            st.table(rows)
+        else:
+            st.caption("No audits on this server yet.")
+
+
+def run_crawl(job: CrawlJob):
+    """The website crawl behind a CrawlJob; runs on the job's thread and never touches st.*."""
+    o = job.opts
+    start_url, session, rp, image_cache, parse_pool = job.start_url, job.session, job.rp, job.image_cache, job.parse_pool
+    canon, respect_robots, user_agent = o["canon"], o["respect_robots"], o["user_agent"]
+    include_subdomains, depth_max, seed_sitemaps = o["include_subdomains"], o["depth_max"], o["seed_sitemaps"]
+    max_pages, max_images, per_page_img_cap = o["max_pages"], o["max_images"], o["per_page_img_cap"]
+    per_image_size_mb, total_bytes_cap_mb, max_html_mb = o["per_image_size_mb"], o["total_bytes_cap_mb"], o["max_html_mb"]
+    concurrency, single_get, parse_css_backgrounds = o["concurrency"], o["single_get"], o["parse_css_backgrounds"]
+    try_exif, show_thumbs, compact_visited = o["try_exif"], o["show_thumbs"], o["compact_visited"]
+    flag_large, large_px, large_mb = o["flag_large"], o["large_px"], o["large_mb"]
+    flag_suspicious, flag_offdomain = o["flag_suspicious"], o["flag_offdomain"]
+    flag_brand, brand_terms_raw = o["flag_brand"], o["brand_terms_raw"]
+
+    # Initialize or resume state
+    bloom_capacity = 2_000_000 if compact_visited else 0
+    fresh_start = False
+    if job.prev_state and job.prev_state.get("start_url") == start_url:
+        state = job.prev_state
+        frontier = state.get("frontier")
+        if frontier is None:
+            frontier = CrawlFrontier.from_state(state, bloom_capacity=bloom_capacity)
+        for (u, d) in reversed(state.get("in_flight", [])):
+            frontier.push_front(u, d)
+        journal = state.get("journal")
+        pages_processed = int(state.get("pages_processed", 0))
+        images_found = int(state.get("images_found", 0))
+        total_bytes_downloaded = int(state.get("total_bytes_downloaded", 0))
+        assets = state.get("assets")
+        if assets is None:
+            # Older checkpoints hold one row per (page, image)
+            assets = AssetTable.from_rows(state.get("rows", []))
+        images_found = len(assets)
+        css_queue = list(state.get("css_queue", []))
+        page_prints = dict(state.get("page_prints", {}))
+        stylesheets = dict(state.get("stylesheets", {}))
+        baseline_pages = pages_processed
+        baseline_images = images_found
+        if journal is None:
+            # Resuming an older JSON checkpoint: start a journal from a snapshot of it
+            journal = CrawlJournal.create(start_url)
+            journal.compact(start_url, frontier, [], assets, {
+                "pages_processed": pages_processed,
+                "images_found": images_found,
+                "total_bytes_downloaded": total_bytes_downloaded,
+                "css_queue": css_queue,
+            }, page_prints, stylesheets)
+    else:
+        old_journal = (job.prev_state or {}).get("journal")
+        if old_journal is not None:
+            old_journal.discard()
+        job.prev_state = None  # a different site: nothing left to fall back to (see CrawlJob.end)
+        journal = CrawlJournal.create(start_url)
+        fresh_start = True
+        frontier = CrawlFrontier(bloom_capacity=bloom_capacity)
+        frontier.add(canonicalize_url(start_url, canon), 0)
+        journal.enqueue(canonicalize_url(start_url, canon), 0)
+        pages_processed = 0
+        images_found = 0
+        total_bytes_downloaded = 0
+        assets = AssetTable()
+        css_queue = []
+        page_prints = {}  # url -> content fingerprint of each processed page
+        stylesheets = {}  # css url -> (image urls, @import urls) of each stylesheet parsed so far
+        baseline_pages = 0
+        baseline_images = 0
+
+    run_started = time.time()
+
+    # Hotlink baseline + brand terms
+    root_regdomain = registered_domain(start_url)
+    brand_terms = [t.strip().lower() for t in (brand_terms_raw or "").split(",") if t.strip()]
+
+    if fresh_start and seed_sitemaps:
+        # Sitemap pages go in at depth 1, as if linked from the start page
+        seeded = 0
+        job.report(text="Reading sitemaps…")
+        for u in iter_sitemap_urls(session, discover_sitemaps(rp, start_url)):
+            if job.cancelled():
+                break
+            u = canonicalize_url(u, canon)
+            if not looks_like_file(u) and same_scope(u, start_url, include_subdomains) and frontier.add(u, 1):
+                journal.enqueue(u, 1)
+                seeded += 1
+        if seeded:
+            job.note("caption", f"Sitemap: seeded {seeded} pages into the crawl queue.")
+
+    reaudit = job.reaudit
+    unchanged_pages = 0
+
+    def added_pages() -> int:
+        return max(0, pages_processed - baseline_pages)
+    def added_images() -> int:
+        return max(0, images_found - baseline_images)
+
+    # The crawl runs as a pipeline of long-lived pools joined by bounded queues:
+    #   page pool (fetch + extract)  ->  pending_pages  ->  image pool (download + analyze)
+    #   stylesheet pool (CSS fetch)  ->  pending_css    ->  image pool
+    # This (script) thread only moves work between stages and merges finished pages and stylesheets
+    # in the order they entered their queue. New page fetches stop while either queue is full, so
+    # memory stays flat however far the network runs ahead of analysis.
+    page_pool = ThreadPoolExecutor(max_workers=concurrency)
+    in_flight = {}  # future -> (url, depth)
+    pending_pages = deque()  # extracted pages waiting on their images
+    pending_css = deque()    # stylesheets waiting on their fetch or their images
+    css_entries = {}         # css url -> its pending_css entry
+    pending_limit = 2 * concurrency
+
+    # Image fetch/decode runs on its own pool. EXIF/thumbnail reads are reserved against this run's
+    # download cap before they start, so parallel reads never overshoot it.
+    image_pool = ThreadPoolExecutor(max_workers=concurrency)
+    byte_budget = ByteBudget(total_bytes_cap_mb * 1024 * 1024, shared=session.governor)
+    css_pool = ThreadPoolExecutor(max_workers=min(concurrency, 4))
+    halt = False
+
+    def submit_image(u: str):
+        return image_pool.submit(
+            analyze_image, session, u, per_image_size_mb * 1024 * 1024, try_exif, show_thumbs,
+            single_get, image_cache, run_started, byte_budget,
+        )
+
+    def link_stylesheet(page_url: str, css_url: str):
+        # A stylesheet (and each one it @imports) is fetched once per crawl. A page linking one that
+        # is already parsed gets its images attributed straight away; one still pending records the page.
+        todo, walked = [css_url], set()
+        while todo:
+            c = todo.pop()
+            if c in walked:
+                continue
+            walked.add(c)
+            if c in stylesheets:
+                images, imports = stylesheets[c]
+                for u in images:
+                    if u in assets:
+                        assets.add({"Page": page_url, "Image URL": u, "Source Type": "CSS Background"})
+                todo.extend(imports)
+            elif c in css_entries:
+                css_entries[c]["pages"][page_url] = None
+                todo.extend(css_entries[c]["imports"] or [])
+            else:
+                # Filter CSS files by robots.txt when enabled
+                if respect_robots and rp:
+                    try:
+                        if not rp.can_fetch(user_agent, c):
+                            continue
+                    except Exception:
+                        continue  # If robotparser errors, skip this CSS when respecting robots
+                css_entries[c] = {"css": c, "pages": {page_url: None}, "imports": None, "images": None,
+                                  "fetch": css_pool.submit(polite_get, session, c)}
+                pending_css.append(css_entries[c])
+
+    def unfinished_pages() -> list:
+        return list(in_flight.values()) + [(p["url"], p["depth"]) for p in pending_pages]
+
+    if parse_css_backgrounds:
+        for (page_url, css_url) in css_queue:
+            link_stylesheet(page_url, css_url)
+
+    merged = False  # a page or stylesheet was merged since the last journal commit
+    try:
+        while (frontier or in_flight or pending_pages or pending_css) and not halt and not job.cancelled():
+            if added_pages() >= max_pages and not (in_flight or pending_pages or pending_css):
+                job.note("info", "Hit additional page limit for this run. You can raise the limit and resume again.")
+                break
+
+            # Top up in-flight fetches without dispatching more pages than the remaining budget, and
+            # only while the downstream queues have room (backpressure).
+            # The rate-limit token is taken here, so no worker sits idle waiting for one.
+            token_wait = 0.0
+            while (frontier and len(in_flight) < concurrency
+                   and len(in_flight) + len(pending_pages) < pending_limit and len(pending_css) < pending_limit
+                   and added_pages() + len(in_flight) + len(pending_pages) < max_pages):
+                url, d = frontier.peek()
+                if d > depth_max or (respect_robots and rp and not rp.can_fetch(user_agent, url)):
+                    frontier.pop()
+                    journal.done(url)
+                    continue
+
+                token_wait = session.rate_limiter.try_acquire(host_key(url))
+                if token_wait:
+                    break
+
+                frontier.pop()
+                in_flight[page_pool.submit(
+                    fetch_and_extract, session, url, parse_pool, per_page_img_cap, start_url, include_subdomains, canon,
+                    max_html_mb * 1024 * 1024,
+                )] = (url, d)
+
+            # Wait for a fetch to land or for the oldest page / stylesheet to have its next result
+            waiting = list(in_flight)
+            if pending_pages:
+                waiting += [f for f in pending_pages[0]["futs"].values() if not f.done()]
+            if pending_css:
+                head = pending_css[0]
+                waiting += ([head["fetch"]] if head["images"] is None
+                            else [f for f in head["images"].values() if not f.done()])
+            if waiting:
+                done, _ = wait(waiting, timeout=token_wait or None, return_when=FIRST_COMPLETED)
+            else:
+                # Nothing to wait for: the oldest page / stylesheet (if any) is ready to merge
+                done = set()
+                if token_wait and not (pending_pages or pending_css):
+                    time.sleep(token_wait)
+
+            # ---- Extract stage: pages whose fetch (and parse) finished ----
+            for fut in done:
+                if fut not in in_flight:
+                    continue  # an image or stylesheet; merged below
+                url, d = in_flight.pop(fut)
+
+                resp, extracted = fut.result()
+                if not resp or not (200 <= resp.status_code < 300) or 'text/html' not in resp.headers.get('Content-Type', ''):
+                    journal.done(url)
+                    continue
+
+                fingerprint = page_fingerprint(resp.content)
+                # Incremental re-audit: an unchanged page keeps its previous rows (links are still followed)
+                unchanged = bool(reaudit) and reaudit["prints"].get(url) == fingerprint
+                # One pass over the HTML gives image candidates and in-scope stylesheets/anchors
+                if extracted is None:
+                    extracted = extract_in_scope(resp.url or url, resp.text, None, per_page_img_cap, start_url,
+                                                 include_subdomains, canon)
+                page_imgs = [] if unchanged else extracted.images
+
+                if parse_css_backgrounds and not unchanged:
+                    for css in extracted.stylesheets:
+                        link_stylesheet(url, css)
+
+                for href in extracted.anchors:
+                    if d + 1 <= depth_max and frontier.add(href, d + 1):
+                        journal.enqueue(href, d + 1)
+
+                # Every image on the page is fetched and analyzed in parallel on the image pool
+                pending_pages.append({
+                    "url": url, "depth": d, "print": fingerprint, "unchanged": unchanged, "images": page_imgs,
+                    "futs": {u: submit_image(u) for u in dict.fromkeys(u for (u, _, _) in page_imgs)},
+                })
+
+            # ---- Merge stage: finished pages, in the order they were fetched ----
+            while pending_pages and not halt and all(f.done() for f in pending_pages[0]["futs"].values()):
+                page = pending_pages.popleft()
+                url, page_imgs, unchanged = page["url"], page["images"], page["unchanged"]
+                journal.done(url)
+                page_prints[url] = page["print"]
+                journal.page(url, page_prints[url])
+
+                metas = {}
+                for u, fut in page["futs"].items():
+                    metas[u] = fut.result()
+                    total_bytes_downloaded += metas[u]["bytes"]
+
+                for (u, stype, alt) in page_imgs:
+                    if added_images() >= max_images or job.cancelled():
+                        break
+
+                    dom = domain_of(u)
+                    source_guess = guessed_source(u)
+                    g_link, t_link = reverse_links(u)
+
+                    meta = metas[u]
+                    est_bytes, content_type_img = meta["size"], meta["type"]
+                    width, height, exif_author, thumb_data = meta["width"], meta["height"], meta["artist"], meta["thumb"]
+                    note = meta["note"]
+
+                    # ---- Risk flags ----
+                    risk = []
+                    if dom in STOCK_DOMAINS:
+                        risk.append("Stock source — ensure license")
+                    if not alt:
+                        risk.append("No alt text (check provenance)")
+                    if flag_large and (est_bytes is not None) and est_bytes >= int(large_mb) * 1024 * 1024:
+                        risk.append(f"Very large file (≥ {int(large_mb)} MB)")
+                    if flag_large and width and height and (width >= int(large_px) or height >= int(large_px)):
+                        risk.append(f"Very large dimensions ({width}×{height} px)")
+                    if flag_suspicious:
+                        try:
+                            pth = urlparse(u).path.lower()
+                        except Exception:
+                            pth = ""
+                        if pth and STOCK_ID_RE.search(pth):
+                            risk.append("Suspicious stock ID in filename")
+                    if flag_offdomain and dom and root_regdomain and dom != root_regdomain:
+                        risk.append("Off-domain asset (hotlink)")
+                    if flag_brand and brand_terms:
+                        hay = (u + " " + (alt or "")).lower()
+                        for term in brand_terms:
+                            if term and term in hay:
+                                risk.append(f"Brand term match: {term}")
+                                break
+
+                    if assets.add({
+                        "Page": url,
+                        "Image URL": u,
+                        "Source Type": stype,
+                        "Alt Text": alt,
+                        "Domain": dom,
+                        "Guessed Source": source_guess,
+                        "Content-Type": content_type_img,
+                        "Estimated Bytes": est_bytes,
+                        "EXIF Artist": exif_author,
+                        "Width": width,
+                        "Height": height,
+                        "Google Images": g_link,
+                        "TinEye": t_link,
+                        "Thumbnail": thumb_data,
+                        "Notes": note,
+                        "Risk Flags": ", ".join(risk)
+                    }):
+                        images_found += 1
+
+                if unchanged:
+                    for r in baseline_rows_for_page(reaudit, url):
+                        if added_images() >= max_images:
+                            break
+                        if assets.add(r):
+                            images_found += 1
+                    unchanged_pages += 1
+
+                pages_processed += 1
+                merged = True
+                job.report(
+                    fraction=min(1.0, added_pages() / max(1, max_pages)),
+                    text=f"Total pages {pages_processed} (+{added_pages()} this run), "
+                    f"images {images_found} (+{added_images()} this run), "
+                    f"in-flight limit {session.controller.limit_for(host_key(start_url))}."
+                    + (f" Unchanged since previous audit: {unchanged_pages} pages." if reaudit else ""),
+                )
+
+                if added_images() >= max_images:
+                    job.note("info", "Hit additional image limit for this run. You can raise the limit and resume again.")
+                    halt = True
+
+            # --------------------------
+            # CSS backgrounds (robots-aware)
+            # --------------------------
+            # Stylesheets are merged in the order they were queued: once fetched, their @imports are
+            # linked and their images go to the image pool; their rows are added, for every page that
+            # links them, when all of those are analyzed.
+            while pending_css and not halt:
+                sheet = pending_css[0]
+                if sheet["images"] is None:
+                    if not sheet["fetch"].done():
+                        break
+                    resp_css = sheet["fetch"].result()
+                    links = parse_css(resp_css.text if resp_css and resp_css.status_code == 200 else "", sheet["css"])
+                    sheet["imports"] = [i for i in links.imports if same_scope(i, start_url, include_subdomains)]
+                    for page_url in list(sheet["pages"]):
+                        for imported in sheet["imports"]:
+                            link_stylesheet(page_url, imported)
+                    # (Optional) also respect robots for the image asset itself
+                    sheet["found"] = [u for u in links.images
+                                      if not (respect_robots and rp and not rp.can_fetch(user_agent, u))]
+                    css_images = []
+                    new_images = 0
+                    for u in sheet["found"]:
+                        if u not in assets:
+                            if new_images >= max_images - added_images():
+                                continue
+                            new_images += 1
+                        css_images.append(u)
+                    sheet["images"] = {u: submit_image(u) for u in css_images}
+                if not all(f.done() for f in sheet["images"].values()):
+                    break
+                pending_css.popleft()
+                merged = True
+                del css_entries[sheet["css"]]
+                stylesheets[sheet["css"]] = (sheet["found"], sheet["imports"])
+                journal.stylesheet(sheet["css"], sheet["found"], sheet["imports"])
+
+                metas = {}
+                for u, fut in sheet["images"].items():
+                    metas[u] = fut.result()
+                    total_bytes_downloaded += metas[u]["bytes"]
+
+                for u, meta in metas.items():
+                    if added_images() >= max_images:
+                        break
+                    size, ct = meta["size"], meta["type"]
+                    width, height, exif_author, thumb_data = meta["width"], meta["height"], meta["artist"], meta["thumb"]
+                    note = meta["note"]
+
+                    g_link, t_link = reverse_links(u)
+                    dom = domain_of(u)
+
+                    risk = []
+                    if dom in STOCK_DOMAINS:
+                        risk.append("Stock source — ensure license")
+                    if flag_large and (size is not None) and size >= int(large_mb) * 1024 * 1024:
+                        risk.append(f"Very large file (≥ {int(large_mb)} MB)")
+                    if flag_large and width and height and (width >= int(large_px) or height >= int(large_px)):
+                        risk.append(f"Very large dimensions ({width}×{height} px)")
+                    if flag_suspicious:
+                        try:
+                            pth = urlparse(u).path.lower()
+                        except Exception:
+                            pth = ""
+                        if pth and STOCK_ID_RE.search(pth):
+                            risk.append("Suspicious stock ID in filename")
+                    if flag_offdomain and dom and root_regdomain and dom != root_regdomain:
+                        risk.append("Off-domain asset (hotlink)")
+                    if flag_brand and brand_terms:
+                        hay = u.lower()
+                        for term in brand_terms:
+                            if term and term in hay:
+                                risk.append(f"Brand term match: {term}")
+                                break
+
+                    row = {
+                        "Image URL": u,
+                        "Source Type": "CSS Background",
+                        "Alt Text": "",
+                        "Domain": dom,
+                        "Guessed Source": guessed_source(u),
+                        "Content-Type": ct,
+                        "Estimated Bytes": size,
+                        "EXIF Artist": exif_author,
+                        "Width": width,
+                        "Height": height,
+                        "Google Images": g_link,
+                        "TinEye": t_link,
+                        "Thumbnail": thumb_data,
+                        "Notes": note,
+                        "Risk Flags": ", ".join(risk)
+                    }
+                    for page_url in sheet["pages"]:
+                        if assets.add({"Page": page_url, **row}):
+                            images_found += 1
+
+            # Persist state after each batch of pages. The frontier and assets are kept as live objects
+            # (no copying) and only the changes since the last batch are appended to the journal.
+            # Wakeups that merged nothing (a fetch or an image finished) have nothing to record.
+            if not merged:
+                continue
+            merged = False
+            css_queue = [(page_url, sheet["css"]) for sheet in pending_css for page_url in sheet["pages"]]
+            counters = {
+                "pages_processed": pages_processed,
+                "images_found": images_found,
+                "total_bytes_downloaded": total_bytes_downloaded,
+                "css_queue": css_queue,
+            }
+            journal.commit(assets, counters)
+            if journal.needs_compaction():
+                journal.compact(start_url, frontier, unfinished_pages(), assets, counters, page_prints, stylesheets)
+            job.state = {
+                "start_url": start_url,
+                "frontier": frontier,
+                "journal": journal,
+                "in_flight": unfinished_pages(),
+                **counters,
+                "assets": assets,
+                "page_prints": page_prints,
+                "stylesheets": stylesheets,
+            }
+    finally:
+        for pool in (page_pool, image_pool, css_pool):
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # Pages fetched (or still fetching) but not merged go back to the front of the queue
+    unfinished = unfinished_pages()
+    if unfinished:
+        for (u, d) in reversed(unfinished):
+            frontier.push_front(u, d)
+        in_flight.clear()
+        pending_pages.clear()
+        if job.state:
+            job.state["in_flight"] = []
+
+    # Final state: counters, a compacted journal carrying this run's settings, and the run's outcome
+    css_queue = [(page_url, sheet["css"]) for sheet in pending_css for page_url in sheet["pages"]]
+    job.unchanged_pages = unchanged_pages
+    job.finished = (not frontier) and (not css_queue)
+    counters = {
+        "pages_processed": pages_processed,
+        "images_found": images_found,
+        "total_bytes_downloaded": total_bytes_downloaded,
+        "css_queue": css_queue,
+    }
+    journal.commit(assets, counters)
+    job.state = {
+        "start_url": start_url,
+        "frontier": frontier,
+        "journal": journal,
+        "in_flight": [],
+        **counters,
+        "assets": assets,
+        "page_prints": page_prints,
+        "stylesheets": stylesheets,
+    }
+    if assets:
+        journal.compact(start_url, frontier, [], assets, counters, page_prints, stylesheets)
+        journal.note_settings(job.settings)
+
+
+# Incremental re-audit baseline (parsed once per uploaded file)
+if reaudit_upload is None:
+    st.session_state.pop("reaudit_baseline", None)
+else:
+    _rb = st.session_state.get("reaudit_baseline")
+    if not _rb or (_rb["name"], _rb["size"]) != (reaudit_upload.name, reaudit_upload.size):
+        try:
+            st.session_state["reaudit_baseline"] = load_reaudit_baseline(reaudit_upload)
+        except Exception as e:
+            st.session_state.pop("reaudit_baseline", None)
+            st.sidebar.error(f"Failed to load previous audit: {e}")
+
+# Handle checkpoint load (needs the journal helpers above)
+if resume_upload is not None and load_clicked:
+    try:
+        if resume_upload.name.lower().endswith(".jsonl"):
+            os.makedirs(JOURNAL_DIR, exist_ok=True)
+            fd, jpath = tempfile.mkstemp(prefix="journal_", suffix=".jsonl", dir=JOURNAL_DIR)
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(resume_upload.getvalue())
+            state = replay_journal(jpath)
+            state["journal"] = CrawlJournal(jpath)
+        else:
+            # Older single-document JSON checkpoints
+            state = json.load(resume_upload).get("state", {})
+        if not state or not state.get("start_url") or ("queue" not in state and "frontier" not in state):
+            st.sidebar.error("Invalid checkpoint file.")
+        else:
+            st.session_state.crawl_state = get_spill_store().track(CrawlStateSlot(state))
+            st.sidebar.success("Checkpoint loaded. Click 'Continue from saved state' or 'Run Audit' to resume.")
+    except Exception as e:
+        st.sidebar.error(f"Failed to load checkpoint: {e}")
+
+# Site-size preflight (sitemaps + a few sample pages), shown until the start URL changes
+if preflight_clicked and start_url:
+    with st.spinner("Estimating site size from sitemaps and sample pages…"):
+        _rp, _session = get_robots_session(
+            start_url, user_agent, rate_per_host, burst_per_host, respect_robots,
+            max_concurrency=concurrency, adaptive=adaptive_concurrency,
+        )
+        if use_http_cache:
+            _session.http_cache = get_http_cache()
+        st.session_state["preflight"] = preflight_site(_session, _rp, start_url, include_subdomains, per_page_img_cap,
+                                                       rules=canon, max_html_bytes=max_html_mb * 1024 * 1024,
+                                                       respect_robots=respect_robots, user_agent=user_agent)
+_pf = st.session_state.get("preflight")
+if _pf and _pf["start_url"] == start_url:
+    if _pf["sitemap_pages"]:
+        _pages_txt = f"{_pf['sitemap_pages']:,}{'+' if _pf['sitemap_capped'] else ''} in-scope pages in sitemaps"
+    else:
+        _pages_txt = f"no sitemap found; {_pf['linked_from_start']:,} in-scope pages linked from the start page"
+    st.info(
+        f"Preflight: {_pages_txt}. About {_pf['avg_images']:.1f} images per page across {_pf['sampled']} "
+        f"sampled pages, so roughly {_pf['est_images']:,} images site-wide. Current limits cover "
+        f"{min(100, round(100 * max_pages / _pf['est_pages']))}% of pages and "
+        f"{min(100, round(100 * max_images / max(1, _pf['est_images'])))}% of images."
+    )
+
+# --------------------------
+# Main Audit Logic (with resume/delta limits)
+# --------------------------
+# (UNCHANGED below this point except for any incidental whitespace fixes)
+if 'go' not in globals():
+    go = False
+
+# The audit runs as a background job (see CrawlJob); this session follows it by id, which is also kept
+# in the page URL so a refreshed tab finds it again.
+_registry = get_job_registry()
+_job = _registry.get(st.session_state.get("crawl_job") or st.query_params.get("job"))
+if _job is None:
+    if st.session_state.get("crawl_job"):
+        st.session_state["crawl_job_synced"] = st.session_state["crawl_job"]  # expired; nothing to hand back
+    if "job" in st.query_params:
+        del st.query_params["job"]
+else:
+    st.session_state["crawl_job"] = _job.id
+if stop and _job is not None:
+    _job.cancel()
+show_server_usage(st.sidebar, _registry, get_governor())
+
+if go:
+    if _job is not None and _job.running:
+        st.warning("An audit is already running. Stop it before starting another one.")
+        st.stop()
+    if not start_url:
+        st.error("Please enter a start URL.")
+        st.stop()
+    parsed = urlparse(start_url)
+    if not parsed.scheme or not parsed.netloc:
+        st.error("Start URL is invalid. Try including https:// (e.g., https://www.njafp.org).")
+        st.stop()
+
+    rp, session = get_robots_session(
+        start_url, user_agent, rate_per_host, burst_per_host, respect_robots,
+        max_concurrency=concurrency, adaptive=adaptive_concurrency,
+    )
+    if use_http_cache:
+        session.http_cache = get_http_cache()
+    if show_thumbs:
+        session.thumbs = get_thumb_store()
+
+    if respect_robots and rp and not rp.can_fetch(user_agent, start_url):
+        st.warning(
+            "robots.txt disallows crawling the start URL for this user-agent. "
+            "Try the browser-like identity or uncheck 'Respect robots.txt' if you own the site."
+        )
+        st.stop()
+
+    settings = {
+        "include_subdomains": include_subdomains,
+        "depth_max": depth_max,
+        "seed_sitemaps": seed_sitemaps,
+        "ignored_params": ignored_params,
+        "strip_trailing_slash": strip_trailing_slash,
+        "max_pages": max_pages,
+        "max_images": max_images,
+        "per_page_img_cap": per_page_img_cap,
+        "per_image_size_mb": per_image_size_mb,
+        "total_bytes_cap_mb": total_bytes_cap_mb,
+        "max_html_mb": max_html_mb,
+        "concurrency": concurrency,
+        "adaptive_concurrency": adaptive_concurrency,
+        "use_http_cache": use_http_cache,
+        "single_get": single_get,
+        "use_image_cache": use_image_cache,
+        "parallel_parse": parallel_parse,
+        "rate_per_host": rate_per_host,
+        "burst_per_host": burst_per_host,
+        "parse_css_backgrounds": parse_css_backgrounds,
+        "try_exif": try_exif,
+        "show_thumbs": show_thumbs,
+        "flag_large": flag_large,
+        "large_px": int(large_px),
+        "large_mb": int(large_mb),
+        "flag_suspicious": flag_suspicious,
+        "flag_offdomain": flag_offdomain,
+        "flag_brand": flag_brand,
+        "brand_terms_raw": brand_terms_raw,
+    }
+    # The job holds the parsed baseline until it ends. The session keeps only which file it was,
+    # and parses it again if another audit uses it.
+    _baseline = st.session_state.get("reaudit_baseline")
+    if _baseline and "assets" not in _baseline and reaudit_upload is not None:
+        try:
+            _baseline = load_reaudit_baseline(reaudit_upload)
+        except Exception as e:
+            st.sidebar.error(f"Failed to load previous audit: {e}")
+            _baseline = None
+    if _baseline:
+        st.session_state["reaudit_baseline"] = {"name": _baseline["name"], "size": _baseline["size"]}
+    _job = CrawlJob(
+        start_url, settings,
+        {"canon": canon, "respect_robots": respect_robots, "user_agent": user_agent, "compact_visited": compact_visited},
+        # take, not get: the finished job that produced this slot may still hold it (see SpillSlot.take)
+        prev_state=st.session_state.crawl_state.take() if st.session_state.crawl_state else None,
+        reaudit=_baseline,
+        rp=rp, session=session,
+        image_cache=get_image_meta_cache() if use_image_cache else None,
+        parse_pool=ready_parse_pool() if parallel_parse else None,
+    )
+    _registry.start(_job)
+    st.session_state.crawl_state = None  # the job owns it now and hands it back when it ends
+    st.session_state["crawl_job"] = _job.id
+    st.query_params["job"] = _job.id
+
+if _job is not None and _job.running:
+    crawl_progress(_job)
+elif _job is not None:
+    if st.session_state.get("crawl_job_synced") != _job.id:
+        # The finished audit's state becomes this session's resumable state
+        st.session_state.crawl_state = _job.state
+        st.session_state["crawl_job_synced"] = _job.id
+        st.rerun()
+
+    # --------------------------
+    # Results & Export + Checkpoint
+    # --------------------------
+    _state = (_job.state.get() if _job.state else None) or {}  # reloads a state spilled while idle
+    assets, frontier, journal = _state.get("assets"), _state.get("frontier"), _state.get("journal")
+    pages_processed, images_found = _state.get("pages_processed", 0), _state.get("images_found", 0)
+    page_prints = _state.get("page_prints", {})
+    session, image_cache, reaudit = _job.session, _job.image_cache, _job.reaudit
+    unchanged_pages, max_html_mb = _job.unchanged_pages, _job.opts["max_html_mb"]
+    if _job.error:
+        st.error(f"The audit stopped on an error ({_job.error}). Results collected so far are below.")
+    for _kind, _text in _job.notes:
+        (st.info if _kind == "info" else st.caption)(_text)
+    if assets:
+        import pandas as pd
+        df = pd.DataFrame(assets.per_page_rows() if st.session_state.get("per_page_view") else assets.records)
+        finished = _job.finished
+        if finished:
+            st.success(f"Audit complete: total pages {pages_processed}, total images {images_found}.")
+        else:
+            st.info(f"Partial results: total pages {pages_processed}, total images {images_found}. You can resume later.")
+        if session.http_cache:
+            cs_ = session.cache_stats
+            st.caption(
+                f"HTTP cache (pages/CSS) this run: {cs_['fresh']} fresh hits, {cs_['revalidated']} revalidated (304), "
+                f"{cs_['miss']} misses ({cs_['stored']} stored)."
+            )
+        if image_cache:
+            cs_ = session.cache_stats
+            st.caption(
+                f"Image metadata cache this run: {cs_['image_hit']} reused without a request, "
+                f"{cs_['image_revalidated']} revalidated (304), {cs_['image_miss']} fetched."
+            )
+        if session.cache_stats["skipped_type"] or session.cache_stats["truncated"]:
+            st.caption(
+                f"Page fetches this run: {session.cache_stats['skipped_type']} non-HTML responses dropped after "
+                f"their headers, {session.cache_stats['truncated']} pages cut at {max_html_mb} MB."
+            )
+
+        # Apply filters from sidebar
+        only_stock = st.session_state.get("filter_only_stock", False)
+        only_risky = st.session_state.get("filter_only_risky", False)
+        search = st.session_state.get("filter_search", "")
+
+        view = df.copy()
+        view["Guessed Source"] = view["Guessed Source"].fillna("")
+        view["Risk Flags"] = view["Risk Flags"].fillna("")
+        if only_stock:
+            view = view[view["Guessed Source"].str.contains("Stock / Library", na=False)]
+        if only_risky:
+            view = view[view["Risk Flags"].str.len() > 0]
+        if search:
+            mask = (
+                view["Image URL"].astype(str).str.contains(search, case=False, na=False) |
+                view["Page"].astype(str).str.contains(search, case=False, na=False) |
+                view["Alt Text"].astype(str).str.contains(search, case=False, na=False) |
+                view["Domain"].astype(str).str.contains(search, case=False, na=False)
+            )
+            view = view[mask]
+
+        render_df = view.copy()
+        if not show_thumbs:
+            render_df = render_df.drop(columns=["Thumbnail"], errors="ignore")
+
+        col_cfg = {
+            "Image URL": st.column_config.LinkColumn("Image URL"),
+            "Google Images": st.column_config.LinkColumn("Google Images"),
+            "TinEye": st.column_config.LinkColumn("TinEye"),
+        }
+        if show_thumbs and "Thumbnail" in render_df.columns:
+            # Rows hold thumbnail keys; only the images in this view are read, once per distinct image
+            _thumbs = get_thumb_store()
+            _uris = {k: _thumbs.data_uri(k) for k in render_df["Thumbnail"].dropna().unique()}
+            render_df["Thumbnail"] = render_df["Thumbnail"].map(_uris)
+            col_cfg["Thumbnail"] = st.column_config.ImageColumn("Thumbnail")
+
+        st.data_editor(
+            render_df,
+            use_container_width=True,
+            hide_index=True,
+            disabled=True,
+            column_config=col_cfg,
+        )
+
+        def to_excel_bytes(df_: pd.DataFrame) -> bytes:
+            export = df_.drop(columns=["Thumbnail"], errors="ignore").copy()
+            out = BytesIO()
+            with pd.ExcelWriter(out, engine="xlsxwriter") as writer:
+                export.to_excel(writer, sheet_name="Audit", index=False)
+                ws = writer.sheets["Audit"]
+                url_cols = [c for c in ["Page", "Image URL", "Google Images", "TinEye"] if c in export.columns]
+                for r in range(len(export)):
+                    for c in url_cols:
+                        val = export.iloc[r][c]
+                        if isinstance(val, str) and val.startswith(("http://", "https://")):
+                            ws.write_url(r + 1, export.columns.get_loc(c), val, string=c)
+            out.seek(0)
+            return out.read()
+
+        csv_bytes = render_df.drop(columns=["Thumbnail"], errors="ignore").to_csv(index=False).encode("utf-8")
+        xlsx_bytes = to_excel_bytes(view)
+
+        st.download_button("Download CSV", data=csv_bytes, file_name="image_licensing_audit.csv", mime="text/csv")
+        st.download_button("Download Excel", data=xlsx_bytes, file_name="image_licensing_audit.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+        st.download_button(
+            "Download checkpoint to resume later",
+            data=journal.read_bytes(),
+            file_name="audit_checkpoint.jsonl",
+            mime="application/x-ndjson",
+        )
+
+        if reaudit:
+            delta = reaudit["delta"]
+            counts = Counter(d["Change"] for d in delta)
+            st.subheader("Changes since previous audit")
+            st.write(
+                f"Compared with `{reaudit['name']}`: {counts['Added']} added, {counts['Removed']} removed, "
+                f"{counts['Changed']} changed images; {unchanged_pages} unchanged pages reused this run."
+            )
+            if delta:
+                df_delta = pd.DataFrame(delta).drop(columns=["Thumbnail"], errors="ignore")
+                st.dataframe(df_delta, use_container_width=True, hide_index=True)
+                st.download_button(
+                    "Download delta CSV",
+                    data=df_delta.to_csv(index=False).encode("utf-8"),
+                    file_name="image_licensing_audit_delta.csv",
+                    mime="text/csv",
+                )
+
+        st.caption("Notes: You can resume a partial crawl using the sidebar 'Resume from checkpoint' loader, the 'Continue from saved state' button, or the main 'Resume' panel. Limits apply to additional work this run.")
+    else:
+        st.warning("No images found or crawl blocked. Try adjusting limits, enabling subdomains, or verifying the start URL.")
+
+# ==========================================
+# PowerPoint Image Licensing Audit (Beta)
+# ==========================================
+with st.expander("📑 PowerPoint Image Licensing Audit (beta)", expanded=False):
+    with st.form("pptx_form"):
+        pptx_files = st.file_uploader("Upload one or more PowerPoint files (.pptx)", type=["pptx"], accept_multiple_files=True)
+        st.markdown("**Risk Heuristics**")
+        pptx_large_px = st.number_input("Very large if width or height ≥ (px)", min_value=1000, max_value=10000, value=3840, step=100, key="pptx_large_px")
+        pptx_large_mb = st.number_input("Very large if file size ≥ (MB)", min_value=1, max_value=50, value=5, step=1, key="pptx_large_mb")
+        pptx_brand_terms_raw = st.text_input("Brand/trademark terms (comma-separated)", value="", key="pptx_brand_terms_raw")
+        pptx_dedupe = st.checkbox("Deduplicate by image content (SHA-1)", value=True, key="pptx_dedupe")
+        run_pptx = st.form_submit_button("Scan PPTX")
+
+    URL_RE = re.compile(r'https?://[^\s<>()"]+')
+    MEDIA_IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg'}
+    MEDIA_VIDEO_EXTS = {'.mp4', '.mov', '.avi', '.mkv', '.webm', '.m4v'}
+    MEDIA_VIDEO_DOMAINS = {'youtube.com', 'youtu.be', 'vimeo.com', 'player.vimeo.com'}
+    
+    def _looks_like_direct_image(u: str) -> bool:
+        """True if URL is http(s) and path ends with a common image extension."""
+        try:
+            p = urlparse(u)
+            if p.scheme not in ("http", "https"):
+                return False
+            return any((p.path or "").lower().endswith(ext) for ext in MEDIA_IMAGE_EXTS)
+        except Exception:
+            return False
+
+    def _prefill_reverse_links(u: str):
+        """Build Google/TinEye query URLs for a public image URL (keeps links short)."""
+        enc = requests.utils.quote(u, safe="")
+        g = f"https://www.google.com/searchbyimage?image_url={enc}"
+        t = f"https://tineye.com/search?url={enc}"
+        return g, t
+
+    # Alias so either name works everywhere:
+    _is_direct_image_url = _looks_like_direct_image
+
+  
+    def _is_direct_image_url(u: str) -> bool:
+        try:
+            p = urlparse(u)
+            if p.scheme not in ("http", "https"):
+                return False
+            return (p.path or "").lower().endswith(
+                (".jpg",".jpeg",".png",".gif",".webp",".svg")
+            )
+        except Exception:
+            return False
+
+    def _classify_media_url(u: str) -> str:
+        try:
+            p = urlparse(u)
+            path = (p.path or '').lower()
+            host = (p.netloc or '').lower()
+        except Exception:
+            path, host = "", ""
+        if any(path.endswith(ext) for ext in MEDIA_IMAGE_EXTS):
+            return "image"
+        if any(path.endswith(ext) for ext in MEDIA_VIDEO_EXTS):
+            return "video"
+        if any(d in host for d in MEDIA_VIDEO_DOMAINS):
+            return "video"
+        return ""
+
+    def _extract_text_media_from_slide(slide, slide_idx: int, filename: str):
+        """Collect media-like URLs (images/videos) from text boxes, mark kind and keep clickable link."""
+        rows = []
+        for shape in slide.shapes:
+            if not getattr(shape, "has_text_frame", False):
+                continue
+            try:
+                txt = shape.text or ""
+            except Exception:
+                txt = ""
+            for m in URL_RE.findall(txt):
+                url = m.strip()
+                kind = _classify_media_url(url)
+                if not kind:
+                    continue
+
+                g_link = ""
+                t_link = ""
+                # For direct image URLs, we can prefill both engines
+                if kind == "image" and _looks_like_direct_image(url):
+                    g_link, t_link = _prefill_reverse_links(url)
+
+                rows.append({
+                    "File": filename,
+                    "Slide": slide_idx,
+                    "Shape": getattr(shape, "name", ""),
+                    "Alt Text": "",
+                    "Hyperlink": "",                 # reserved for on-picture link; empty for text items
+                    "External Media Link": url,      # clickable URL from text box
+                    "External Media Kind": kind,     # image | video
+                    "Format": "text",
+                    "Content-Type": "",
+                    "Bytes": None,
+                    "Width": None,
+                    "Height": None,
+                    "EXIF Artist": "",
+                    "SHA1": "",
+                    "Google Images": g_link,         # prefilled when possible
+                    "TinEye": t_link,                # prefilled when possible
+                    "Risk Flags": "",
+                })
+        return rows
+
+
+    def _scan_pptx_bytes(buf_bytes, filename, brand_terms, large_px, large_mb):
+        """
+        Returns:
+          rows: table rows for DataFrame
+          image_records: list of dicts with {'zip_name','blob','sha1','file','slide','shape','fmt'}
+        """
+        from pptx import Presentation
+        from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+        rows = []
+        image_records = []
+        try:
+            prs = Presentation(BytesIO(buf_bytes))
+        except Exception:
+            st.warning(f"Skipping '{filename}': not a valid PPTX file or could not be parsed.")
+            return rows, image_records
+
+        for slide_idx, slide in enumerate(prs.slides, start=1):
+            shape_idx = 0
+            for shape in slide.shapes:
+                shape_idx += 1
+                # Detect embedded picture shapes
+                is_picture = False
+                try:
+                    is_picture = (shape.shape_type == MSO_SHAPE_TYPE.PICTURE)
+                except Exception:
+                    pass
+                if not is_picture and not getattr(shape, "has_image", False):
+                    continue
+
+                # Extract embedded image
+                try:
+                    img = shape.image
+                except Exception:
+                    continue
+                blob = img.blob
+                sha1 = hashlib.sha1(blob).hexdigest()
+                fmt = getattr(img, "ext", None)
+                ctype = getattr(img, "content_type", "")
+
+                width = height = None
+                exif_artist = ""
+                try:
+                    with Image.open(BytesIO(blob)) as im:
+                        width, height = im.size
+                        exif = im.getexif()
+                        if exif:
+                            artist = exif.get(315)
+                            if artist:
+                                exif_artist = str(artist)
+                except Exception:
+                    pass
+
+                alt = getattr(shape, "alternative_text", "") or ""
+
+                # Hyperlink on the picture itself?
+                href = ""
+                try:
+                    href = getattr(shape.click_action.hyperlink, "address", "") or ""
+                except Exception:
+                    href = ""
+
+                # In-app reverse-image links for this picture (keep links short)
+                if _is_direct_image_url(href):
+                    google_link, tineye_link = _prefill_reverse_links(href)
+                else:
+                    # Fall back to upload landing pages
+                    google_link = "https://lens.google.com/upload"
+                    tineye_link  = "https://tineye.com/"
+
+
+                # Risk flags
+                risk = []
+                size_mb = len(blob) / (1024*1024)
+                if size_mb >= int(large_mb):
+                    risk.append(f"Very large file (≥ {int(large_mb)} MB)")
+                if (width and height) and (width >= int(large_px) or height >= int(large_px)):
+                    risk.append(f"Very large dimensions ({width}×{height} px)")
+                if href and any(s in href.lower() for s in [
+                    "shutterstock", "gettyimages", "istockphoto", "adobestock", "stock.adobe",
+                    "depositphotos", "dreamstime", "alamy", "123rf", "bigstockphoto", "canstockphoto", "pond5"
+                ]):
+                    risk.append("Hyperlink to stock/library")
+                if brand_terms:
+                    hay = (alt + " " + href).lower()
+                    for term in brand_terms:
+                        if term and term in hay:
+                            risk.append(f"Brand term match: {term}")
+                            break
+
+                # For ZIP export + HTML mapping
+                safe_file = re.sub(r"[^a-zA-Z0-9._-]", "_", filename.rsplit("/", 1)[-1])
+                base = safe_file[:-5] if safe_file.lower().endswith(".pptx") else safe_file
+                ext = f".{fmt}" if fmt and not str(fmt).startswith(".") else (fmt or ".img")
+                zip_name = f"{base}_slide{slide_idx}_shape{shape_idx}_{sha1[:10]}{ext}"
+                image_records.append({
+                    "zip_name": zip_name,
+                    "blob": blob,
+                    "sha1": sha1,
+                    "file": filename,
+                    "slide": slide_idx,
+                    "shape": getattr(shape, "name", ""),
+                    "fmt": fmt or "img",
+                })
+
+                rows.append({
+                    "File": filename,
+                    "Slide": slide_idx,
+                    "Shape": getattr(shape, "name", ""),
+                    "Alt Text": alt,
+                    "Hyperlink": href,                 # link attached to the picture (if any)
+                    "External Media Link": "",          # N/A for embedded image rows
+                    "External Media Kind": "",
+                    "Format": fmt,
+                    "Content-Type": ctype,
+                    "Bytes": len(blob),
+                    "Width": width,
+                    "Height": height,
+                    "EXIF Artist": exif_artist,
+                    "SHA1": sha1,
+                    "Google Images": google_link,       # short placeholders (not written to XLSX)
+                    "TinEye": tineye_link,              # short placeholders (not written to XLSX)
+                    "Risk Flags": ", ".join(risk),
+                })
+
+            # Also collect media links found in text boxes (kept separate)
+            rows.extend(_extract_text_media_from_slide(slide, slide_idx, filename))
+
+        return rows, image_records
+
+    def _build_html_report(df_: "pd.DataFrame", image_records: list) -> bytes:
+        """
+        Creates an HTML report with reverse-image links.
+        - If a real remote image URL exists, prefill Google/TinEye with it.
+        - Otherwise, link to the upload pages and provide a Download button.
+        """
+        import urllib.parse
+
+        IMG_EXTS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg')
+
+        def _is_direct_image_url(u: str) -> bool:
+            try:
+                p = urlparse(u)
+                if p.scheme not in ("http", "https"):
+                    return False
+                return any((p.path or "").lower().endswith(ext) for ext in IMG_EXTS)
+            except Exception:
+                return False
+
+        # Map SHA1 -> blob for embedded images (for preview/download only)
+        sha_map = {rec["sha1"]: rec for rec in image_records}
+
+        html = []
+        html.append("<!doctype html><meta charset='utf-8'><title>PPTX Reverse Image Report</title>")
+        html.append("""
+    <style>
+    body{font-family:system-ui,Segoe UI,Arial}
+    table{border-collapse:collapse;margin-top:12px;width:100%}
+    th,td{border:1px solid #ccc;padding:6px 8px;font-size:14px;vertical-align:top}
+    .preview img{max-height:80px;max-width:160px}
+    .small{color:#666;font-size:12px}
+    </style>
+    """)
+        html.append("<h2>PPTX Reverse Image Report</h2>")
+        html.append("<p class='small'>Tip: If Google/TinEye opens without results, use the <b>Download</b> link below and upload/drag the image into their page.</p>")
+        html.append("<table><thead><tr>"
+                    "<th>File</th><th>Slide</th><th>Shape</th>"
+                    "<th>Preview</th><th>Download</th>"
+                    "<th>Google</th><th>TinEye</th><th>Notes</th></tr></thead><tbody>")
+
+        for _, r in df_.iterrows():
+            file_ = str(r.get("File") or "")
+            slide = str(r.get("Slide") or "")
+            shape = str(r.get("Shape") or "")
+            notes = str(r.get("Risk Flags") or "")
+
+            # Prefer a real remote image URL, if we have one
+            remote_url = ""
+            ext_link = str(r.get("External Media Link") or "")
+            if _is_direct_image_url(ext_link):
+                remote_url = ext_link
+            else:
+                href = str(r.get("Hyperlink") or "")
+                if _is_direct_image_url(href):
+                    remote_url = href
+
+            # Build preview/download (for embedded images with SHA1)
+            preview_html = ""
+            download_html = ""
+            sha = str(r.get("SHA1") or "")
+            if sha and sha in sha_map:
+                rec = sha_map[sha]
+                fmt = (rec.get("fmt") or "png").lstrip(".")
+                b64 = base64.b64encode(rec["blob"]).decode("ascii")
+                data_url = f"data:image/{fmt};base64,{b64}"
+                preview_html = f"<div class='preview'><img src='{data_url}' alt='img'></div>"
+                # Use "download" attribute so the image saves with a sensible name
+                download_html = f"<a href='{data_url}' download='{rec['zip_name']}'>Download</a>"
+            else:
+                # Non-embedded (text-found) links: show nothing to keep report light
+                preview_html = ""
+                download_html = ""
+
+            # Reverse-image links
+            if remote_url:
+                enc = urllib.parse.quote(remote_url, safe='')
+                g = f"https://www.google.com/searchbyimage?image_url={enc}"
+                t = f"https://tineye.com/search?url={enc}"
+            else:
+                # No public URL → open upload pages; user can use "Download" then upload/drag
+                g = "https://lens.google.com/upload"
+                t = "https://tineye.com/"
+
+            g_link = f"<a href='{g}' target='_blank'>Open</a>"
+            t_link = f"<a href='{t}' target='_blank'>Open</a>"
+
+            html.append(
+                f"<tr>"
+                f"<td>{file_}</td>"
+                f"<td>{slide}</td>"
+                f"<td>{shape}</td>"
+                f"<td>{preview_html}</td>"
+                f"<td>{download_html}</td>"
+                f"<td>{g_link}</td>"
+                f"<td>{t_link}</td>"
+                f"<td>{notes}</td>"
+                f"</tr>"
+            )
+
+        html.append("</tbody></table>")
+
+        # Optional section: external media links (non-embedded) for reference
+        has_ext = False
+        for _, r in df_.iterrows():
+            if str(r.get("External Media Link") or ""):
+                has_ext = True
+                break
+
+        if has_ext:
+            html.append("<h3>External Media Links Found in Text</h3>")
+            html.append("<table><thead><tr><th>File</th><th>Slide</th><th>Shape</th><th>Kind</th><th>URL</th></tr></thead><tbody>")
+            for _, r in df_.iterrows():
+                url = str(r.get("External Media Link") or "")
+                if not url:
+                    continue
+                file_ = str(r.get("File") or "")
+                slide = str(r.get("Slide") or "")
+                shape = str(r.get("Shape") or "")
+                kind = str(r.get("External Media Kind") or "")
+                html.append(f"<tr><td>{file_}</td><td>{slide}</td><td>{shape}</td><td>{kind}</td>"
+                            f"<td><a href='{url}' target='_blank'>{url}</a></td></tr>")
+            html.append("</tbody></table>")
+
+        return "\n".join(html).encode("utf-8")
+
+
+    if run_pptx and pptx_files:
+        import pandas as pd
+        brand_terms = [t.strip().lower() for t in (pptx_brand_terms_raw or "").split(",") if t.strip()]
+        all_rows = []
+        image_records = []
+        for f in pptx_files:
+            try:
+                bytes_ = f.getvalue()
+            except Exception:
+                bytes_ = f.read()
+            rows, recs = _scan_pptx_bytes(bytes_, f.name, brand_terms, int(pptx_large_px), int(pptx_large_mb))
+            all_rows.extend(rows)
+            image_records.extend(recs)
+
+        if not all_rows:
+            st.warning("No images or media URLs found in the uploaded PPTX files.")
+        else:
+            dfp = pd.DataFrame(all_rows)
+
+            # Dedupe embedded images (text-media rows have empty SHA1 and won't be deduped)
+            if pptx_dedupe and "SHA1" in dfp.columns:
+                first_seen = {}
+                duplicate_of = []
+                keep_mask = []
+                for sha in dfp["SHA1"]:
+                    if sha and sha in first_seen:
+                        duplicate_of.append(first_seen[sha])
+                        keep_mask.append(False)
+                    else:
+                        if sha:
+                            first_seen[sha] = sha
+                        duplicate_of.append("")
+                        keep_mask.append(True)
+                dfp["Duplicate Of"] = duplicate_of
+                st.checkbox("Show duplicates only (embedded images)", value=False, key="pptx_show_dupes")
+                if not st.session_state.get("pptx_show_dupes"):
+                    dfp = dfp[keep_mask]
+                else:
+                    dfp = dfp[[not k for k in keep_mask]]
+
+            # Clickable columns in-app (short placeholders are fine here)
+            col_cfg = {}
+            for link_col in ["Hyperlink", "External Media Link", "Google Images", "TinEye"]:
+                if link_col in dfp.columns:
+                    col_cfg[link_col] = st.column_config.LinkColumn(link_col)
+
+            # Faster fallback for big tables
+            max_editor_rows = 200  # keep or tweak
+            if len(dfp) > max_editor_rows:
+                st.info(f"Showing first {max_editor_rows} rows (use downloads for the full set).")
+                df_show = dfp.head(max_editor_rows)
+            else:
+                df_show = dfp
+
+            st.data_editor(
+                df_show,
+                use_container_width=True,
+                hide_index=True,
+                disabled=True,
+                column_config=col_cfg,  # preserves clickable links for "Google Images"/"TinEye"
+)
+
+
+            # ---------- Exports ----------
+            # CSV: includes all columns (even Google/TinEye placeholders)
+            csv_bytes = dfp.to_csv(index=False).encode("utf-8")
+
+            # Excel: drop Google/TinEye columns entirely (per your request)
+            def _pptx_to_excel_bytes(df_: pd.DataFrame) -> bytes:
+                out = BytesIO()
+                with pd.ExcelWriter(out, engine="xlsxwriter") as writer:
+                    df_xlsx = df_.drop(columns=["Google Images", "TinEye"], errors="ignore").copy()
+                    df_xlsx.to_excel(writer, sheet_name="PPTX Audit", index=False)
+                    ws = writer.sheets["PPTX Audit"]
+                    # column widths
+                    for idx, col in enumerate(df_xlsx.columns):
+                        try:
+                            approx = int(min(max(12, df_xlsx[col].astype(str).str.len().quantile(0.9)), 60))
+                        except Exception:
+                            approx = 20
+                        ws.set_column(idx, idx, approx)
+                    # write hyperlinks only for real URL columns we kept
+                    for link_col in ["Hyperlink", "External Media Link"]:
+                        if link_col in df_xlsx.columns:
+                            hcol = df_xlsx.columns.get_loc(link_col)
+                            for r, val in enumerate(df_xlsx[link_col].astype(str).tolist()):
+                                if val.startswith(("http://", "https://")):
+                                    ws.write_url(r + 1, hcol, val, string=val)
+                out.seek(0)
+                return out.read()
+
+            xlsx_bytes = _pptx_to_excel_bytes(dfp)
+
+            # HTML report: full, prefilled reverse-image links for embedded images
+            html_bytes = _build_html_report(dfp, image_records)
+
+            # Images ZIP
+            images_zip_bytes = None
+            if image_records:
+                zip_buf = BytesIO()
+                with zipfile.ZipFile(zip_buf, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+                    for rec in image_records:
+                        zf.writestr(f"images/{rec['zip_name']}", rec["blob"])
+                zip_buf.seek(0)
+                images_zip_bytes = zip_buf.getvalue()
+
+            # "Download All" ZIP (ONLY this gets persisted)
+            all_zip_buf = BytesIO()
+            with zipfile.ZipFile(all_zip_buf, mode="w", compression=zipfile.ZIP_DEFLATED) as z:
+                z.writestr("pptx_image_audit.csv", csv_bytes)
+                z.writestr("pptx_image_audit.xlsx", xlsx_bytes)
+                z.writestr("pptx_image_audit.html", html_bytes)
+                if images_zip_bytes:
+                    # inline images into this bundle
+                    with zipfile.ZipFile(BytesIO(images_zip_bytes)) as imgs:
+                        for info in imgs.infolist():
+                            z.writestr(info.filename, imgs.read(info.filename))
+                z.writestr("README.txt",
+                           "PPTX audit artifacts.\n"
+                           "- pptx_image_audit.csv\n"
+                           "- pptx_image_audit.xlsx (no Google/TinEye columns)\n"
+                           "- pptx_image_audit.html (prefilled reverse-image links)\n"
+                           "- images/ (extracted embedded images)\n")
+            all_zip_bytes = all_zip_buf.getvalue()
+
+            # Persist ONLY the all-in-one ZIP (lean memory; it moves to disk while the session is idle)
+            st.session_state["pptx_artifacts"] = {"all_zip": get_spill_store().track(BytesSlot(all_zip_bytes))}
+
+            # Download buttons (CSV/XLSX/HTML immediate; only ZIP is persisted)
+            st.download_button("Download CSV (PPTX)", data=csv_bytes, file_name="pptx_image_audit.csv", mime="text/csv")
+            st.download_button("Download Excel (PPTX)", data=xlsx_bytes, file_name="pptx_image_audit.xlsx",
+                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            st.download_button("Download HTML (prefilled reverse-image links)", data=html_bytes,
+                               file_name="pptx_image_audit.html", mime="text/html")
+            st.download_button("Download ALL artifacts (ZIP)", data=all_zip_bytes,
+                               file_name="pptx_audit_bundle.zip", mime="application/zip")
+
+    elif run_pptx and not pptx_files:
+        st.warning("Please upload at least one .pptx file.")
+
+# Show persistent download (only ALL ZIP) without rerunning. The bundle is only loaded (and handed to the
+# download button, which keeps its own copy) when asked for, so an idle page doesn't hold it in memory.
+if st.session_state.get("pptx_artifacts") and st.session_state["pptx_artifacts"]["all_zip"]:
+    art = st.session_state["pptx_artifacts"]
+    st.markdown("**Previous scan:**")
+    if st.button("Prepare ALL artifacts ZIP (prev)", key="pptx_prev_prepare"):
+        bundle = art["all_zip"].get()  # None once its spilled copy was dropped under the disk quota
+        if bundle is None:
+            st.info("The previous bundle has expired; scan the files again to regenerate it.")
+        else:
+            st.download_button("⬇️ ALL artifacts ZIP (prev)", data=bundle, file_name="pptx_audit_bundle.zip",
+                               mime="application/zip", key="pptx_prev_all")
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
@@ -0,0 +1,23 @@
+from page_extract import extract_page, parse_srcset
+
+
+def test_srcset_url_with_commas_stays_whole():
+    srcset = "https://cdn/img/w_100,h_100/x.jpg 100w, https://cdn/img/w_200,h_200/x.jpg 200w"
+    assert parse_srcset(srcset) == ["https://cdn/img/w_100,h_100/x.jpg", "https://cdn/img/w_200,h_200/x.jpg"]
+
+
+def test_srcset_separators_and_descriptors():
+    assert parse_srcset(" a.jpg 1x ,b.jpg 2x,, c.jpg") == ["a.jpg", "b.jpg", "c.jpg"]
+    assert parse_srcset("a.jpg, b.jpg") == ["a.jpg", "b.jpg"]
+    assert parse_srcset("data:image/png;base64,AAAA 1x, d.jpg 2x") == ["d.jpg"]
+    assert parse_srcset("") == [] and parse_srcset(None) == []
+
+
+def test_extract_page_keeps_comma_urls_in_img_srcset():
+    html = '<img src="/a.jpg" srcset="/c/w_100,h_100/a.jpg 1x, /c/w_200,h_200/a.jpg 2x" alt="A">'
+    images = extract_page("https://example.com/p", html, 10).images
+    assert [u for u, _, _ in images] == [
+        "https://example.com/a.jpg",
+        "https://example.com/c/w_100,h_100/a.jpg",
+        "https://example.com/c/w_200,h_200/a.jpg",
+    ]